@@ -0,0 +1,331 @@
+"""
+End-to-end chat turn benchmark. Drives ChatHandler's User>Agent and Agent>Agent turns headlessly against the mock
+Ollama server, with synthetic Chroma memory collections of configurable size, and reports per-stage p50/p95/p99
+latency, turns/s and peak RSS. Results are written as JSON and compared against a stored baseline.
+
+Usage (from the project root):
+    python -m benchmarks.chat_turn_bench                       # 1k, 100k and 1M turn collections
+    python -m benchmarks.chat_turn_bench --sizes 1000 --turns 20
+    python -m benchmarks.chat_turn_bench --update-baseline     # store this run as the new baseline
+
+Synthetic collections are seeded with pre-computed random embeddings so seeding does not pay for the embedding model;
+queries still embed the user input exactly like a live chat does. Seeded collections are kept in the work directory
+and reused across runs.
+"""
+import argparse
+from datetime import datetime
+import json
+import os
+from pathlib import Path
+import resource
+import shutil
+import subprocess
+import sys
+import time
+import yaml
+
+
+BENCH_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = BENCH_DIR.parent
+DEFAULT_WORKDIR = BENCH_DIR / '.work'
+DEFAULT_RESULTS_DIR = BENCH_DIR / 'results'
+DEFAULT_BASELINE = BENCH_DIR / 'baseline.json'
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000]
+# Chroma's default embedding function (all-MiniLM-L6-v2) produces 384 dimensional vectors
+EMBEDDING_DIM = 384
+SEED_BATCH_SIZE = 5_000
+
+BENCH_HOST = 'bench_host'
+BENCH_GUEST = 'bench_guest'
+
+BENCH_INPUTS = [
+    "Can you summarize what we talked about regarding the station power budget?",
+    "thanks",
+    "What would you change in the relay module to cut latency?",
+    "Remind me which sensors we flagged as noisy last week.",
+    "ok",
+    "Give me three ideas for the next crew briefing.",
+    "How does the archive protocol handle duplicate records?",
+    "Explain the difference between the two memory modes you mentioned earlier.",
+]
+
+SEED_TOPICS = [
+    "power budget", "relay latency", "sensor noise", "crew briefing", "archive protocol", "orbit planning",
+    "disco playlist", "module maintenance", "signal routing", "library indexing",
+]
+
+
+def percentile(values: list, pct: float) -> float:
+    """
+    Linear interpolated percentile.
+
+    :param values: Sample values.
+    :param pct: Percentile between 0 and 100.
+    :returns: The percentile value, 0.0 for an empty sample.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident set size of this process. ru_maxrss is KiB on Linux and bytes on macOS.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def summarize_traces(traces: list, wall_seconds: float) -> dict:
+    """
+    Collapse a list of TurnTrace objects into latency percentiles per stage.
+
+    :param traces: TurnTrace objects, one per turn.
+    :param wall_seconds: Wall clock time for the whole scenario.
+    :returns: Scenario summary dict.
+    """
+    stage_samples = {}
+    for trace in traces:
+        for stage, seconds in trace.stages.items():
+            stage_samples.setdefault(stage, []).append(seconds)
+
+    return {
+        'turns': len(traces),
+        'wall_seconds': wall_seconds,
+        'turns_per_second': len(traces) / wall_seconds if wall_seconds else 0.0,
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': {
+            stage: {
+                'p50': percentile(samples, 50),
+                'p95': percentile(samples, 95),
+                'p99': percentile(samples, 99),
+                'mean': sum(samples) / len(samples),
+            }
+            for stage, samples in stage_samples.items()
+        },
+    }
+
+
+def prepare_workdir(workdir: Path) -> None:
+    """
+    Create the benchmark work directory with two agents built from the project templates. The benchmark chdirs here
+    so the relative agents/ and library/ paths used by the handlers resolve inside it.
+
+    :param workdir: The benchmark work directory.
+    """
+    templates_dir = PROJECT_ROOT / 'agent-templates'
+    for agent_name in (BENCH_HOST, BENCH_GUEST):
+        agent_dir = workdir / 'agents' / agent_name
+        agent_dir.mkdir(parents=True, exist_ok=True)
+        with (templates_dir / 'instructions.yaml').open('r') as file:
+            instructions = yaml.safe_load(file)
+        instructions['name'] = agent_name
+        with (agent_dir / 'instructions.yaml').open('w') as file:
+            yaml.safe_dump(instructions, file)
+        shutil.copy(templates_dir / 'params_config.yaml', agent_dir / 'params_config.yaml')
+
+
+def seed_collection(collection, size: int, username: str, seed: int = 0) -> None:
+    """
+    Fill a collection with synthetic past turns up to the requested size. Existing documents are kept, so re-runs only
+    pay for the difference.
+
+    :param collection: The Chroma collection to seed.
+    :param size: Target number of turns.
+    :param username: Speaker name for the synthetic user messages.
+    :param seed: Seed for the synthetic embeddings.
+    """
+    import numpy as np
+
+    existing = collection.count()
+    if existing >= size:
+        return
+    print(f"Seeding {collection.name}: {existing} -> {size} turns...")
+    rng = np.random.default_rng(seed + existing)
+    for start in range(existing, size, SEED_BATCH_SIZE):
+        end = min(start + SEED_BATCH_SIZE, size)
+        ids = [f"bench-seed-{i}" for i in range(start, end)]
+        documents = [
+            f"{username} @ 2024-01-01 @ 00:00: Let's revisit the {SEED_TOPICS[i % len(SEED_TOPICS)]} (note {i})."
+            f"{BENCH_HOST} @ 2024-01-01 @ 00:01: Noted, entry {i} on {SEED_TOPICS[(i * 7) % len(SEED_TOPICS)]} is filed."
+            for i in range(start, end)
+        ]
+        embeddings = rng.standard_normal((end - start, EMBEDDING_DIM)).astype('float32')
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        collection.upsert(ids=ids, documents=documents, embeddings=embeddings.tolist())
+
+
+def bench_user_agent(size: int, turns: int, server_port: int, seed: int) -> dict:
+    """
+    User>Agent scenario against a memory collection of the given size.
+    """
+    from handlers.agents_handler import Agent, ChatHandler, ModelInstructions, ParamsConfig
+    from handlers.chroma_handler import chroma_get_or_create_collection
+    from handlers.conversation_handler import start_new_conversation
+
+    username = f"bench_user_{size}"
+    agent = Agent(ParamsConfig(method='load', assistant_name=BENCH_HOST, verbose=False), ModelInstructions(method='load', assistant_name=BENCH_HOST, verbose=False))
+    collection = chroma_get_or_create_collection(f"{agent.name}-{username}")
+    seed_collection(collection, size, username, seed=seed)
+
+    chat_handler = ChatHandler(headless=True)
+    conversation = start_new_conversation(host=agent.name, host_is_bot=True, guest=username, guest_is_bot=False)
+
+    traces = []
+    started = time.perf_counter()
+    for i in range(turns):
+        request = BENCH_INPUTS[i % len(BENCH_INPUTS)]
+        chat_handler.run_user_turn(agent, conversation, collection, request, username=username, server_port=server_port)
+        traces.append(chat_handler.last_trace)
+    return summarize_traces(traces, time.perf_counter() - started)
+
+
+def bench_agent_agent(rounds: int, server_port: int) -> dict:
+    """
+    Agent>Agent scenario, one trace per round.
+    """
+    from handlers.agents_handler import Agent, ChatHandler, ModelInstructions, ParamsConfig
+    from handlers.chroma_handler import chroma_get_or_create_collection
+
+    host = Agent(ParamsConfig(method='load', assistant_name=BENCH_HOST, verbose=False), ModelInstructions(method='load', assistant_name=BENCH_HOST, verbose=False))
+    guest = Agent(ParamsConfig(method='load', assistant_name=BENCH_GUEST, verbose=False), ModelInstructions(method='load', assistant_name=BENCH_GUEST, verbose=False))
+    host_collection = chroma_get_or_create_collection(f"{host.name}-{guest.name}")
+    guest_collection = chroma_get_or_create_collection(f"{guest.name}-{host.name}")
+    host.last_response = f"Hello, I'm {host.name}, welcome to my room! Tell me about yourself and give me 2 topics."
+
+    chat_handler = ChatHandler(headless=True)
+    traces = []
+    started = time.perf_counter()
+    for _ in range(rounds):
+        chat_handler.run_agent_round(host, guest, host_collection, guest_collection, server_port=server_port)
+        traces.append(chat_handler.last_trace)
+    return summarize_traces(traces, time.perf_counter() - started)
+
+
+def compare_to_baseline(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Compare p95 stage latency and turns/s against the baseline.
+
+    :param results: Results of this run.
+    :param baseline: A previously stored results dict.
+    :param threshold: Allowed relative slowdown, e.g. 0.1 for 10%.
+    :returns: List of human readable regression descriptions, empty if none.
+    """
+    regressions = []
+    for scenario, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(scenario)
+        if not previous:
+            continue
+        if current['turns_per_second'] < previous['turns_per_second'] * (1 - threshold):
+            regressions.append(f"{scenario}: turns/s {current['turns_per_second']:.2f} < baseline {previous['turns_per_second']:.2f}")
+        for stage, stats in current['stages'].items():
+            previous_stats = previous['stages'].get(stage)
+            if previous_stats and stats['p95'] > previous_stats['p95'] * (1 + threshold):
+                regressions.append(f"{scenario}/{stage}: p95 {stats['p95'] * 1000:.1f}ms > baseline {previous_stats['p95'] * 1000:.1f}ms")
+    return regressions
+
+
+def print_results(results: dict) -> None:
+    indent = ' ' * 4
+    print("\n===============\n")
+    for scenario, summary in results['scenarios'].items():
+        print(f"{indent}{scenario}: {summary['turns']} turns, {summary['turns_per_second']:.2f} turns/s, peak RSS {summary['peak_rss_mb']:.0f} MB")
+        for stage, stats in summary['stages'].items():
+            print(f"{indent}   {stage:<20} p50 {stats['p50'] * 1000:8.1f}ms  p95 {stats['p95'] * 1000:8.1f}ms  p99 {stats['p99'] * 1000:8.1f}ms")
+        print(indent + "----------------------------------")
+    print("\n===============")
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout.decode('utf-8').strip()
+    except OSError:
+        return None
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="End-to-end chat turn benchmark against the mock Ollama server.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="Synthetic memory collection sizes (turns)")
+    parser.add_argument('--turns', type=int, default=50, help="User>Agent turns per collection size")
+    parser.add_argument('--rounds', type=int, default=25, help="Agent>Agent rounds")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--tokens-per-second', type=float, default=200.0, help="Mock server generation speed")
+    parser.add_argument('--prompt-eval-rate', type=float, default=2000.0, help="Mock server prompt eval speed")
+    parser.add_argument('--load-latency', type=float, default=0.5, help="Mock server cold load latency")
+    parser.add_argument('--workdir', type=Path, default=DEFAULT_WORKDIR)
+    parser.add_argument('--results-dir', type=Path, default=DEFAULT_RESULTS_DIR)
+    parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument('--threshold', type=float, default=0.10, help="Allowed relative regression before failing")
+    parser.add_argument('--update-baseline', action='store_true', help="Store this run as the new baseline")
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir.resolve()
+    results_dir = args.results_dir.resolve()
+    baseline_path = args.baseline.resolve()
+    prepare_workdir(workdir)
+    # The handlers resolve agents/ and library/ relative to the cwd, and chroma opens its client on import
+    os.chdir(workdir)
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+    from handlers.mock_ollama_server import MockOllamaConfig
+    from handlers.ollama_handler import OllamaServer
+
+    server = OllamaServer(mock=True, mock_config=MockOllamaConfig(
+        load_latency=args.load_latency,
+        prompt_eval_rate=args.prompt_eval_rate,
+        tokens_per_second=args.tokens_per_second,
+        seed=args.seed,
+    ))
+    server_port = server.find_available_port()
+    server.start_server(server_port)
+
+    results = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'config': {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+        'scenarios': {},
+    }
+    try:
+        for size in args.sizes:
+            results['scenarios'][f"user_agent_{size}"] = bench_user_agent(size, args.turns, server_port, args.seed)
+        if args.rounds:
+            results['scenarios']['agent_agent'] = bench_agent_agent(args.rounds, server_port)
+    finally:
+        server.stop_server()
+    results['peak_rss_mb'] = peak_rss_mb()
+
+    print_results(results)
+    results_dir.mkdir(parents=True, exist_ok=True)
+    results_path = results_dir / f"chat_turn_bench_{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    with results_path.open('w') as file:
+        json.dump(results, file, indent=2)
+    print(f"Results saved to {results_path}")
+
+    if args.update_baseline:
+        with baseline_path.open('w') as file:
+            json.dump(results, file, indent=2)
+        print(f"Baseline updated: {baseline_path}")
+        return 0
+
+    if not baseline_path.exists():
+        print(f"No baseline at {baseline_path}. Run with --update-baseline to store one.")
+        return 0
+
+    with baseline_path.open('r') as file:
+        baseline = json.load(file)
+    regressions = compare_to_baseline(results, baseline, args.threshold)
+    if regressions:
+        print(f"Regressions beyond {args.threshold:.0%} of baseline:")
+        for regression in regressions:
+            print(f"    {regression}")
+        return 1
+    print(f"No regressions beyond {args.threshold:.0%} of baseline.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
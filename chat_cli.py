@@ -1,6 +1,7 @@
 import cmd2
 from handlers.library_handler import Curator
 from handlers.agents_handler import Agent, ChatHandler
+from handlers.config_handler import config_store
 from utils.utilities import print_dev_stamp, toilet_banner_metal
 
 
@@ -17,6 +18,7 @@ def print_chat_menu():
     [2] Chat Room: Agent > Agent
     [3] List Existing Agents
     [4] Create New Agent
+    [5] Chat Room: Agent Room (any number of agents)
 
     [9] Back to main menu (or type 'back' or 'main')
 
@@ -36,6 +38,8 @@ class ChatApp(cmd2.Cmd):
         super().__init__()
         self.prompt = "3J:Chat>"
         self.intro = print_chat_intro()
+        # Parse every agent's configs while the user picks one
+        config_store.preload_in_background()
 
     def do_1(self, line):
         print("Starting chat...")
@@ -46,18 +50,23 @@ class ChatApp(cmd2.Cmd):
             return
         else:
             chat_handler = ChatHandler()
-            chat_handler.chat_with_agent(agent_name)
+            try:
+                chat_handler.chat_with_agent(agent_name)
+            finally:
+                chat_handler.close()
             print_chat_menu()
     
     def do_2(self, line):
+        chat_handler = ChatHandler()
         try:
-            chat_handler = ChatHandler()
             host_agent_name = input("Enter the name of the agent to host: ").lower()
             guest_agent_name = input("Enter the name of the agent to join: ").lower()
             chat_handler.multi_agent_chat(host_agent_name=host_agent_name, guest_agent_name=guest_agent_name)
             print_chat_menu()
         except Exception as e:
             print(f"Error: {e}")
+        finally:
+            chat_handler.close()
 
     def do_3(self, line):
         print("\nGetting agent(s) info...")
@@ -69,6 +78,18 @@ class ChatApp(cmd2.Cmd):
         curator = Curator()
         curator.create_new_agent()
 
+    def do_5(self, line):
+        chat_handler = ChatHandler()
+        try:
+            agent_names = [name.strip().lower() for name in input("Enter the agents to seat, comma separated (first one hosts): ").split(',') if name.strip()]
+            policy_name = input("Turn policy [round-robin, mention, bid] (default round-robin): ").strip().lower() or 'round-robin'
+            chat_handler.room_chat(agent_names, policy_name=policy_name)
+            print_chat_menu()
+        except Exception as e:
+            print(f"Error: {e}")
+        finally:
+            chat_handler.close()
+
     def do_9(self, line):
         print("\nHeading back to base...")
         return True
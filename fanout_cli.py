@@ -0,0 +1,50 @@
+import argparse
+from handlers.fanout_handler import FanoutConfig, load_jobs_from_jsonl, run_fanout, save_fanout_report
+
+
+def main(argv: list = None) -> None:
+    """
+    Run many independent conversations in parallel from a JSONL jobs file.
+
+    Each line is a ConversationJob, e.g.
+        {"kind": "agent_agent", "host": "salvadore", "guest": "dizzy", "rounds": 20}
+        {"kind": "scripted_user", "host": "clappy", "script": ["hi", "summarize our plan", "thanks"]}
+
+    Example:
+        python fanout_cli.py jobs.jsonl --workers 8 --backends 2 --max-in-flight 2
+    """
+    parser = argparse.ArgumentParser(description="Fan conversation jobs out across a process pool with shared Ollama backends.")
+    parser.add_argument('jobs', help="JSONL file of conversation jobs")
+    parser.add_argument('--workers', type=int, default=None, help="Process pool size (defaults to the CPU count)")
+    parser.add_argument('--ports', type=int, nargs='*', default=[], help="Ports of already running Ollama servers")
+    parser.add_argument('--backends', type=int, default=1, help="Ollama servers to start when no ports are given")
+    parser.add_argument('--max-in-flight', type=int, default=2, help="Concurrent generate calls per backend")
+    parser.add_argument('--output-dir', default="library/fanout/transcripts")
+    parser.add_argument('--chroma-root', default="library/fanout/chroma", help="Root directory for per-worker chroma partitions")
+    parser.add_argument('--mock', action='store_true', default=None, help="Start mock Ollama servers")
+    args = parser.parse_args(argv)
+
+    config = FanoutConfig(
+        backend_ports=args.ports,
+        backends=args.backends,
+        max_in_flight_per_backend=args.max_in_flight,
+        output_dir=args.output_dir,
+        chroma_root=args.chroma_root,
+        mock=args.mock,
+    )
+    if args.workers:
+        config.workers = args.workers
+
+    jobs = load_jobs_from_jsonl(args.jobs)
+    print(f"Running {len(jobs)} jobs on {config.workers} workers...")
+    report = run_fanout(jobs, config)
+    report_path = save_fanout_report(report, args.output_dir)
+
+    print(f"\nCompleted {report.completed}/{report.jobs} jobs ({report.failed} failed) in {report.wall_seconds:.1f}s, {report.turns_per_second:.2f} turns/s")
+    for worker, stats in sorted(report.per_worker.items()):
+        print(f"    worker {worker}: {stats['jobs']} jobs, {stats['turns']} turns, {stats['turns_per_second']:.2f} turns/s, {stats['admission_wait_seconds']:.1f}s waiting on backends")
+    print(f"Report: {report_path}")
+
+
+if __name__ == '__main__':
+    main()
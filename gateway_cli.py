@@ -0,0 +1,54 @@
+import argparse
+from handlers.gateway_handler import run_gateway
+from handlers.ollama_handler import OllamaServer
+
+
+def main(argv: list = None) -> None:
+    """
+    Serve the local chat gateway so several users can chat with agents over HTTP or WebSocket.
+
+    Example:
+        python gateway_cli.py --port 8080 --backends 2 --max-concurrent-turns 4
+        curl -s -X POST localhost:8080/api/sessions -d '{"agent": "clappy", "username": "ana"}'
+        curl -N -X POST localhost:8080/api/sessions/<session_id>/turns -d '{"message": "hello"}'
+    """
+    parser = argparse.ArgumentParser(description="Local HTTP/WebSocket chat gateway for Disco agents.")
+    parser.add_argument('--host', default='127.0.0.1', help="Interface to bind")
+    parser.add_argument('--port', type=int, default=8080, help="Port to bind")
+    parser.add_argument('--ollama-ports', type=int, nargs='*', default=[], help="Ports of already running Ollama servers")
+    parser.add_argument('--backends', type=int, default=1, help="Ollama servers to start when no ports are given")
+    parser.add_argument('--max-concurrent-turns', type=int, default=4, help="Turns generating at the same time")
+    parser.add_argument('--max-queue', type=int, default=16, help="Turns allowed to wait before new ones get a 503")
+    parser.add_argument('--idle-timeout', type=float, default=1800.0, help="Seconds before an idle session is evicted")
+    parser.add_argument('--turn-timeout', type=float, default=300.0, help="Seconds before a turn is cancelled")
+    parser.add_argument('--mock', action='store_true', default=None, help="Start mock Ollama servers")
+    args = parser.parse_args(argv)
+
+    servers = []
+    ports = list(args.ollama_ports)
+    if not ports:
+        for _ in range(args.backends):
+            server = OllamaServer(mock=args.mock, num_parallel=args.max_concurrent_turns)
+            port = server.find_available_port(start_port=4200 + len(servers) * 10)
+            server.start_server(port)
+            servers.append(server)
+            ports.append(port)
+
+    print(f"Gateway on http://{args.host}:{args.port} using Ollama ports {ports}")
+    try:
+        run_gateway(
+            args.host,
+            args.port,
+            ports,
+            max_concurrent_turns=args.max_concurrent_turns,
+            max_queued_turns=args.max_queue,
+            idle_timeout=args.idle_timeout,
+            turn_timeout=args.turn_timeout,
+        )
+    finally:
+        for server in servers:
+            server.stop_server()
+
+
+if __name__ == '__main__':
+    main()
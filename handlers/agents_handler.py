@@ -1,19 +1,34 @@
+import asyncio
 from collections import deque
-from dataclasses import asdict, dataclass
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, fields
 from datetime import datetime
 import json
 import os
 from pathlib import Path
-import re
 import shutil
-from string import Template
+import time
 from uuid import uuid4
 import requests
 import yaml
 from handlers.ollama_handler import OllamaServer
-from utils.utilities import chroma_results_format_to_prompt, debug_print_function_return, message_cache_format_to_prompt, stream_agent_response, toilet_banner_metal, toilet_banner_plain
+from utils.utilities import chroma_results_to_memory_list, format_function_return, message_cache_format_to_prompt, toilet_banner_metal, toilet_banner_plain
 from handlers.chroma_handler import chroma_get_or_create_collection, chroma_query_collection, chroma_upsert_to_collection
-from handlers.conversation_handler import MessageCache, start_new_conversation, Message, Turn
+from handlers.context_handler import ContextPlan, context_sizer, plan_context, token_estimator
+from handlers.conversation_handler import MessageCache, conversation_archive, format_chat_history, start_new_conversation, Message, Turn
+from handlers.config_handler import compile_prompt_template, config_store
+from handlers.registry_handler import agent_registry
+from handlers.metrics_handler import NS_PER_SECOND, GenerationMetrics, TurnTrace, metrics_ledger
+from handlers.retrieval_handler import RetrievalDecision, RetrievalGate, exclude_turn_results
+from handlers.routing_handler import ModelRouter, RouteDecision
+from handlers.scheduler_handler import INTERACTIVE, request_scheduler
+from handlers.summary_handler import RollingSummarizer
+from utils.terminal_renderer import TerminalRenderer
+
+
+# Ollama's defaults, used when an agent's params_config leaves them unset
+DEFAULT_NUM_CTX = 2048
+DEFAULT_NUM_PREDICT = 128
 
 
 @dataclass
@@ -36,18 +51,24 @@ class ModelInstructions:
     chat_start_token: str = None
     chat_end_token: str = None
     completions_url: str = None
+    summary_model: str = None
+    fast_model: str = None
+    routing_exemplars: dict = None
+    retrieval_stopwords: list = None
+    retrieval_skip_intents: list = None
 
-    def __init__(self, method: str, assistant_name: str = None) -> None:
+    def __init__(self, method: str, assistant_name: str = None, verbose: bool = True) -> None:
         """
         Model instructions init takes a method param as ['create', 'load'] to determine if the instructions should be loaded from a yaml file or created from the CLI.
 
         :param method: The method to use to create the instructions.
+        :param verbose: Print the loaded instructions. Headless callers turn this off.
         """
         if method == 'load':
             if assistant_name:
                 self.load_from_yaml(assistant_name)
-                print(f"Loaded instructions for {self.name}")
-                print(asdict(self))
+                if verbose:
+                    print(f"Loaded instructions for {self.name} ({self.llm_model})")
             else:
                 print("Error: No assistant name provided.")    
         elif method == 'create':
@@ -147,6 +168,7 @@ class ModelInstructions:
             f"Your current focus should be: {self.assistant_focus}{self.end_token}\n"
             f"{self.mem_start_token}Context from memory: "
             f"$context{self.mem_end_token}\n"
+            f"${{summary}}"
             f"Chat History: \n"
             f"$history\n"
             f"{self.start_token}$username: \n"
@@ -181,13 +203,22 @@ class ModelInstructions:
         """
         Load the agent instructions config from a yaml file.
         """
-        model_instructions = Path(f"agents/{assistant_name.lower()}/instructions.yaml")
-        if model_instructions.exists():
-            with model_instructions.open('r') as file:
-                instructions = yaml.safe_load(file)
-                for key, value in instructions.items():
-                    if hasattr(self, key):
-                        setattr(self, key, value)
+        self.apply(config_store.instructions(assistant_name))
+
+    def apply(self, instructions: dict, reset_missing: bool = False) -> None:
+        """
+        Set the fields present in an instructions dict, ignoring unknown keys.
+
+        :param reset_missing: Put the fields the dict leaves out back to their defaults, e.g. for a key deleted from the
+            file on hot reload. The name is kept.
+        """
+        if reset_missing:
+            for field in fields(self):
+                if field.name not in instructions and field.name != 'name':
+                    setattr(self, field.name, field.default)
+        for key, value in instructions.items():
+            if hasattr(self, key):
+                setattr(self, key, value)
     
     def save_to_yaml(self) -> None:
         """
@@ -198,6 +229,7 @@ class ModelInstructions:
         data = self.to_dict()
         with open(f"agents/{self.name.lower()}/instructions.yaml", "w") as f:
             yaml.safe_dump(data, f)
+        agent_registry.update(data)
 
 
 @dataclass
@@ -239,17 +271,18 @@ class ParamsConfig:
     tfs_z: int = None
     assistant_name: str = None
 
-    def __init__(self, method: str, assistant_name: str) -> None:
+    def __init__(self, method: str, assistant_name: str, verbose: bool = True) -> None:
         """
         Model Params Config init takes a method param as ['create', 'load'] to determine if the instructions should be loaded from a yaml file or created from the CLI.
 
         :param method: The method to use to create the instructions.
+        :param verbose: Print the loaded params. Headless callers turn this off.
         """
         self.assistant_name = assistant_name
         if method == 'load':
             self.load_from_yaml()
-            print(f"Loaded param config for {assistant_name}")
-            print(asdict(self))
+            if verbose:
+                print(f"Loaded param config for {assistant_name}")
         elif method == 'create':
             self.load_defaults_from_yaml()
             print("Creating new completion parameters configuration...")
@@ -304,13 +337,22 @@ class ParamsConfig:
         """
         Load the agent instructions config from a yaml file.
         """
-        params_config = Path(f"agents/{self.assistant_name.lower()}/params_config.yaml")
-        if params_config.exists():
-            with params_config.open('r') as file:
-                completion_params = yaml.safe_load(file)
-                for key, value in completion_params.items():
-                    if hasattr(self, key):
-                        setattr(self, key, value)
+        self.apply(config_store.params(self.assistant_name))
+
+    def apply(self, completion_params: dict, reset_missing: bool = False) -> None:
+        """
+        Set the fields present in a params dict, ignoring unknown keys.
+
+        :param reset_missing: Put the fields the dict leaves out back to their defaults, e.g. for a key deleted from the
+            file on hot reload. The assistant name is kept.
+        """
+        if reset_missing:
+            for field in fields(self):
+                if field.name not in completion_params and field.name != 'assistant_name':
+                    setattr(self, field.name, field.default)
+        for key, value in completion_params.items():
+            if hasattr(self, key):
+                setattr(self, key, value)
     
     def load_defaults_from_yaml(self) -> None:
         """
@@ -341,6 +383,15 @@ class Agent:
     instructions: ModelInstructions
     message_cache: MessageCache
     last_response: str
+    last_metrics: GenerationMetrics
+    admission: object
+    priority: str
+    last_context_plan: ContextPlan
+    summarizer: object
+    router: ModelRouter
+    last_route: RouteDecision
+    retrieval_gate: RetrievalGate
+    last_retrieval: RetrievalDecision
 
     def __init__(self, params_config: ParamsConfig, instructions: ModelInstructions) -> None:
         """
@@ -354,60 +405,158 @@ class Agent:
         self.name = self.instructions.name
         self.message_cache = MessageCache(20)
         self.last_response = None
+        self.last_metrics = None
+        # Optional callable(server_port) -> context manager yielding the port to use. Lets a caller (e.g. the fan-out
+        # workers) gate and route generate calls across shared backends without changing the call sites.
+        self.admission = None
+        # Scheduler priority class for this agent's calls. Headless and background work should use BATCH.
+        self.priority = INTERACTIVE
+        self.last_context_plan = None
+        # RollingSummarizer folding evicted history into a summary, see summary_handler
+        self.summarizer = None
+        # Agents with a fast_model send simple turns to it instead of llm_model
+        self.router = None
+        if self.instructions.fast_model:
+            self.router = ModelRouter(self.instructions.llm_model, self.instructions.fast_model, exemplars=self.instructions.routing_exemplars)
+        self.last_route = None
+        self.retrieval_gate = RetrievalGate(stopwords=self.instructions.retrieval_stopwords, skip_intents=self.instructions.retrieval_skip_intents)
+        self.last_retrieval = None
+
+    def reload_config(self, kind: str, data: dict) -> None:
+        """
+        Apply a changed config file to the running agent, called by the config store's watcher.
 
-    def build_prompt(self, user_input: str, username: str, agent_agent: bool) -> str:
+        :param kind: 'instructions' or 'params'.
+        :param data: The new file contents.
+        """
+        if kind == 'params':
+            self.params_config.apply(data, reset_missing=True)
+            return
+        self.instructions.apply(data, reset_missing=True)
+        # The prompt template is recompiled from the new script on the next turn; rebuild what was derived at init
+        self.router = None
+        if self.instructions.fast_model:
+            self.router = ModelRouter(self.instructions.llm_model, self.instructions.fast_model, exemplars=self.instructions.routing_exemplars)
+        self.retrieval_gate = RetrievalGate(stopwords=self.instructions.retrieval_stopwords, skip_intents=self.instructions.retrieval_skip_intents)
+
+    def retrieve_memories(self, query: str, collection_name: str, n_results: int = 5, exclude_turns: list = None) -> dict:
+        """
+        Query the agent's memory collection. Split out of build_prompt so callers can run retrieval ahead of time.
+        Queries go through the agent's retrieval gate, which skips trivial inputs and reuses the previous results for
+        near-identical queries. The gate's decision is kept on last_retrieval.
+
+        Memories of turns that are still in the history window are left out so the slots go to older memories instead of
+        repeating the history. The query over-fetches by the number of excluded turns and filters client side: a
+        where-clause on 'turn' would also drop documents without that key (knowledge base chunks, older memories) in
+        some Chroma versions.
+
+        :param query: The text to find memories for.
+        :param collection_name: The Chroma collection to query.
+        :param n_results: Number of memories to return.
+        :param exclude_turns: Turn uuids to leave out, defaults to the turns in the agent's message cache.
+        :returns: Raw chroma query results.
+        """
+        if exclude_turns is None:
+            exclude_turns = [turn.uuid for turn in self.message_cache.get_message_cache()]
+
+        def run_query(embedding: list) -> dict:
+            collection = chroma_get_or_create_collection(collection_name)
+            results = chroma_query_collection(collection, query, n_results + len(exclude_turns), query_embedding=embedding)
+            return exclude_turn_results(results, exclude_turns, n_results)
+
+        results, self.last_retrieval = self.retrieval_gate.retrieve(query, collection_name, run_query, exclude_turns=exclude_turns)
+        return results
+
+    def build_prompt(self, user_input: str, username: str, agent_agent: bool, trace: TurnTrace = None, chroma_results: dict = None) -> str:
         """
         Builds a prompt dynamically based on a template and user input.Parses a predefined prompt template to identify placeholders as $param. then substitute these placeholders with corresponding values from the class's instructions or other relevant sources. 
 
+        Sections are fitted into the context window first (see plan_context) so Ollama never has to cut the system
+        instructions off the front. Anything trimmed is noted on the trace under 'context'.
+
         :param user_input: (str) The user's input text to be included in the prompt.
+        :param trace: (TurnTrace) Optional trace to record retrieval and history timings on.
+        :param chroma_results: (dict) Memories retrieved ahead of time. When given, no query is made.
         :returns: (str) A formatted prompt string with the necessary substitutions made.
         """
+        trace = trace or TurnTrace()
         # Pull the prompt template
         prompt_template = self.instructions.to_prompt_script()
-        collection = chroma_get_or_create_collection(f"{self.name}-{username}")
 
-        if agent_agent == True:
-            formatted_chroma_results = None
-        else:
-            chroma_results = chroma_query_collection(collection, user_input, 5)
-            formatted_chroma_results = chroma_results_format_to_prompt(chroma_results)
+        if self.router:
+            with trace.stage('route'):
+                self.last_route = self.router.route(user_input)
+            trace.note('route', self.last_route.to_dict())
+        model = self.last_route.model if self.last_route else self.instructions.llm_model
 
-        message_history = self.message_cache.get_message_cache()
-        message_cache_formatted = message_cache_format_to_prompt(self, message_history)
-        print(f"Message Cache Formatted: {message_cache_formatted}")
+        with trace.stage('retrieval'):
+            if chroma_results is None and agent_agent != True:
+                chroma_results = self.retrieve_memories(user_input, f"{self.name}-{username}")
+                trace.note('retrieval', self.last_retrieval.to_dict())
+            memories = chroma_results_to_memory_list(chroma_results)
 
-        # all possible substitutions
-        substitutions = {
-            "history": message_cache_formatted,
-            "user_input": user_input,
-            "username": username,
-            "context": formatted_chroma_results,
-        }
-        # Identify the parameters in the template
-        params_in_template = set(re.findall(r'\$(\w+)', prompt_template))
+        with trace.stage('history'):
+            message_history = self.message_cache.get_message_cache()
+            history = [message_cache_format_to_prompt(self, [turn]) for turn in message_history]
 
+        # Compiled once per distinct script, a changed config gets a fresh template
+        template, params_in_template = compile_prompt_template(prompt_template)
         # Create a dictionary with only the necessary substitutions
-        required_substitutions = {key: substitutions[key] for key in params_in_template if key in substitutions}
+        substitutions = {key: "" for key in ("history", "user_input", "context", "summary") if key in params_in_template}
+        if "username" in params_in_template:
+            substitutions["username"] = username
+
+        with trace.stage('context_plan'):
+            plan = plan_context(
+                num_ctx=self.params_config.num_ctx or DEFAULT_NUM_CTX,
+                reserve_tokens=self.params_config.num_predict or DEFAULT_NUM_PREDICT,
+                system_text=template.safe_substitute(substitutions),
+                user_input=user_input,
+                memories=memories,
+                history=history,
+                estimator=token_estimator,
+                model=model,
+                summary=self.summarizer.prompt_section() if self.summarizer else "",
+            )
+        self.last_context_plan = plan
+        trace.note('context', plan.to_dict())
 
-        # Substitute the values into the template
-        template = Template(prompt_template)
-
-        return template.safe_substitute(required_substitutions)
+        # all possible substitutions
+        substitutions.update({
+            key: value for key, value in {
+                "history": format_chat_history(plan.history),
+                "user_input": plan.user_input,
+                "context": "".join(plan.memories) or "No results found.",
+                "summary": plan.summary,
+            }.items() if key in params_in_template
+        })
+
+        return template.safe_substitute(substitutions)
     
-    def generate_response(self, prompt: str, server_port: int) -> str:
+    def generate_request_data(self, prompt: str, stream: bool = False) -> dict:
         """
-        Generates an http request to the ollama server and returns the response.
+        Build the /api/generate request body for this agent. Shared by the sync and async generate paths.
+
+        The model is the one the router picked for the last built prompt, llm_model otherwise. num_ctx is sized to the
+        prompt: estimated prompt tokens plus num_predict, rounded up to a sticky bucket no larger than the configured
+        num_ctx (see ContextSizer).
 
         :param prompt: The prompt to send to the model.
-        :return: The response from the model.
+        :param stream: Ask Ollama to stream the response.
+        :returns: The request body dict.
         """
-        data = {
-            "model": self.instructions.llm_model,
-            "stream": False,
+        model = self.last_route.model if self.last_route else self.instructions.llm_model
+        num_ctx = self.params_config.num_ctx or DEFAULT_NUM_CTX
+        num_predict = self.params_config.num_predict or DEFAULT_NUM_PREDICT
+        needed_tokens = token_estimator.estimate(prompt, model) + num_predict
+        return {
+            "model": model,
+            "stream": stream,
             "prompt": prompt,
             "options": {
                 "temperature": self.params_config.temperature,
-                "num_ctx": self.params_config.num_ctx,
+                "num_ctx": context_sizer.size(model, needed_tokens, num_ctx),
+                "num_predict": num_predict,
                 "num_gpu": self.params_config.num_gpu,
                 "num_thread": self.params_config.num_thread,
                 "top_k": self.params_config.top_k,
@@ -415,29 +564,380 @@ class Agent:
             }
         }
 
+    def record_generation(self, data: dict, response_data: dict, queue_seconds: float = 0.0) -> None:
+        """
+        Keep Ollama's timing fields for the metrics ledger instead of dropping everything but the text.
+
+        :param data: The request body that was sent.
+        :param response_data: The decoded (final) response body.
+        :param queue_seconds: Time spent waiting for a backend slot.
+        """
+        self.last_metrics = GenerationMetrics.from_ollama_response(
+            agent=self.name,
+            model=data["model"],
+            options=data["options"],
+            response=response_data,
+            priority=self.priority,
+            queue_duration=int(queue_seconds * NS_PER_SECOND),
+            routed=self.last_route.routed if self.last_route else None,
+        )
+        token_estimator.calibrate(data["model"], data["prompt"], self.last_metrics.prompt_eval_count)
+        metrics_ledger.record(self.last_metrics)
+
+    def generate_response(self, prompt: str, server_port: int) -> str:
+        """
+        Generates an http request to the ollama server and returns the response. The call queues in the request
+        scheduler under the agent's priority class unless a custom admission hook is set.
+
+        :param prompt: The prompt to send to the model.
+        :return: The response from the model.
+        """
+        # Only set again on success, so a failed call doesn't report the previous call's metrics
+        self.last_metrics = None
+        data = self.generate_request_data(prompt)
+
         completion_headers = {
             'Content-Type': 'application/json',
         }
 
-        url = f"http://127.0.0.1:{server_port}/api/generate"
+        if self.admission:
+            admission = self.admission(server_port)
+        else:
+            admission = request_scheduler.admit(server_port, agent=self.name, priority=self.priority)
         try:
-            response = requests.post(url, headers=completion_headers, data=json.dumps(data))
+            queued = time.perf_counter()
+            with admission as backend_port:
+                queue_seconds = time.perf_counter() - queued
+                url = f"http://127.0.0.1:{backend_port}/api/generate"
+                response = requests.post(url, headers=completion_headers, data=json.dumps(data))
             # print(f"Response: {response}")
             if response.status_code == 200:
                 response_text = response.text
-                data = json.loads(response_text)
-                response_content = data["response"]
+                response_data = json.loads(response_text)
+                response_content = response_data["response"]
+
+                self.record_generation(data, response_data, queue_seconds)
 
                 return response_content
         except Exception as e:
             print(f'Error: {e}')
 
+    async def agenerate(self, prompt: str, server_port: int, session=None) -> str:
+        """
+        Async counterpart of generate_response. Uses aiohttp so the event loop keeps serving other sessions while the
+        model works. Errors are raised rather than printed so async callers can apply timeouts and retries.
+
+        :param prompt: The prompt to send to the model.
+        :param server_port: The port of the Ollama server.
+        :param session: Optional shared aiohttp.ClientSession. A throwaway session is used when omitted.
+        :return: The response from the model.
+        """
+        chunks = []
+        async for chunk in self.astream_response(prompt, server_port, session=session):
+            chunks.append(chunk)
+        return "".join(chunks)
+
+    @asynccontextmanager
+    async def aadmit(self, server_port: int):
+        """
+        Async counterpart of the admission in generate_response: the custom admission hook when one is set, the request
+        scheduler otherwise. Hooks are plain context managers that may block (e.g. BackendPool on a shared semaphore),
+        so they are entered on the default executor.
+
+        :returns: Async context manager yielding the backend port.
+        """
+        if not self.admission:
+            async with request_scheduler.aadmit(server_port, agent=self.name, priority=self.priority) as backend_port:
+                yield backend_port
+            return
+        admission = self.admission(server_port)
+        entering = asyncio.ensure_future(asyncio.to_thread(admission.__enter__))
+        try:
+            backend_port = await asyncio.shield(entering)
+        except asyncio.CancelledError:
+            # The thread can't be stopped, so give the slot back once it has been taken
+            entering.add_done_callback(lambda done: done.cancelled() or done.exception() or admission.__exit__(None, None, None))
+            raise
+        try:
+            yield backend_port
+        except BaseException as e:
+            if not admission.__exit__(type(e), e, e.__traceback__):
+                raise
+        else:
+            admission.__exit__(None, None, None)
+
+    async def astream_response(self, prompt: str, server_port: int, session=None):
+        """
+        Stream the response from Ollama as it is generated. Metrics are recorded from the final chunk. Like
+        generate_response, the call waits its turn in the request scheduler, or goes through the admission hook when
+        one is set.
+
+        :param prompt: The prompt to send to the model.
+        :param server_port: The port of the Ollama server.
+        :param session: Optional shared aiohttp.ClientSession.
+        :returns: Async generator of response text chunks.
+        """
+        import aiohttp
+
+        self.last_metrics = None
+        data = self.generate_request_data(prompt, stream=True)
+        owns_session = session is None
+        session = session or aiohttp.ClientSession()
+        try:
+            queued = time.perf_counter()
+            async with self.aadmit(server_port) as backend_port:
+                queue_seconds = time.perf_counter() - queued
+                url = f"http://127.0.0.1:{backend_port}/api/generate"
+                async with session.post(url, json=data) as response:
+                    response.raise_for_status()
+                    async for line in response.content:
+                        if not line.strip():
+                            continue
+                        chunk = json.loads(line)
+                        if chunk.get("response"):
+                            yield chunk["response"]
+                        if chunk.get("done"):
+                            self.record_generation(data, chunk, queue_seconds)
+        finally:
+            if owns_session:
+                await session.close()
+
+    async def aretrieve_memories(self, query: str, collection_name: str, n_results: int = 5) -> dict:
+        """
+        Async counterpart of retrieve_memories. Chroma is blocking, so the query runs on the default executor.
+        """
+        return await asyncio.to_thread(self.retrieve_memories, query, collection_name, n_results)
+
+    async def abuild_prompt(self, user_input: str, username: str, agent_agent: bool, trace: TurnTrace = None) -> str:
+        """
+        Async counterpart of build_prompt: retrieval runs on the executor, the rest is plain string work.
+        """
+        trace = trace or TurnTrace()
+        chroma_results = None
+        if not agent_agent:
+            with trace.stage('retrieval'):
+                chroma_results = await self.aretrieve_memories(user_input, f"{self.name}-{username}")
+            trace.note('retrieval', self.last_retrieval.to_dict())
+        return self.build_prompt(user_input, username=username, agent_agent=agent_agent, trace=trace, chroma_results=chroma_results)
+
+
+def host_greeting(host_agent: Agent) -> str:
+    """
+    The default opener a hosting agent uses to seed an Agent>Agent chat.
+
+    :param host_agent: The hosting agent.
+    :returns: The opening message.
+    """
+    return f"Hello, I'm {host_agent.name}, welcome to my room! People describe me as: {host_agent.instructions.description}. Please first tell me a little bit about yourself, and then give me 2 topics that you may be interested in speaking with me about. As your host, I will choose our first subject from your list."
+
 
 class ChatHandler:
     """
     With multiple chat formats, it makes sense to kick this to it's own class to keep things tidy. Supports User>Agent chat and Agent>Agent chat currently. Looking at integrating a pub sub library so num of participants is arbitrary. The logic for round robin with agents is a little trickier to flesh out and maintain a consistent flow. Agent>Agent chat still tends to convert to mimicry after 12 to 15 rounds but i am hoping improvements in source will fix this along with logic to filter, limit or remove chroma results from prompt which has shown good results in testing but limits the functionality and overall scope.
+
+    A single turn lives in run_user_turn / run_agent_round so the interactive loops and headless callers (benchmarks, simulations) share the exact same code path. Headless mode skips debug prints and the character streamed output.
+
+    Output is handed to a TerminalRenderer thread, so memory upserts and the next round run while the text is still
+    being streamed. The interactive loops wait for the renderer before prompting the user, and debug dumps go through
+    the same queue so they never interleave with a reply. close() stops the renderer thread.
     """
 
+    def __init__(self, headless: bool = False, response_delay: float = 0.05) -> None:
+        """
+        :param headless: Skip debug prompt dumps and terminal streaming of agent output.
+        :param response_delay: Per character delay used when streaming agent output to the terminal.
+        """
+        self.headless = headless
+        self.response_delay = response_delay
+        self.last_trace = None
+        self.renderer = None if headless else TerminalRenderer(char_delay=response_delay)
+
+    def render_response(self, agent_name: str, text: str) -> None:
+        """
+        Stream an agent's response to the terminal unless running headless.
+
+        :param agent_name: The speaker name shown before the text.
+        :param text: The response text.
+        """
+        if self.renderer is None:
+            return
+        self.renderer.submit(agent_name, text)
+
+    def wait_for_render(self) -> None:
+        """
+        Block until queued output is on screen. A keypress skips to the end.
+        """
+        if self.renderer is not None:
+            self.renderer.wait_until_idle()
+
+    def discard_render(self) -> None:
+        """
+        Drop output still queued, e.g. on Ctrl+C so it is not written over the menu.
+        """
+        if self.renderer is not None:
+            self.renderer.discard()
+
+    def close(self) -> None:
+        """
+        Stop the renderer thread. Call when the handler is done with.
+        """
+        if self.renderer is not None:
+            self.renderer.close()
+            self.renderer = None
+
+    def notify(self, text: str) -> None:
+        """
+        Print a status line from another thread, e.g. a config reload, queued behind the output being rendered.
+        """
+        if self.renderer is None:
+            print(text)
+            return
+        self.renderer.submit_text(text)
+
+    def debug_prompt(self, label: str, prompt: str) -> None:
+        if self.renderer is None:
+            return
+        self.renderer.submit_text(format_function_return(label, prompt))
+
+    def run_user_turn(self, agent: Agent, conversation, collection, request: str, username: str, server_port: int) -> Turn:
+        """
+        Runs one User>Agent turn: build the prompt, generate, render and store the turn in history and memory. Stage timings are left on self.last_trace.
+
+        :param agent: The agent answering.
+        :param conversation: The active Conversation.
+        :param collection: The Chroma collection turns are upserted to.
+        :param request: The user's message.
+        :param username: The user name used for prompt building and memory lookups.
+        :param server_port: The port of the Ollama server.
+        :returns: The completed Turn.
+        """
+        trace = TurnTrace()
+        with trace.stage('total'):
+            # Convert to Message class
+            request_message = Message(
+                uuid=str(uuid4()),
+                timestamp=str(datetime.now().strftime('%Y-%m-%d @ %H:%M')),
+                role='user',
+                speaker=conversation.guest,
+                content=request
+            )
+
+            # Build the prompt
+            with trace.stage('build_prompt'):
+                prompt = agent.build_prompt(request_message.content, username=username, agent_agent=False, trace=trace)
+
+            #####  DEBUG: PROMPT  #####
+            self.debug_prompt('Prompt', prompt)
+            #####  DEBUG END  #####
+
+            # Get the response and stream it to the terminal
+            with trace.stage('generate'):
+                response_content = agent.generate_response(prompt=prompt, server_port=server_port)
+
+            # Convert response to message class and pull the message string
+            response_message = Message(
+                uuid=str(uuid4()),
+                timestamp=str(datetime.now().strftime('%Y-%m-%d @ %H:%M')),
+                role='assistant',
+                speaker=conversation.host,
+                content=response_content
+            )
+
+            with trace.stage('render'):
+                self.render_response(agent.name, response_content)
+
+            # Create turn and add to chat history
+            convo_turn = Turn(
+                uuid=str(uuid4()),
+                request=request_message,
+                response=response_message
+            )
+
+            agent.message_cache.add_message(convo_turn)
+            conversation_archive.append_turn(conversation, convo_turn)
+
+            # Chroma Upsert
+            with trace.stage('memory_upsert'):
+                document = convo_turn.request.to_memory_string()
+                document += convo_turn.response.to_memory_string()
+                chroma_upsert_to_collection(collection=collection, metadata={'turn': convo_turn.uuid}, document=document, id=convo_turn.uuid)
+                agent.retrieval_gate.forget(collection.name)
+
+        self.last_trace = trace
+        return convo_turn
+
+    def run_agent_round(self, host_agent: Agent, guest_agent: Agent, host_collection, guest_collection, server_port: int) -> Turn:
+        """
+        Runs one Agent>Agent round: the guest answers the host's last response, then the host answers the guest. Stage timings are left on self.last_trace.
+
+        :param host_agent: The hosting agent, its last_response seeds the guest prompt.
+        :param guest_agent: The guest agent.
+        :param host_collection: Chroma collection for the host's memories of this chat.
+        :param guest_collection: Chroma collection for the guest's memories of this chat.
+        :param server_port: The port of the Ollama server.
+        :returns: The completed Turn (guest request, host response).
+        """
+        trace = TurnTrace()
+        with trace.stage('total'):
+            with trace.stage('guest_build_prompt'):
+                guest_prompt = guest_agent.build_prompt(host_agent.last_response, username=host_agent.name, agent_agent=True, trace=trace)
+            self.debug_prompt('Guest Prompt', guest_prompt)
+            with trace.stage('guest_generate'):
+                guest_agent.last_response = guest_agent.generate_response(prompt=guest_prompt, server_port=server_port)
+
+            guest_request_message = Message(
+                uuid=str(uuid4()),
+                timestamp=str(datetime.now().strftime('%Y-%m-%d @ %H:%M')),
+                role='user',
+                speaker=guest_agent.name,
+                content=guest_agent.last_response
+            )
+
+            # Stream the guest request to the terminal chat
+            with trace.stage('render'):
+                self.render_response(guest_agent.name, guest_agent.last_response)
+
+            # Request to Hosting Agent
+            with trace.stage('host_build_prompt'):
+                host_agent_prompt = host_agent.build_prompt(guest_agent.last_response, username=guest_agent.name, agent_agent=True, trace=trace)
+            self.debug_prompt('Host Prompt', host_agent_prompt)
+            with trace.stage('host_generate'):
+                host_agent.last_response = host_agent.generate_response(prompt=host_agent_prompt, server_port=server_port)
+
+            host_response_message = Message(
+                uuid=str(uuid4()),
+                timestamp=str(datetime.now().strftime('%Y-%m-%d @ %H:%M')),
+                role='assistant',
+                speaker=host_agent.name,
+                content=host_agent.last_response
+            )
+
+            # Stream the host response to the terminal chat
+            with trace.stage('render'):
+                self.render_response(host_agent.name, host_agent.last_response)
+
+            # Create turn and add to chat history
+            message_turn = Turn(
+                uuid=str(uuid4()),
+                request=guest_request_message,
+                response=host_response_message
+            )
+
+            # Add Turn to each agents' message cache for prompt context
+            host_agent.message_cache.add_message(message_turn)
+            guest_agent.message_cache.add_message(message_turn)
+
+            with trace.stage('memory_upsert'):
+                document = message_turn.request.to_memory_string()
+                document += message_turn.response.to_memory_string()
+                chroma_upsert_to_collection(collection=host_collection, metadata={'turn': message_turn.uuid}, document=document, id=message_turn.uuid)
+                chroma_upsert_to_collection(collection=guest_collection, metadata={'turn': message_turn.uuid}, document=document, id=message_turn.uuid)
+                host_agent.retrieval_gate.forget(host_collection.name)
+                guest_agent.retrieval_gate.forget(guest_collection.name)
+
+        self.last_trace = trace
+        return message_turn
+
     def chat_with_agent(self, assistant_name: str) -> None:
         """
         Opens a chat session and starts a new conversation with the selected agent. Chroma collection is created with agent:user nomencalture to refine results. 
@@ -462,9 +962,15 @@ class ChatHandler:
         available_port = server.find_available_port()
         print(f"This session will use port: {available_port}")
         server.start_server(available_port)
+        # Fold turns that scroll out of the history window into a rolling summary
+        summarizer = RollingSummarizer(agent, conversation, server_port=available_port).attach()
+        # Edits to the agent's instructions.yaml or params_config.yaml apply to the running chat
+        config_store.watch(agent, notify=self.notify)
+        last_turn = None
 
         try:
             while True:
+                self.wait_for_render()
                 # Get the user's request
                 request = input("User>> ")
 
@@ -478,64 +984,28 @@ class ChatHandler:
                     else:
                         agent.instructions.assistant_focus = input
                         continue
-                
-                # Convert to Message class
-                request_message = Message(
-                    uuid=str(uuid4()),
-                    timestamp=str(datetime.now().strftime('%Y-%m-%d @ %H:%M')),
-                    role='user',
-                    speaker=conversation.guest,
-                    content=request
-                )
-
-                # Build the prompt
-                username = os.environ.get('USER') or os.environ.get('USERNAME')
-                prompt = agent.build_prompt(request_message.content, username=username, agent_agent=False)
-
-                #####  DEBUG: PROMPT  #####
-                debug_print_function_return('Prompt', prompt)
-                #####  DEBUG END  #####
-
-                # Get the response and stream it to the terminal
-                response_content = agent.generate_response(prompt=prompt, server_port=available_port)
-
-                # Convert response to message class and pull the message string
-                response_message = Message(
-                    uuid=str(uuid4()),
-                    timestamp=str(datetime.now().strftime('%Y-%m-%d @ %H:%M')),
-                    role='assistant',
-                    speaker=conversation.host,
-                    content=response_content
-                )
-
-                stream_agent_response(agent.name, text=response_content, delay=.05)
-
-                # Create turn and add to chat history
-                convo_turn = Turn(
-                    uuid=str(uuid4()),
-                    request=request_message,
-                    response=response_message
-                )
 
-                agent.message_cache.add_message(convo_turn)
-
-                # Chroma Upsert
-                document = convo_turn.request.to_memory_string()
-                document += convo_turn.response.to_memory_string()
-                #print(f"Documents: {document}")
-                chroma_upsert_to_collection(collection=collection, metadata=None, document=document, id=convo_turn.uuid)
-                
-
-                ###  DEBUG: TURN BASE DICT  ###
-                #debug_print_function_return('Turn Base Dict', convo_turn.to_dict())
-                ###  DEBUG END  ###
+                elif request.startswith('!rate'):
+                    # Rate the last turn 1-5, training/archive_export.py can export only well rated turns
+                    rating = request[len('!rate'):].strip()
+                    if last_turn is None or not rating.isdigit() or not 1 <= int(rating) <= 5:
+                        print("Usage: !rate <1-5> after a turn")
+                    else:
+                        conversation_archive.rate_turn(conversation, last_turn.uuid, int(rating))
+                        print(f"Rated the last turn {rating}/5")
+                    continue
 
-                # Add Turn to Conversation YAML
+                username = os.environ.get('USER') or os.environ.get('USERNAME')
+                last_turn = self.run_user_turn(agent, conversation, collection, request, username=username, server_port=available_port)
         except KeyboardInterrupt:
+            self.discard_render()
             print("Interrupted by user...\n")
         
         finally:
+            self.wait_for_render()
             print("Chat session ended.")
+            config_store.unwatch(agent)
+            summarizer.close()
             server.stop_server()
 
 
@@ -577,61 +1047,59 @@ class ChatHandler:
 
 
         # Get the guest's first message before entering the chat to give the while loop a little better progression.
-        host_agent.last_response = f"Hello, I'm {host_agent.name}, welcome to my room! People describe me as: {host_agent.instructions.description}. Please first tell me a little bit about yourself, and then give me 2 topics that you may be interested in speaking with me about. As your host, I will choose our first subject from your list."
+        host_agent.last_response = host_greeting(host_agent)
+        config_store.watch(host_agent, notify=self.notify)
+        config_store.watch(guest_agent, notify=self.notify)
 
         try:
             while True:
-                guest_prompt = guest_agent.build_prompt(host_agent.last_response, username=host_agent.name, agent_agent=True)
-                debug_print_function_return('Guest Prompt', guest_prompt)
-                guest_agent.last_response = guest_agent.generate_response(prompt=guest_prompt, server_port=available_port)
-
-                guest_request_message = Message(
-                    uuid=str(uuid4()),
-                    timestamp=str(datetime.now().strftime('%Y-%m-%d @ %H:%M')),
-                    role='user',
-                    speaker=guest_agent.name,
-                    content=guest_agent.last_response
-                )
-
-                # Stream the guest request to the terminal chat
-                stream_agent_response(guest_agent.name, guest_agent.last_response, 0.05)
-                
-                # Request to Hosting Agent
-                host_agent_prompt = host_agent.build_prompt(guest_agent.last_response, username=guest_agent.name, agent_agent=True)
-                debug_print_function_return('Host Prompt', host_agent_prompt)
-                host_agent.last_response = host_agent.generate_response(prompt=host_agent_prompt, server_port=available_port)
-
-                host_response_message = Message(
-                    uuid=str(uuid4()),
-                    timestamp=str(datetime.now().strftime('%Y-%m-%d @ %H:%M')),
-                    role='assistant',
-                    speaker=host_agent.name,
-                    content=host_agent.last_response
-                )
-
-                # Stream the host response to the terminal chat
-                stream_agent_response(host_agent.name, host_agent.last_response, 0.05)
-
-                # Create turn and add to chat history
-                message_turn = Turn(
-                    uuid=str(uuid4()),
-                    request=guest_request_message,
-                    response=host_response_message
-                )
-
-                # Add Turn to each agents' message cache for prompt context
-                host_agent.message_cache.add_message(message_turn)
-                guest_agent.message_cache.add_message(message_turn)
+                message_turn = self.run_agent_round(host_agent, guest_agent, host_collection, guest_collection, server_port=available_port)
 
                 # Add Turn to Conversation
-                conversation.create_turn(guest_request_message, host_response_message)
-                document = message_turn.request.to_memory_string()
-                document += message_turn.response.to_memory_string()
-                chroma_upsert_to_collection(collection=host_collection, metadata=None, document=document, id=message_turn.uuid)
-                chroma_upsert_to_collection(collection=guest_collection, metadata=None, document=document, id=message_turn.uuid)
+                conversation.create_turn(message_turn.request, message_turn.response)
+                # No wait here: the next round generates while this one renders, the renderer speeds up on a backlog
         except KeyboardInterrupt:
+            self.discard_render()
             print("Interrupted by user...\n")
         
+        finally:
+            self.wait_for_render()
+            print("Chat session ended.")
+            config_store.unwatch(host_agent)
+            config_store.unwatch(guest_agent)
+            server.stop_server()
+
+
+    def room_chat(self, agent_names: list, policy_name: str = 'round-robin') -> None:
+        """
+        Puts any number of agents into one room. The turn policy decides who talks next; see handlers/room_handler.py.
+
+        :param agent_names: The agents to seat, the first one hosts.
+        :param policy_name: One of 'round-robin', 'mention' or 'bid'.
+        """
+        from handlers.room_handler import ChatRoom, TURN_POLICIES
+
+        agents = []
+        for agent_name in agent_names:
+            agents.append(Agent(ParamsConfig(method='load', assistant_name=agent_name), ModelInstructions(method='load', assistant_name=agent_name)))
+
+        if not self.headless:
+            toilet_banner_metal(agents[0].name)
+            toilet_banner_plain('welcomes')
+            for agent in agents[1:]:
+                toilet_banner_metal(agent.name)
+
+        server = OllamaServer(num_parallel=len(agents))
+        available_port = server.find_available_port()
+        print(f"This session will use port: {available_port}")
+        server.start_server(available_port)
+
+        room = ChatRoom(agents, policy=TURN_POLICIES[policy_name](), server_port=available_port, headless=self.headless, response_delay=self.response_delay)
+        try:
+            room.open()
+            room.run()
+        except KeyboardInterrupt:
+            print("Interrupted by user...\n")
         finally:
             print("Chat session ended.")
             server.stop_server()
@@ -0,0 +1,226 @@
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime
+import time
+from uuid import uuid4
+import aiohttp
+from handlers.agents_handler import Agent, ModelInstructions, ParamsConfig
+from handlers.chroma_handler import chroma_get_or_create_collection, chroma_upsert_to_collection
+from handlers.conversation_handler import Conversation, Message, Turn, conversation_archive, start_new_conversation
+from handlers.metrics_handler import TurnTrace
+from handlers.summary_handler import RollingSummarizer
+from utils.utilities import ainput
+
+
+@dataclass
+class ChatSession:
+    """
+    One user's chat with one agent inside an AsyncChatHandler. Turns within a session run one at a time; different
+    sessions run concurrently.
+    """
+    session_id: str
+    agent: Agent
+    conversation: Conversation
+    collection: object
+    username: str
+    created_at: float = field(default_factory=time.monotonic)
+    last_active: float = field(default_factory=time.monotonic)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    current_task: asyncio.Task = None
+    last_trace: TurnTrace = None
+    server_port: int = None
+    summarizer: RollingSummarizer = None
+
+
+class AsyncChatHandler:
+    """
+    asyncio chat engine. Multiplexes any number of User>Agent sessions on one event loop: generation goes through
+    aiohttp, Chroma retrieval and upserts run on the default executor, and every turn can be timed out or cancelled.
+    The blocking ChatHandler keeps its API for the terminal app; both share Agent's prompt and request building.
+    """
+
+    def __init__(self, server_port: int, turn_timeout: float = 300.0) -> None:
+        """
+        :param server_port: The Ollama server port shared by all sessions.
+        :param turn_timeout: Seconds before a turn is cancelled.
+        """
+        self.server_port = server_port
+        self.turn_timeout = turn_timeout
+        self.sessions = {}
+        self.http = None
+
+    async def get_http(self) -> aiohttp.ClientSession:
+        if self.http is None or self.http.closed:
+            self.http = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None))
+        return self.http
+
+    async def open_session(self, assistant_name: str, username: str, session_id: str = None, server_port: int = None) -> ChatSession:
+        """
+        Load an agent and start a conversation for a user. Loading reads yaml, so it runs on the executor.
+
+        :param assistant_name: The agent to chat with.
+        :param username: The user's name, used for the memory collection.
+        :param session_id: Optional id, generated when omitted.
+        :param server_port: Ollama port for this session, defaults to the handler's port.
+        :returns: The new ChatSession.
+        """
+        def load():
+            instructions = ModelInstructions(method='load', assistant_name=assistant_name, verbose=False)
+            config = ParamsConfig(method='load', assistant_name=assistant_name, verbose=False)
+            agent = Agent(params_config=config, instructions=instructions)
+            collection = chroma_get_or_create_collection(f"{agent.name}-{username}")
+            return agent, collection
+
+        agent, collection = await asyncio.to_thread(load)
+        conversation = start_new_conversation(host=agent.name, host_is_bot=True, guest=username, guest_is_bot=False)
+        session = ChatSession(
+            session_id=session_id or str(uuid4()),
+            agent=agent,
+            conversation=conversation,
+            collection=collection,
+            username=username,
+            server_port=server_port or self.server_port,
+        )
+        session.summarizer = RollingSummarizer(agent, conversation, server_port=session.server_port).attach()
+        self.sessions[session.session_id] = session
+        return session
+
+    async def run_turn(self, session_id: str, request: str, on_chunk=None) -> Turn:
+        """
+        Run one turn for a session, bounded by turn_timeout. Concurrent calls for the same session queue up.
+
+        :param session_id: The session to use.
+        :param request: The user's message.
+        :param on_chunk: Optional async callable receiving response text chunks as they stream in.
+        :returns: The completed Turn.
+        """
+        session = self.sessions[session_id]
+        async with session.lock:
+            session.current_task = asyncio.ensure_future(self._turn(session, request, on_chunk))
+            try:
+                return await asyncio.wait_for(session.current_task, timeout=self.turn_timeout)
+            finally:
+                session.current_task = None
+                session.last_active = time.monotonic()
+
+    async def _turn(self, session: ChatSession, request: str, on_chunk=None) -> Turn:
+        agent = session.agent
+        trace = TurnTrace()
+        with trace.stage('total'):
+            request_message = Message(
+                uuid=str(uuid4()),
+                timestamp=str(datetime.now().strftime('%Y-%m-%d @ %H:%M')),
+                role='user',
+                speaker=session.username,
+                content=request
+            )
+
+            with trace.stage('build_prompt'):
+                prompt = await agent.abuild_prompt(request, username=session.username, agent_agent=False, trace=trace)
+
+            http = await self.get_http()
+            chunks = []
+            with trace.stage('generate'):
+                async for chunk in agent.astream_response(prompt, session.server_port, session=http):
+                    chunks.append(chunk)
+                    if on_chunk is not None:
+                        await on_chunk(chunk)
+            agent.last_response = "".join(chunks)
+
+            response_message = Message(
+                uuid=str(uuid4()),
+                timestamp=str(datetime.now().strftime('%Y-%m-%d @ %H:%M')),
+                role='assistant',
+                speaker=agent.name,
+                content=agent.last_response
+            )
+            turn = Turn(uuid=str(uuid4()), request=request_message, response=response_message)
+            agent.message_cache.add_message(turn)
+            await asyncio.to_thread(conversation_archive.append_turn, session.conversation, turn)
+
+            with trace.stage('memory_upsert'):
+                document = turn.request.to_memory_string()
+                document += turn.response.to_memory_string()
+                await asyncio.to_thread(chroma_upsert_to_collection, collection=session.collection, metadata={'turn': turn.uuid}, document=document, id=turn.uuid)
+                agent.retrieval_gate.forget(session.collection.name)
+
+        session.last_trace = trace
+        return turn
+
+    def cancel_turn(self, session_id: str) -> bool:
+        """
+        Cancel the turn a session is currently running, if any.
+
+        :returns: True if a running turn was cancelled.
+        """
+        session = self.sessions.get(session_id)
+        if session is None or session.current_task is None or session.current_task.done():
+            return False
+        return session.current_task.cancel()
+
+    async def close_session(self, session_id: str) -> None:
+        """
+        Cancel any running turn and forget the session.
+        """
+        self.cancel_turn(session_id)
+        session = self.sessions.pop(session_id, None)
+        if session is not None and session.summarizer is not None:
+            session.summarizer.close(wait=False)
+
+    async def aclose(self) -> None:
+        """
+        Close every session and the shared HTTP client.
+        """
+        for session_id in list(self.sessions):
+            await self.close_session(session_id)
+        if self.http is not None:
+            await self.http.close()
+            self.http = None
+
+    async def chat_with_agent(self, assistant_name: str, username: str) -> None:
+        """
+        Terminal chat on the async engine. Output is printed as Ollama streams it, so the model sets the pace instead of
+        a per character sleep.
+
+        :param assistant_name: The agent to chat with.
+        :param username: The user's name.
+        """
+        session = await self.open_session(assistant_name, username=username)
+
+        async def show(chunk: str) -> None:
+            print(chunk, end='', flush=True)
+
+        try:
+            while True:
+                request = await ainput("User>> ")
+                if request in ('exit', 'quit'):
+                    print("Exiting chat...\n\n")
+                    break
+                print(f"\n{session.agent.name}>> ", end='', flush=True)
+                try:
+                    await self.run_turn(session.session_id, request, on_chunk=show)
+                except asyncio.TimeoutError:
+                    print("\n(turn timed out)")
+                print()
+        finally:
+            await self.close_session(session.session_id)
+
+
+async def run_scripted_sessions(handler: AsyncChatHandler, scripts: dict, username: str = 'async_user') -> dict:
+    """
+    Drive several sessions concurrently on one loop, each playing its own list of user lines. Useful for load tests.
+
+    :param handler: The AsyncChatHandler to use.
+    :param scripts: Dict of agent name -> list of user lines.
+    :param username: The user name for every session.
+    :returns: Dict of session id -> list of Turns.
+    """
+    async def play(agent_name: str, lines: list) -> tuple:
+        session = await handler.open_session(agent_name, username=username)
+        turns = []
+        for line in lines:
+            turns.append(await handler.run_turn(session.session_id, line))
+        return session.session_id, turns
+
+    results = await asyncio.gather(*(play(agent_name, lines) for agent_name, lines in scripts.items()))
+    return dict(results)
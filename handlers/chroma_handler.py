@@ -1,26 +1,66 @@
-from uuid import uuid4
-import chromadb
-from chromadb.utils import embedding_functions
+import hashlib
+import os
+import threading
 
 
-default_ef = embedding_functions.DefaultEmbeddingFunction()
-chroma = chromadb.PersistentClient(path="library/chroma.db")
+# chromadb is imported on first use, it is by far the slowest import on the way to the main menu.
+# The client is created lazily and per process. A client opened before a fork shares sqlite handles with the child, so
+# each process (fan-out workers included) opens its own on first use, optionally against its own partition path.
+chroma_path = os.environ.get('DISCO_CHROMA_PATH', "library/chroma.db")
+_chroma_client = None
+_chroma_client_pid = None
+_default_ef = None
 
-def chroma_get_collection(name: str) -> chromadb.Collection:
+
+def configure_chroma(path: str) -> None:
+    """
+    Point this process at a different chroma database, e.g. a per-worker partition. The next call opens a new client.
+
+    :param path: The directory of the persistent chroma database.
+    """
+    global chroma_path, _chroma_client
+    chroma_path = path
+    _chroma_client = None
+
+
+def get_chroma_client():
+    """
+    Get this process's chroma client, opening it on first use or after a fork.
+    """
+    global _chroma_client, _chroma_client_pid
+    if _chroma_client is None or _chroma_client_pid != os.getpid():
+        import chromadb
+        _chroma_client = chromadb.PersistentClient(path=chroma_path)
+        _chroma_client_pid = os.getpid()
+    return _chroma_client
+
+
+def get_default_embedding_function():
+    """
+    Chroma's default embedding function, loaded on first use.
+    """
+    global _default_ef
+    if _default_ef is None:
+        from chromadb.utils import embedding_functions
+        _default_ef = embedding_functions.DefaultEmbeddingFunction()
+    return _default_ef
+
+
+def chroma_get_collection(name: str) -> 'chromadb.Collection':
     """
     Load a collection from the chroma database.
     """
-    collection = chroma.get_collection(name=name)
+    collection = get_chroma_client().get_collection(name=name)
     return collection
 
 
-def chroma_get_or_create_collection(name: str) -> chromadb.Collection:
+def chroma_get_or_create_collection(name: str) -> 'chromadb.Collection':
     """
     Load a collection from the chroma database. If the collection does not exist, create it.
 
     :param name: The name of the collection to load or create.
     """
-    collection = chroma.get_or_create_collection(name=name, embedding_function=default_ef)
+    collection = get_chroma_client().get_or_create_collection(name=name, embedding_function=get_default_embedding_function())
     
     return collection
 
@@ -31,7 +71,7 @@ def chroma_delete_collection(name: str) -> None:
 
     :param name: The name of the collection to delete.
     """
-    chroma.delete_collection(name=name)
+    get_chroma_client().delete_collection(name=name)
     print(f"Deleted collection: {name}")
 
 
@@ -50,6 +90,61 @@ def chroma_upsert_to_collection(collection, document, metadata, id):
     )
 
 
+class MemoryWriteBuffer:
+    """
+    Collects memory upserts per collection and writes them as one batched upsert, so a room with N agents does not pay
+    N embedding + sqlite round trips on every turn.
+    """
+
+    def __init__(self, batch_size: int = 8, executor=None, on_flush=None) -> None:
+        """
+        :param batch_size: Pending documents per collection that trigger a flush.
+        :param executor: Optional executor to run full-batch flushes on, keeping them off the caller's thread.
+        :param on_flush: Called with a collection's name after its batch is written, e.g. RetrievalGate.forget.
+        """
+        self.batch_size = batch_size
+        self.executor = executor
+        self.on_flush = on_flush
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def add(self, collection, document: str, id: str, metadata: dict = None) -> None:
+        """
+        Queue a document for the collection and flush the collection once its batch is full.
+
+        :param collection: The collection to upsert into.
+        :param document: The memory document.
+        :param id: The document id.
+        :param metadata: Optional metadata for the document.
+        """
+        with self.lock:
+            batch = self.pending.setdefault(collection.name, {'collection': collection, 'ids': [], 'documents': [], 'metadatas': []})
+            batch['ids'].append(id)
+            batch['documents'].append(document)
+            batch['metadatas'].append(metadata)
+            ready = len(batch['ids']) >= self.batch_size
+        if ready and self.executor is not None:
+            self.executor.submit(self.flush, collection.name)
+        elif ready:
+            self.flush(collection.name)
+
+    def flush(self, collection_name: str = None) -> None:
+        """
+        Write pending documents for one collection, or for all of them.
+
+        :param collection_name: The collection to flush. Flushes everything when None.
+        """
+        with self.lock:
+            names = [collection_name] if collection_name else list(self.pending)
+            batches = [self.pending.pop(name) for name in names if name in self.pending]
+        for batch in batches:
+            # chroma wants either no metadatas or a non-empty dict for every document
+            metadatas = [metadata or {'source': 'chat'} for metadata in batch['metadatas']] if any(batch['metadatas']) else None
+            chroma_upsert_to_collection(collection=batch['collection'], document=batch['documents'], metadata=metadatas, id=batch['ids'])
+            if self.on_flush is not None:
+                self.on_flush(batch['collection'].name)
+
+
 def chroma_collection_change_name(collection: str, new_name: str) -> None:
     """
     Change the name of a collection in the chroma database.
@@ -60,17 +155,22 @@ def chroma_collection_change_name(collection: str, new_name: str) -> None:
     collection.change_name(name=new_name)
 
 
-def chroma_query_collection(collection: str, query: str, n_results: int) -> list:
+def chroma_query_collection(collection: str, query: str, n_results: int, query_embedding: list = None, where: dict = None) -> list:
     """
     Query a collection and return (n_results) nearest neighbors.
 
     :param collection: The collection to query.
     :param query: The query to use. ("This is a query")
     :param n_results: The number of results to return.
+    :param query_embedding: The query's embedding when the caller already has it, so it is not embedded again.
+    :param where: Optional metadata filter, e.g. {"agent": "clappy"}.
     returns: A list of results.
     """
+    if query_embedding is not None:
+        return collection.query(query_embeddings=[query_embedding], n_results=n_results, where=where)
     results = collection.query(query_texts=query, 
                                n_results=n_results,
+                               where=where,
     )
 
     return results
@@ -90,19 +190,48 @@ def chroma_upser_agent_command(command_name: str, command: str) -> None:
     )
 
 
-def upsert_chunks_from_corpus(self, corpus_path: str, collection_name: str) -> None:
-        """
-        Upserts chunks from a corpus file into the agent's collection. kb=knowledgebase
-
-        :param corpus_path: The path to the corpus file.
-        """
-        collection = chroma_get_or_create_collection(self.name)
-        with open(corpus_path, 'r') as file:
-            corpus = file.read()
-        corpus_chunks = corpus.split('\n\n')
-        for chunk in corpus_chunks:
-            chroma_upsert_to_collection(collection=collection_name, metadata=None, document=chunk, id=f"{self.name}-kb-{str(uuid4())}")
-        print("Corpus chunks upserted.")
+def upsert_chunks_from_corpus(corpus_path: str, collection_name: str, chunk_tokens: int = 256, overlap_tokens: int = 32,
+                              batch_size: int = 64) -> int:
+    """
+    Upserts chunks from a corpus file into a collection. kb=knowledgebase. The file is streamed and chunked by
+    sentences (see handlers/corpus_handler.py), and chunks are written in batches, so memory stays bounded on large
+    files. Ids are derived from a hash of the file's resolved path and the chunk index, so re-running on the same file
+    updates rather than duplicates, and files with the same name in different directories don't overwrite each other.
+    Chunks left over from an earlier, longer version of the file are deleted.
+
+    :param corpus_path: The path to the corpus file.
+    :param collection_name: The collection to upsert into, e.g. "<agent>-kb".
+    :param chunk_tokens: Estimated tokens per chunk.
+    :param overlap_tokens: Estimated tokens repeated from the end of the previous chunk.
+    :param batch_size: Chunks per upsert.
+    :returns: Number of chunks upserted.
+    """
+    from handlers.corpus_handler import iter_file_chunks
+
+    collection = chroma_get_or_create_collection(collection_name)
+    source = os.path.basename(corpus_path)
+    source_key = hashlib.blake2b(os.path.realpath(corpus_path).encode('utf-8'), digest_size=8).hexdigest()
+    batch = {'ids': [], 'documents': [], 'metadatas': []}
+    count = 0
+
+    def flush() -> None:
+        if batch['ids']:
+            chroma_upsert_to_collection(collection=collection, document=batch['documents'], metadata=batch['metadatas'], id=batch['ids'])
+            for values in batch.values():
+                values.clear()
+
+    for chunk in iter_file_chunks(corpus_path, max_tokens=chunk_tokens, overlap_tokens=overlap_tokens):
+        batch['ids'].append(f"{collection_name}-kb-{source_key}-{chunk.index}")
+        batch['documents'].append(chunk.text)
+        batch['metadatas'].append({'source': source, 'source_key': source_key, 'chunk': chunk.index})
+        count += 1
+        if len(batch['ids']) >= batch_size:
+            flush()
+    flush()
+    # The file may have been re-chunked into fewer chunks than the last time it was upserted
+    collection.delete(where={'$and': [{'source_key': source_key}, {'chunk': {'$gte': count}}]})
+    print(f"{count} corpus chunks upserted.")
+    return count
 
 
 def chroma_results_format_to_prompt(chroma_results):
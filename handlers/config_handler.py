@@ -0,0 +1,227 @@
+import copy
+from functools import lru_cache
+import hashlib
+import os
+from pathlib import Path
+import pickle
+import re
+from string import Template
+import threading
+import time
+import weakref
+import yaml
+
+# libyaml's loader is several times faster than the pure Python one, fall back when PyYAML was built without it
+YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+CONFIG_FILES = {'instructions': 'instructions.yaml', 'params': 'params_config.yaml'}
+CONFIG_CACHE_PATH = 'library/cache/agent_configs.pickle'
+
+
+def load_yaml(path) -> dict:
+    """
+    safe_load with the C loader when available.
+
+    :param path: The YAML file.
+    :returns: The parsed data, {} for an empty file.
+    """
+    with open(path, 'rb') as file:
+        return yaml.load(file, Loader=YamlLoader) or {}
+
+
+@lru_cache(maxsize=256)
+def compile_prompt_template(prompt_script: str) -> tuple:
+    """
+    Compile a prompt script once per distinct script text. Keyed by the text, so a changed config (reloaded or edited
+    in chat) compiles a fresh template on its next use.
+
+    :param prompt_script: The script from ModelInstructions.to_prompt_script.
+    :returns: (Template, frozenset of the $params in the script)
+    """
+    return Template(prompt_script), frozenset(re.findall(r'\$\{?(\w+)', prompt_script))
+
+
+class AgentConfigStore:
+    """
+    Parsed agent instructions and params, loaded once per file version instead of on every chat start. Files are parsed
+    with the C YAML loader and the results are kept in a pickle cache keyed by the file's content hash, so an unchanged
+    config is never parsed twice, even across runs. A watcher thread polls the files of watched agents and pushes
+    changes to them (see Agent.reload_config).
+    """
+
+    def __init__(self, root: str = 'agents', cache_path: str = CONFIG_CACHE_PATH, poll_interval: float = 2.0) -> None:
+        """
+        :param root: The agents directory.
+        :param cache_path: Where parsed configs are cached between runs. None keeps the cache in memory only.
+        :param poll_interval: Seconds between checks for changed files while agents are watched.
+        """
+        self.root = Path(root)
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.poll_interval = poll_interval
+        self.lock = threading.RLock()
+        # content hash -> parsed data
+        self.parsed = None
+        self.dirty = False
+        # path -> (mtime_ns, size, content hash)
+        self.file_versions = {}
+        self.watchers = {}
+        self.watch_thread = None
+
+    def path_for(self, agent_name: str, kind: str) -> Path:
+        return self.root / agent_name.lower() / CONFIG_FILES[kind]
+
+    def load_cache(self) -> dict:
+        if self.parsed is None:
+            self.parsed = {}
+            if self.cache_path and self.cache_path.exists():
+                try:
+                    with open(self.cache_path, 'rb') as file:
+                        self.parsed = pickle.load(file)
+                except Exception as e:
+                    print(f"Error: reading config cache {self.cache_path}, starting empty: {e}")
+        return self.parsed
+
+    def save_cache(self) -> None:
+        """
+        Write the parsed configs to disk if anything new was parsed.
+        """
+        with self.lock:
+            if not self.dirty or not self.cache_path:
+                return
+            # Drop entries for file versions that no longer exist
+            live = {version[2] for version in self.file_versions.values()}
+            parsed = {key: value for key, value in self.parsed.items() if key in live} if live else self.parsed
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self.cache_path.with_name(f"{self.cache_path.name}.{os.getpid()}.tmp")
+            with open(temp_path, 'wb') as file:
+                pickle.dump(parsed, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self.cache_path)
+            self.dirty = False
+
+    def load_file(self, path: Path) -> dict:
+        """
+        The parsed contents of a config file, parsing only when this version of the file has not been seen.
+
+        :returns: The parsed data, or None when the file does not exist.
+        """
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        key = str(path)
+        with self.lock:
+            parsed = self.load_cache()
+            version = self.file_versions.get(key)
+            if version and version[:2] == (stat.st_mtime_ns, stat.st_size) and version[2] in parsed:
+                return parsed[version[2]]
+
+            content = path.read_bytes()
+            digest = hashlib.sha1(content).hexdigest()
+            if digest not in parsed:
+                parsed[digest] = yaml.load(content, Loader=YamlLoader) or {}
+                self.dirty = True
+            self.file_versions[key] = (stat.st_mtime_ns, stat.st_size, digest)
+            return parsed[digest]
+
+    def get(self, agent_name: str, kind: str) -> dict:
+        """
+        :param agent_name: The agent's name.
+        :param kind: 'instructions' or 'params'.
+        :returns: A copy of the agent's config, {} when the file does not exist.
+        """
+        data = self.load_file(self.path_for(agent_name, kind))
+        return copy.deepcopy(data) if data else {}
+
+    def instructions(self, agent_name: str) -> dict:
+        return self.get(agent_name, 'instructions')
+
+    def params(self, agent_name: str) -> dict:
+        return self.get(agent_name, 'params')
+
+    def preload(self) -> int:
+        """
+        Load every agent's configs, e.g. when entering the chat lobby, and persist the cache.
+
+        :returns: Number of files loaded.
+        """
+        loaded = 0
+        if self.root.is_dir():
+            with os.scandir(self.root) as entries:
+                for entry in entries:
+                    if entry.is_dir() and not entry.name.startswith('.'):
+                        for kind in CONFIG_FILES:
+                            if self.load_file(self.path_for(entry.name, kind)) is not None:
+                                loaded += 1
+        self.save_cache()
+        return loaded
+
+    def preload_in_background(self) -> threading.Thread:
+        thread = threading.Thread(target=self.preload, name="config-preload", daemon=True)
+        thread.start()
+        return thread
+
+    def changed_kinds(self, agent_name: str) -> list:
+        """
+        Configs of an agent whose file changed since it was last loaded.
+        """
+        changed = []
+        for kind in CONFIG_FILES:
+            path = self.path_for(agent_name, kind)
+            version = self.file_versions.get(str(path))
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if version is None or version[:2] != (stat.st_mtime_ns, stat.st_size):
+                changed.append(kind)
+        return changed
+
+    def watch(self, agent, notify=None) -> None:
+        """
+        Hot reload an agent: when its instructions or params file changes, agent.reload_config(kind, data) is called
+        from the watcher thread. The store only keeps a weak reference to the agent.
+
+        :param agent: The Agent to reload.
+        :param notify: Called with reload messages, e.g. TerminalRenderer.submit_text so they don't interleave with a
+            reply being written. Defaults to print.
+        """
+        with self.lock:
+            for kind in CONFIG_FILES:
+                self.load_file(self.path_for(agent.name, kind))
+            self.watchers[id(agent)] = (agent.name, weakref.ref(agent), notify or print)
+            if self.watch_thread is None:
+                self.watch_thread = threading.Thread(target=self.watch_loop, name="config-watcher", daemon=True)
+                self.watch_thread.start()
+
+    def unwatch(self, agent) -> None:
+        with self.lock:
+            self.watchers.pop(id(agent), None)
+
+    def watch_loop(self) -> None:
+        while True:
+            time.sleep(self.poll_interval)
+            with self.lock:
+                watchers = list(self.watchers.items())
+                if not watchers:
+                    self.watch_thread = None
+                    return
+            for key, (agent_name, agent_ref, notify) in watchers:
+                agent = agent_ref()
+                if agent is None:
+                    self.unwatch_key(key)
+                    continue
+                for kind in self.changed_kinds(agent_name):
+                    try:
+                        data = self.get(agent_name, kind)
+                        agent.reload_config(kind, data)
+                        notify(f"Reloaded {CONFIG_FILES[kind]} for {agent_name}")
+                    except Exception as e:
+                        notify(f"Error: reloading {CONFIG_FILES[kind]} for {agent_name}: {e}")
+            self.save_cache()
+
+    def unwatch_key(self, key: int) -> None:
+        with self.lock:
+            self.watchers.pop(key, None)
+
+
+config_store = AgentConfigStore()
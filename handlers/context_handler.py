@@ -0,0 +1,252 @@
+from dataclasses import dataclass, field
+import os
+import threading
+
+
+DEFAULT_CHARS_PER_TOKEN = 4.0
+# Calibration samples implying a ratio outside this range are ignored. Ollama only counts the prompt tokens it had to
+# evaluate, so a prompt that mostly hit the KV cache reports far fewer tokens than it contains.
+MIN_CHARS_PER_TOKEN = 1.5
+MAX_CHARS_PER_TOKEN = 8.0
+
+
+class TokenEstimator:
+    """
+    Cheap character based token estimates, calibrated per model against the prompt_eval_count Ollama reports for real
+    prompts. No tokenizer is loaded; the ratio converges after a handful of calls.
+    """
+
+    def __init__(self, default_chars_per_token: float = DEFAULT_CHARS_PER_TOKEN, smoothing: float = 0.2) -> None:
+        """
+        :param default_chars_per_token: Ratio used for models with no samples yet.
+        :param smoothing: Weight of each new sample in the moving average.
+        """
+        self.default_chars_per_token = default_chars_per_token
+        self.smoothing = smoothing
+        self.chars_per_token = {}
+        self.lock = threading.Lock()
+
+    def ratio(self, model: str = None) -> float:
+        return self.chars_per_token.get(model, self.default_chars_per_token)
+
+    def estimate(self, text: str, model: str = None) -> int:
+        """
+        :param text: The text to size.
+        :param model: The model the text will be sent to.
+        :returns: Estimated token count.
+        """
+        if not text:
+            return 0
+        return int(len(text) / self.ratio(model)) + 1
+
+    def calibrate(self, model: str, prompt: str, prompt_eval_count: int) -> None:
+        """
+        Fold a real prompt/token count pair into the model's ratio.
+
+        :param model: The model that evaluated the prompt.
+        :param prompt: The prompt that was sent.
+        :param prompt_eval_count: Ollama's prompt_eval_count for it.
+        """
+        if not prompt or not prompt_eval_count:
+            return
+        sample = len(prompt) / prompt_eval_count
+        if not MIN_CHARS_PER_TOKEN <= sample <= MAX_CHARS_PER_TOKEN:
+            return
+        with self.lock:
+            current = self.chars_per_token.get(model)
+            self.chars_per_token[model] = sample if current is None else current + self.smoothing * (sample - current)
+
+
+@dataclass
+class ContextPlan:
+    """
+    What fits in the window. memories and history hold the kept items in prompt order.
+    """
+    budget: int
+    system_tokens: int
+    input_tokens: int
+    memory_tokens: int
+    history_tokens: int
+    user_input: str
+    memories: list = field(default_factory=list)
+    history: list = field(default_factory=list)
+    dropped_memories: int = 0
+    dropped_history: int = 0
+    input_truncated: bool = False
+    summary: str = ""
+    summary_tokens: int = 0
+    summary_dropped: bool = False
+
+    @property
+    def prompt_tokens(self) -> int:
+        return self.system_tokens + self.input_tokens + self.memory_tokens + self.summary_tokens + self.history_tokens
+
+    @property
+    def over_budget(self) -> bool:
+        return self.prompt_tokens > self.budget
+
+    def to_dict(self) -> dict:
+        return {
+            'budget': self.budget,
+            'prompt_tokens': self.prompt_tokens,
+            'system_tokens': self.system_tokens,
+            'input_tokens': self.input_tokens,
+            'memory_tokens': self.memory_tokens,
+            'history_tokens': self.history_tokens,
+            'summary_tokens': self.summary_tokens,
+            'summary_dropped': self.summary_dropped,
+            'dropped_memories': self.dropped_memories,
+            'dropped_history': self.dropped_history,
+            'input_truncated': self.input_truncated,
+            'over_budget': self.over_budget,
+        }
+
+
+def truncate_to_tokens(text: str, max_tokens: int, estimator: TokenEstimator, model: str = None) -> str:
+    """
+    Keep the end of a text within max_tokens. The end of a long message usually holds the actual question.
+    """
+    if max_tokens <= 1:
+        return ""
+    # estimate() rounds up by one token, leave room for it so the result sizes within max_tokens
+    max_chars = int((max_tokens - 1) * estimator.ratio(model))
+    return text if len(text) <= max_chars else text[-max_chars:]
+
+
+def plan_context(num_ctx: int, reserve_tokens: int, system_text: str, user_input: str, memories: list, history: list,
+                 estimator: TokenEstimator, model: str = None, summary: str = "") -> ContextPlan:
+    """
+    Fit prompt sections into the context window by priority: system text, then the current input, then memories in
+    rank order, then the rolling summary, then history newest first. Whatever does not fit is dropped, lowest value
+    first (oldest history, the summary, then the weakest memories). The system text is never trimmed since Ollama would
+    otherwise cut it off the front.
+
+    :param num_ctx: The model's context window in tokens.
+    :param reserve_tokens: Tokens kept free for the response (num_predict).
+    :param system_text: The fixed part of the prompt, i.e. the template with every variable section left empty.
+    :param user_input: The message being answered.
+    :param memories: Formatted memory strings, best match first.
+    :param history: Formatted history strings, oldest first.
+    :param estimator: TokenEstimator to size sections with.
+    :param model: The model the prompt is for, selects the calibrated ratio.
+    :param summary: The rolling summary section of earlier, evicted history.
+    :returns: ContextPlan with the kept sections and what was trimmed.
+    """
+    budget = max(num_ctx - reserve_tokens, 0)
+    system_tokens = estimator.estimate(system_text, model)
+    remaining = budget - system_tokens
+
+    input_tokens = estimator.estimate(user_input, model)
+    input_truncated = input_tokens > remaining
+    if input_truncated:
+        user_input = truncate_to_tokens(user_input, remaining, estimator, model)
+        input_tokens = estimator.estimate(user_input, model)
+    remaining -= input_tokens
+
+    kept_memories = []
+    memory_tokens = 0
+    for memory in memories:
+        tokens = estimator.estimate(memory, model)
+        if tokens > remaining:
+            break
+        kept_memories.append(memory)
+        memory_tokens += tokens
+        remaining -= tokens
+
+    summary_tokens = estimator.estimate(summary, model)
+    summary_dropped = summary_tokens > remaining
+    if summary_dropped:
+        summary, summary_tokens = "", 0
+    remaining -= summary_tokens
+
+    kept_history = []
+    history_tokens = 0
+    for item in reversed(history):
+        tokens = estimator.estimate(item, model)
+        if tokens > remaining:
+            break
+        kept_history.append(item)
+        history_tokens += tokens
+        remaining -= tokens
+    kept_history.reverse()
+
+    return ContextPlan(
+        budget=budget,
+        system_tokens=system_tokens,
+        input_tokens=input_tokens,
+        memory_tokens=memory_tokens,
+        history_tokens=history_tokens,
+        user_input=user_input,
+        memories=kept_memories,
+        history=kept_history,
+        dropped_memories=len(memories) - len(kept_memories),
+        dropped_history=len(history) - len(kept_history),
+        input_truncated=input_truncated,
+        summary=summary,
+        summary_tokens=summary_tokens,
+        summary_dropped=summary_dropped,
+    )
+
+
+class ContextSizer:
+    """
+    Picks num_ctx per request instead of always sending the agent's configured window. Ollama allocates the KV cache for
+    the whole window and reloads the model whenever num_ctx changes, so sizes come from a short list of buckets and are
+    sticky per model and configured window: growing happens at once, shrinking only after downsize_after requests in a
+    row fit a smaller bucket.
+
+    Token counts are character based estimates. A bucket that is too small makes Ollama cut the front of the prompt,
+    which is the system section, so the estimate is padded by headroom before a bucket is picked.
+    """
+
+    def __init__(self, buckets: tuple = (1024, 2048, 4096, 8192, 16384, 32768), downsize_after: int = 8, enabled: bool = None,
+                 headroom: float = 0.15) -> None:
+        """
+        :param buckets: Allowed window sizes, ascending.
+        :param downsize_after: Consecutive smaller requests needed before dropping to a smaller bucket.
+        :param enabled: Defaults to the DISCO_ADAPTIVE_NUM_CTX env var, on unless set to 0.
+        :param headroom: Fraction added to the estimated tokens to cover estimate error.
+        """
+        self.buckets = tuple(sorted(buckets))
+        self.downsize_after = downsize_after
+        self.headroom = headroom
+        self.enabled = os.environ.get('DISCO_ADAPTIVE_NUM_CTX', '1') != '0' if enabled is None else enabled
+        self.current = {}
+        self.smaller_streak = {}
+        self.lock = threading.Lock()
+
+    def bucket_for(self, tokens: int, max_ctx: int) -> int:
+        for bucket in self.buckets:
+            if bucket >= tokens and bucket <= max_ctx:
+                return bucket
+        return max_ctx
+
+    def size(self, model: str, needed_tokens: int, max_ctx: int) -> int:
+        """
+        :param model: The model the request is for.
+        :param needed_tokens: Estimated prompt tokens plus num_predict.
+        :param max_ctx: The agent's configured num_ctx, never exceeded.
+        :returns: The num_ctx to send.
+        """
+        if not self.enabled:
+            return max_ctx
+        wanted = self.bucket_for(int(needed_tokens * (1 + self.headroom)) + 1, max_ctx)
+        # Agents sharing a model with different configured windows keep separate state instead of resetting each other
+        key = (model, max_ctx)
+        with self.lock:
+            current = self.current.get(key)
+            if current is None or wanted > current:
+                self.current[key] = wanted
+                self.smaller_streak[key] = 0
+            elif wanted < current:
+                self.smaller_streak[key] = self.smaller_streak.get(key, 0) + 1
+                if self.smaller_streak[key] >= self.downsize_after:
+                    self.current[key] = wanted
+                    self.smaller_streak[key] = 0
+            else:
+                self.smaller_streak[key] = 0
+            return self.current[key]
+
+
+token_estimator = TokenEstimator()
+context_sizer = ContextSizer()
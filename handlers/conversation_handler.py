@@ -1,6 +1,9 @@
 from collections import deque
 from dataclasses import dataclass, field, asdict
 from datetime import datetime
+import json
+from pathlib import Path
+import threading
 from uuid import uuid4
 from typing import List
 import yaml
@@ -93,6 +96,7 @@ class Conversation:
     guest: str
     guest_is_bot: bool
     turns: List[Turn] = field(default_factory=list)
+    summary: str = ""
 
     def to_dict_dep(self):
         return {
@@ -136,9 +140,14 @@ class MessageCache:
         super().__init__(*args, **kwargs)
         self.capacity = capacity
         self.cache = deque(maxlen=capacity)
+        # Optional callable(turn) told about every turn that falls out of the window
+        self.on_evict = None
 
     def add_message(self, turn: Turn):
+        evicted = self.cache[0] if len(self.cache) == self.capacity else None
         self.cache.append(turn)
+        if evicted is not None and self.on_evict is not None:
+            self.on_evict(evicted)
 
     def get_message_cache(self):
         message_cache = list(self.cache)
@@ -183,6 +192,96 @@ def start_new_conversation(host: str, host_is_bot: bool, guest: str, guest_is_bo
     return conversation
 
 
+class ConversationArchive:
+    """
+    Append-only store of conversations, one JSONL file per conversation under root. The first line describes the
+    conversation; after that every line is a 'turn' or 'summary' record. Nothing is rewritten, so archiving a turn
+    costs the same however long the conversation gets.
+    """
+
+    def __init__(self, root: str = "library/conversations") -> None:
+        self.root = Path(root)
+        self.lock = threading.Lock()
+
+    def path_for(self, conversation_uuid: str) -> Path:
+        return self.root / f"{conversation_uuid}.jsonl"
+
+    def append(self, conversation: Conversation, record: dict) -> None:
+        """
+        Append a record to a conversation's file, writing the header line first if the file is new.
+        """
+        path = self.path_for(conversation.uuid)
+        record['archived_at'] = datetime.now().isoformat(timespec='seconds')
+        with self.lock:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            is_new = not path.exists()
+            with path.open('a') as file:
+                if is_new:
+                    header = {key: value for key, value in conversation.to_dict().items() if key not in ('turns', 'summary')}
+                    header['record'] = 'conversation'
+                    file.write(json.dumps(header) + "\n")
+                file.write(json.dumps(record) + "\n")
+
+    def append_turn(self, conversation: Conversation, turn: Turn) -> None:
+        """
+        Archive a completed turn.
+        """
+        self.append(conversation, {'record': 'turn', 'turn': turn.to_dict()})
+
+    def save_summary(self, conversation: Conversation, summarized_turns: int) -> None:
+        """
+        Archive the conversation's current rolling summary. The latest summary record wins on load.
+
+        :param summarized_turns: How many turns the summary covers.
+        """
+        self.append(conversation, {'record': 'summary', 'summary': conversation.summary, 'summarized_turns': summarized_turns})
+
+    def rate_turn(self, conversation: Conversation, turn_uuid: str, rating: int) -> None:
+        """
+        Archive a rating for one of the conversation's turns, e.g. to pick turns for training. The latest rating record
+        for a turn wins.
+
+        :param turn_uuid: The rated turn.
+        :param rating: The score, 1 (bad) to 5 (good) by convention.
+        """
+        self.append(conversation, {'record': 'rating', 'turn_uuid': turn_uuid, 'rating': rating})
+
+    def iter_records(self, conversation_uuid: str):
+        """
+        Stream a conversation's records back in order.
+        """
+        path = self.path_for(conversation_uuid)
+        if not path.exists():
+            return
+        with path.open('r') as file:
+            for line in file:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+    def load_conversation(self, conversation_uuid: str) -> Conversation:
+        """
+        Rebuild a Conversation with its turns and latest summary.
+
+        :returns: The Conversation, or None when it was never archived.
+        """
+        conversation = None
+        for record in self.iter_records(conversation_uuid):
+            kind = record.pop('record')
+            if kind == 'conversation':
+                record.pop('archived_at', None)
+                conversation = Conversation(**record)
+            elif kind == 'turn':
+                turn = record['turn']
+                conversation.turns.append(Turn(uuid=turn['uuid'], request=Message(**turn['request']), response=Message(**turn['response'])))
+            elif kind == 'summary':
+                conversation.summary = record['summary']
+        return conversation
+
+
+conversation_archive = ConversationArchive()
+
+
 def append_turn_to_conversation_yaml(conversations_file_path: str, conversation_uuid: str, turn: Turn) -> None:
     # TODO: testing
     """
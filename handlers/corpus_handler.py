@@ -0,0 +1,173 @@
+from dataclasses import dataclass
+import re
+from handlers.context_handler import TokenEstimator, token_estimator
+
+
+PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n")
+FALLBACK_SENTENCE_END = re.compile(r"(?<=[.!?])[\"')\]]*\s+")
+
+
+@dataclass
+class CorpusChunk:
+    """
+    :param index: Position of the chunk in the corpus, from 0.
+    :param text: The chunk text.
+    :param tokens: Estimated tokens in the text.
+    """
+    index: int
+    text: str
+    tokens: int
+
+
+def load_sentence_splitter():
+    """
+    NLTK's punkt sentence tokenizer when nltk and its punkt data are installed, a punctuation regex otherwise.
+
+    :returns: Callable(text) -> list of sentences.
+    """
+    try:
+        from nltk.tokenize import sent_tokenize
+        sent_tokenize("Probe. Sentence.")
+        return sent_tokenize
+    except (ImportError, LookupError):
+        print("NLTK punkt not available, splitting sentences on punctuation. Run initialize_nltk_punkt_tagger() to install it.")
+        return lambda text: [sentence for sentence in FALLBACK_SENTENCE_END.split(text) if sentence.strip()]
+
+
+def iter_text_blocks(file, read_size: int = 1 << 20, max_block_chars: int = 4 << 20):
+    """
+    Read a text file incrementally and yield blocks that end on a paragraph break, so nothing downstream holds more
+    than a few MB of the corpus. A block with no paragraph break is cut at its last newline, or at max_block_chars.
+
+    :param file: An open text file.
+    :param read_size: Characters read per call.
+    :param max_block_chars: Longest block yielded without a paragraph break.
+    """
+    buffer = ""
+    while True:
+        data = file.read(read_size)
+        if not data:
+            break
+        buffer += data
+        breaks = list(PARAGRAPH_BREAK.finditer(buffer))
+        if breaks:
+            cut = breaks[-1].end()
+        elif len(buffer) >= max_block_chars:
+            cut = buffer.rfind("\n") + 1 or max_block_chars
+        else:
+            continue
+        yield buffer[:cut]
+        buffer = buffer[cut:]
+    if buffer.strip():
+        yield buffer
+
+
+def split_long_sentence(sentence: str, max_tokens: int, estimator: TokenEstimator, model: str = None) -> list:
+    """
+    Break a sentence longer than max_tokens into word aligned pieces that fit.
+    """
+    max_chars = max(1, int(max_tokens * estimator.ratio(model)))
+    pieces = []
+    while len(sentence) > max_chars:
+        cut = sentence.rfind(" ", 0, max_chars)
+        cut = cut if cut > 0 else max_chars
+        pieces.append(sentence[:cut].strip())
+        sentence = sentence[cut:].strip()
+    if sentence:
+        pieces.append(sentence)
+    return pieces
+
+
+def iter_sentences(blocks, splitter, max_tokens: int, estimator: TokenEstimator, model: str = None):
+    """
+    Yield (sentence, starts_paragraph) pairs from text blocks, with over-long sentences broken up.
+    """
+    for block in blocks:
+        for paragraph in PARAGRAPH_BREAK.split(block):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            starts_paragraph = True
+            for sentence in splitter(paragraph):
+                for piece in split_long_sentence(sentence.strip(), max_tokens, estimator, model):
+                    yield piece, starts_paragraph
+                    starts_paragraph = False
+
+
+def iter_chunks(blocks, max_tokens: int = 256, overlap_tokens: int = 32, estimator: TokenEstimator = None,
+                model: str = None, splitter=None):
+    """
+    Pack sentences into chunks of at most max_tokens estimated tokens. Each chunk starts with the last sentences of the
+    previous one, up to overlap_tokens, so a fact split across a boundary is still whole in one chunk. Chunks are
+    yielded as they fill up.
+
+    :param blocks: Iterable of text blocks, e.g. iter_text_blocks(file) or [text].
+    :param max_tokens: Token budget per chunk.
+    :param overlap_tokens: Tokens carried over from the previous chunk. Must be below max_tokens.
+    :param estimator: Token estimator, defaults to the shared one.
+    :param model: Model whose token ratio to use.
+    :param splitter: Sentence splitter, defaults to load_sentence_splitter().
+    :returns: Generator of CorpusChunk.
+    """
+    if overlap_tokens >= max_tokens:
+        raise ValueError("overlap_tokens must be smaller than max_tokens")
+    estimator = estimator or token_estimator
+    splitter = splitter or load_sentence_splitter()
+
+    # (text, tokens, starts_paragraph) for the sentences in the current chunk
+    current = []
+    current_tokens = 0
+    fresh = 0
+    index = 0
+
+    def render(sentences: list) -> str:
+        parts = []
+        for position, (text, _, starts_paragraph) in enumerate(sentences):
+            if position:
+                parts.append("\n\n" if starts_paragraph else " ")
+            parts.append(text)
+        return "".join(parts)
+
+    for sentence, starts_paragraph in iter_sentences(blocks, splitter, max_tokens, estimator, model):
+        tokens = estimator.estimate(sentence, model)
+        if current and current_tokens + tokens > max_tokens:
+            yield CorpusChunk(index=index, text=render(current), tokens=current_tokens)
+            index += 1
+            # Carry the tail of this chunk over as the start of the next
+            overlap = []
+            overlap_total = 0
+            for entry in reversed(current):
+                if overlap_total + entry[1] > overlap_tokens or overlap_total + entry[1] + tokens > max_tokens:
+                    break
+                overlap.insert(0, entry)
+                overlap_total += entry[1]
+            current, current_tokens = overlap, overlap_total
+            fresh = 0
+        current.append((sentence, tokens, starts_paragraph))
+        current_tokens += tokens
+        fresh += 1
+
+    # A final chunk made only of carried over sentences would repeat the previous one
+    if current and fresh:
+        yield CorpusChunk(index=index, text=render(current), tokens=current_tokens)
+
+
+def iter_file_chunks(path: str, max_tokens: int = 256, overlap_tokens: int = 32, estimator: TokenEstimator = None,
+                     model: str = None, encoding: str = 'utf-8'):
+    """
+    Stream a corpus file as chunks, see iter_chunks. Memory stays bounded by the block size whatever the file size.
+
+    :param path: The corpus file.
+    :returns: Generator of CorpusChunk.
+    """
+    with open(path, 'r', encoding=encoding, errors='replace') as file:
+        yield from iter_chunks(iter_text_blocks(file), max_tokens, overlap_tokens, estimator, model)
+
+
+def chunk_text(text: str, max_tokens: int = 256, overlap_tokens: int = 32, estimator: TokenEstimator = None, model: str = None) -> list:
+    """
+    Chunk a string that is already in memory.
+
+    :returns: List of chunk texts.
+    """
+    return [chunk.text for chunk in iter_chunks([text], max_tokens, overlap_tokens, estimator, model)]
@@ -0,0 +1,314 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+import json
+import multiprocessing
+import os
+from pathlib import Path
+import time
+import traceback
+from uuid import uuid4
+
+
+@dataclass
+class ConversationJob:
+    """
+    One independent conversation to run on a fan-out worker.
+
+    :param kind: 'agent_agent' for a host/guest chat or 'scripted_user' to play a list of user lines against the host.
+    :param host: The hosting agent (the agent answering in scripted_user jobs).
+    :param guest: The guest agent for agent_agent jobs.
+    :param rounds: Rounds to run for agent_agent jobs.
+    :param opener: Optional seed message from the host for agent_agent jobs.
+    :param script: User lines for scripted_user jobs.
+    :param username: The user name for scripted_user jobs.
+    :param job_id: Unique id, also used for the transcript file name.
+    """
+    kind: str
+    host: str
+    guest: str = None
+    rounds: int = 10
+    opener: str = None
+    script: list = field(default_factory=list)
+    username: str = 'fanout_user'
+    job_id: str = field(default_factory=lambda: str(uuid4()))
+
+
+@dataclass
+class FanoutConfig:
+    """
+    Settings for a fan-out run.
+
+    :param workers: Size of the process pool.
+    :param backend_ports: Ports of Ollama servers that are already running. When empty, `backends` servers are started.
+    :param backends: Number of Ollama servers to start when no ports are given.
+    :param max_in_flight_per_backend: Generate calls allowed on one backend at the same time across all workers.
+    :param output_dir: Directory for per-job JSONL transcripts.
+    :param chroma_root: Root for per-worker chroma partitions (chroma_root/worker-<n>).
+    :param mock: Start mock Ollama servers instead of `ollama serve`.
+    """
+    workers: int = field(default_factory=lambda: os.cpu_count() or 1)
+    backend_ports: list = field(default_factory=list)
+    backends: int = 1
+    max_in_flight_per_backend: int = 2
+    output_dir: str = "library/fanout/transcripts"
+    chroma_root: str = "library/fanout/chroma"
+    mock: bool = None
+
+
+@dataclass
+class JobResult:
+    job_id: str
+    worker: int
+    ok: bool
+    turns: int = 0
+    generated_tokens: int = 0
+    wall_seconds: float = 0.0
+    admission_wait_seconds: float = 0.0
+    output_path: str = None
+    error: str = None
+
+
+@dataclass
+class FanoutReport:
+    jobs: int
+    completed: int
+    failed: int
+    wall_seconds: float
+    turns: int
+    turns_per_second: float
+    per_worker: dict
+    failures: list
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class BackendPool:
+    """
+    Admission control over a fixed set of Ollama backends shared by every worker process. Each backend has a
+    process-shared semaphore sized to its max in-flight calls; a call takes the first free backend, starting from the
+    worker's preferred one, and waits on the preferred backend when all are busy.
+    """
+
+    def __init__(self, ports: list, semaphores: list, preferred: int = 0) -> None:
+        self.ports = ports
+        self.semaphores = semaphores
+        self.preferred = preferred % len(ports)
+        self.wait_seconds = 0.0
+
+    @contextmanager
+    def admit(self, server_port: int = None):
+        """
+        Hold a slot on one backend for the duration of a generate call.
+
+        :param server_port: Ignored, the pool picks the backend.
+        :returns: Context manager yielding the backend port.
+        """
+        started = time.perf_counter()
+        order = [(self.preferred + offset) % len(self.ports) for offset in range(len(self.ports))]
+        chosen = None
+        for index in order:
+            if self.semaphores[index].acquire(block=False):
+                chosen = index
+                break
+        if chosen is None:
+            chosen = self.preferred
+            self.semaphores[chosen].acquire()
+        self.wait_seconds += time.perf_counter() - started
+        try:
+            yield self.ports[chosen]
+        finally:
+            self.semaphores[chosen].release()
+
+
+# Per worker process state, set by init_fanout_worker
+_worker_slot = None
+_worker_backends = None
+
+
+def init_fanout_worker(ports: list, semaphores: list, slot_counter, chroma_root: str) -> None:
+    """
+    Process pool initializer. Claims a stable worker slot, points chroma at the slot's own partition and sets up the
+    shared backend admission pool.
+    """
+    global _worker_slot, _worker_backends
+    from handlers.chroma_handler import configure_chroma
+
+    with slot_counter.get_lock():
+        _worker_slot = slot_counter.value
+        slot_counter.value += 1
+    configure_chroma(str(Path(chroma_root) / f"worker-{_worker_slot}"))
+    _worker_backends = BackendPool(ports, semaphores, preferred=_worker_slot)
+
+
+def run_conversation_job(job: ConversationJob, output_dir: str) -> JobResult:
+    """
+    Run one conversation job inside a worker. Agents are loaded fresh for every job so no state leaks between jobs.
+
+    :param job: The job to run.
+    :param output_dir: Directory for the job's JSONL transcript.
+    :returns: JobResult, with ok=False and the traceback on failure.
+    """
+    from handlers.agents_handler import ChatHandler, host_greeting
+    from handlers.chroma_handler import chroma_get_or_create_collection
+    from handlers.conversation_handler import start_new_conversation
+    from handlers.simulation_handler import load_agent
+
+    started = time.perf_counter()
+    wait_before = _worker_backends.wait_seconds
+    output_path = Path(output_dir) / f"{job.job_id}.jsonl"
+    result = JobResult(job_id=job.job_id, worker=_worker_slot, ok=False, output_path=str(output_path))
+    try:
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        chat_handler = ChatHandler(headless=True)
+        host_agent = load_agent(job.host)
+        host_agent.admission = _worker_backends.admit
+
+        with output_path.open('w') as transcript:
+            if job.kind == 'agent_agent':
+                guest_agent = load_agent(job.guest)
+                guest_agent.admission = _worker_backends.admit
+                host_collection = chroma_get_or_create_collection(f"{host_agent.name}-{guest_agent.name}")
+                guest_collection = chroma_get_or_create_collection(f"{guest_agent.name}-{host_agent.name}")
+                host_agent.last_response = job.opener or host_greeting(host_agent)
+                agents = (guest_agent, host_agent)
+                steps = range(job.rounds)
+            elif job.kind == 'scripted_user':
+                conversation = start_new_conversation(host=host_agent.name, host_is_bot=True, guest=job.username, guest_is_bot=False)
+                collection = chroma_get_or_create_collection(f"{host_agent.name}-{job.username}")
+                agents = (host_agent,)
+                steps = job.script
+            else:
+                raise ValueError(f"Unknown job kind: {job.kind}")
+
+            for step in steps:
+                if job.kind == 'agent_agent':
+                    turn = chat_handler.run_agent_round(host_agent, guest_agent, host_collection, guest_collection, server_port=None)
+                else:
+                    turn = chat_handler.run_user_turn(host_agent, conversation, collection, step, username=job.username, server_port=None)
+                for agent in agents:
+                    # generate_response clears last_metrics and sets it only on success; clearing it here as well
+                    # means a metrics record is counted once even if a later step never reaches generate
+                    if agent.last_metrics is not None:
+                        result.generated_tokens += agent.last_metrics.eval_count
+                        agent.last_metrics = None
+                transcript.write(json.dumps({'job': job.job_id, 'turn': turn.to_dict(), 'trace': chat_handler.last_trace.to_dict()}) + "\n")
+                result.turns += 1
+        result.ok = True
+    except Exception:
+        result.error = traceback.format_exc()
+    result.wall_seconds = time.perf_counter() - started
+    result.admission_wait_seconds = _worker_backends.wait_seconds - wait_before
+    return result
+
+
+def print_fanout_progress(done: int, total: int, result: JobResult) -> None:
+    status = "ok" if result.ok else "FAILED"
+    print(f"[{done}/{total}] job {result.job_id} {status} on worker {result.worker}: {result.turns} turns in {result.wall_seconds:.1f}s")
+
+
+def run_fanout(jobs: list, config: FanoutConfig = None, progress=print_fanout_progress) -> FanoutReport:
+    """
+    Shard conversation jobs across a process pool that shares a bounded set of Ollama backends.
+
+    :param jobs: ConversationJob list.
+    :param config: FanoutConfig, defaults to FanoutConfig().
+    :param progress: Callable(done, total, JobResult) called as each job finishes. None to stay quiet.
+    :returns: FanoutReport with aggregated throughput and failures.
+    """
+    from handlers.ollama_handler import OllamaServer
+
+    config = config or FanoutConfig()
+    # spawn keeps workers from inheriting sqlite handles, sockets or threads from this process
+    context = multiprocessing.get_context('spawn')
+
+    servers = []
+    ports = list(config.backend_ports)
+    if not ports:
+        for _ in range(config.backends):
+            server = OllamaServer(mock=config.mock)
+            port = server.find_available_port(start_port=4200 + len(servers) * 10)
+            server.start_server(port)
+            servers.append(server)
+            ports.append(port)
+
+    semaphores = [context.BoundedSemaphore(config.max_in_flight_per_backend) for _ in ports]
+    slot_counter = context.Value('i', 0)
+
+    per_worker = {}
+    failures = []
+    completed = 0
+    started = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(
+            max_workers=config.workers,
+            mp_context=context,
+            initializer=init_fanout_worker,
+            initargs=(ports, semaphores, slot_counter, config.chroma_root),
+        ) as executor:
+            futures = [executor.submit(run_conversation_job, job, config.output_dir) for job in jobs]
+            for future in as_completed(futures):
+                result = future.result()
+                completed += 1
+                stats = per_worker.setdefault(result.worker, {
+                    'jobs': 0, 'failed': 0, 'turns': 0, 'generated_tokens': 0, 'busy_seconds': 0.0, 'admission_wait_seconds': 0.0,
+                })
+                stats['jobs'] += 1
+                stats['turns'] += result.turns
+                stats['generated_tokens'] += result.generated_tokens
+                stats['busy_seconds'] += result.wall_seconds
+                stats['admission_wait_seconds'] += result.admission_wait_seconds
+                if not result.ok:
+                    stats['failed'] += 1
+                    failures.append({'job_id': result.job_id, 'worker': result.worker, 'error': result.error})
+                if progress:
+                    progress(completed, len(jobs), result)
+    finally:
+        for server in servers:
+            server.stop_server()
+
+    wall_seconds = time.perf_counter() - started
+    for stats in per_worker.values():
+        stats['turns_per_second'] = stats['turns'] / stats['busy_seconds'] if stats['busy_seconds'] else 0.0
+    turns = sum(stats['turns'] for stats in per_worker.values())
+    return FanoutReport(
+        jobs=len(jobs),
+        completed=completed - len(failures),
+        failed=len(failures),
+        wall_seconds=wall_seconds,
+        turns=turns,
+        turns_per_second=turns / wall_seconds if wall_seconds else 0.0,
+        per_worker=per_worker,
+        failures=failures,
+    )
+
+
+def load_jobs_from_jsonl(path: str) -> list:
+    """
+    Read ConversationJob specs, one JSON object per line.
+
+    :param path: Path to the jobs file.
+    :returns: List of ConversationJob.
+    """
+    jobs = []
+    with open(path, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                jobs.append(ConversationJob(**json.loads(line)))
+    return jobs
+
+
+def save_fanout_report(report: FanoutReport, output_dir: str) -> str:
+    """
+    Write the fan-out report next to the transcripts.
+
+    :returns: The report path.
+    """
+    report_path = Path(output_dir) / f"fanout_report_{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    with report_path.open('w') as file:
+        json.dump(report.to_dict(), file, indent=2)
+    return str(report_path)
@@ -0,0 +1,218 @@
+import asyncio
+import itertools
+import json
+import time
+from aiohttp import WSMsgType, web
+from handlers.async_chat_handler import AsyncChatHandler
+from handlers.library_handler import Curator
+from handlers.scheduler_handler import request_scheduler
+
+
+class ChatGateway:
+    """
+    HTTP/WebSocket front door for the async chat engine so several people can use the same agents from one process.
+    All sessions share one AsyncChatHandler (and so one Chroma client and HTTP connection pool) and the given Ollama
+    backends, assigned to sessions round robin.
+
+    Load is bounded two ways: at most max_concurrent_turns turns generate at once, and at most max_queued_turns wait
+    for a slot; beyond that new turns get a 503 with Retry-After. Streamed output is written with awaited writes, so a
+    slow client slows only its own turn.
+
+    Routes:
+        GET    /api/agents                    list agents
+        POST   /api/sessions                  {"agent": name, "username": name} -> session
+        GET    /api/sessions/{id}             resume: session info and in-window history
+        DELETE /api/sessions/{id}             close a session
+        POST   /api/sessions/{id}/turns       {"message": text} -> NDJSON stream of chunks, then the turn
+        GET    /ws/sessions/{id}              WebSocket: send {"message": text} or {"type": "cancel"}
+    """
+
+    def __init__(self, backend_ports: list, max_concurrent_turns: int = 4, max_queued_turns: int = 16,
+                 idle_timeout: float = 1800.0, turn_timeout: float = 300.0) -> None:
+        """
+        :param backend_ports: Ports of the Ollama servers sessions are spread across.
+        :param max_concurrent_turns: Turns allowed to generate at the same time.
+        :param max_queued_turns: Turns allowed to wait for a slot before new ones are rejected.
+        :param idle_timeout: Seconds without activity before a session is evicted.
+        :param turn_timeout: Seconds before a turn is cancelled.
+        """
+        self.backend_ports = backend_ports
+        self.backend_cycle = itertools.cycle(backend_ports)
+        self.chat_handler = AsyncChatHandler(server_port=backend_ports[0], turn_timeout=turn_timeout)
+        self.turn_slots = asyncio.Semaphore(max_concurrent_turns)
+        # Turns past the gateway's own limit would otherwise queue again per backend in the request scheduler
+        for backend_port in backend_ports:
+            request_scheduler.ensure_backend_limit(backend_port, max_concurrent_turns)
+        self.max_queued_turns = max_queued_turns
+        self.queued_turns = 0
+        self.idle_timeout = idle_timeout
+        self.eviction_task = None
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.add_routes([
+            web.get('/api/agents', self.list_agents),
+            web.post('/api/sessions', self.create_session),
+            web.get('/api/sessions/{session_id}', self.get_session),
+            web.delete('/api/sessions/{session_id}', self.delete_session),
+            web.post('/api/sessions/{session_id}/turns', self.post_turn),
+            web.get('/ws/sessions/{session_id}', self.session_websocket),
+        ])
+        app.on_startup.append(self.on_startup)
+        app.on_cleanup.append(self.on_cleanup)
+        return app
+
+    async def on_startup(self, app: web.Application) -> None:
+        self.eviction_task = asyncio.create_task(self.evict_idle_sessions())
+
+    async def on_cleanup(self, app: web.Application) -> None:
+        if self.eviction_task is not None:
+            self.eviction_task.cancel()
+        await self.chat_handler.aclose()
+
+    async def evict_idle_sessions(self) -> None:
+        """
+        Drop sessions that have been idle longer than idle_timeout. Sessions with a turn in flight are kept.
+        """
+        while True:
+            await asyncio.sleep(min(60.0, self.idle_timeout / 2))
+            now = time.monotonic()
+            for session_id, session in list(self.chat_handler.sessions.items()):
+                if session.current_task is None and now - session.last_active > self.idle_timeout:
+                    await self.chat_handler.close_session(session_id)
+
+    def get_session_or_404(self, request: web.Request):
+        session = self.chat_handler.sessions.get(request.match_info['session_id'])
+        if session is None:
+            raise web.HTTPNotFound(text=json.dumps({"error": "unknown or expired session"}), content_type='application/json')
+        return session
+
+    @staticmethod
+    def session_info(session) -> dict:
+        return {
+            "session_id": session.session_id,
+            "agent": session.agent.name,
+            "username": session.username,
+            "conversation": session.conversation.uuid,
+            "history": [turn.to_dict() for turn in session.agent.message_cache.get_message_cache()],
+        }
+
+    async def acquire_turn_slot(self) -> None:
+        """
+        Wait for a generation slot, or reject the turn when too many are already waiting.
+        """
+        if self.turn_slots.locked() and self.queued_turns >= self.max_queued_turns:
+            raise web.HTTPServiceUnavailable(
+                text=json.dumps({"error": "gateway busy, try again shortly"}),
+                content_type='application/json',
+                headers={'Retry-After': '5'},
+            )
+        self.queued_turns += 1
+        try:
+            await self.turn_slots.acquire()
+        finally:
+            self.queued_turns -= 1
+
+    async def list_agents(self, request: web.Request) -> web.Response:
+        agents = await asyncio.to_thread(Curator().extract_agent_info, 'agents')
+        return web.json_response({"agents": agents})
+
+    async def create_session(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        agent_name = (body.get('agent') or '').lower()
+        username = body.get('username') or 'gateway_user'
+        if not agent_name:
+            raise web.HTTPBadRequest(text=json.dumps({"error": "agent is required"}), content_type='application/json')
+        session = await self.chat_handler.open_session(agent_name, username=username, server_port=next(self.backend_cycle))
+        return web.json_response(self.session_info(session), status=201)
+
+    async def get_session(self, request: web.Request) -> web.Response:
+        return web.json_response(self.session_info(self.get_session_or_404(request)))
+
+    async def delete_session(self, request: web.Request) -> web.Response:
+        session = self.get_session_or_404(request)
+        await self.chat_handler.close_session(session.session_id)
+        return web.json_response({"closed": session.session_id})
+
+    async def post_turn(self, request: web.Request) -> web.StreamResponse:
+        session = self.get_session_or_404(request)
+        body = await request.json()
+        message = body.get('message')
+        if not message:
+            raise web.HTTPBadRequest(text=json.dumps({"error": "message is required"}), content_type='application/json')
+
+        await self.acquire_turn_slot()
+        try:
+            response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+            await response.prepare(request)
+
+            async def send_chunk(chunk: str) -> None:
+                await response.write((json.dumps({"type": "chunk", "text": chunk}) + "\n").encode('utf-8'))
+
+            try:
+                turn = await self.chat_handler.run_turn(session.session_id, message, on_chunk=send_chunk)
+                final = {"type": "done", "turn": turn.to_dict(), "trace": session.last_trace.to_dict()}
+            except asyncio.TimeoutError:
+                final = {"type": "error", "error": "turn timed out"}
+            except asyncio.CancelledError:
+                final = {"type": "error", "error": "turn cancelled"}
+            await response.write((json.dumps(final) + "\n").encode('utf-8'))
+            await response.write_eof()
+            return response
+        finally:
+            self.turn_slots.release()
+
+    async def session_websocket(self, request: web.Request) -> web.WebSocketResponse:
+        session = self.get_session_or_404(request)
+        ws = web.WebSocketResponse(heartbeat=30.0)
+        await ws.prepare(request)
+        running = None
+
+        async def run(message: str) -> None:
+            try:
+                await self.acquire_turn_slot()
+            except web.HTTPServiceUnavailable:
+                await ws.send_json({"type": "error", "error": "gateway busy, try again shortly"})
+                return
+            try:
+                async def send_chunk(chunk: str) -> None:
+                    await ws.send_json({"type": "chunk", "text": chunk})
+
+                turn = await self.chat_handler.run_turn(session.session_id, message, on_chunk=send_chunk)
+                await ws.send_json({"type": "done", "turn": turn.to_dict(), "trace": session.last_trace.to_dict()})
+            except asyncio.TimeoutError:
+                await ws.send_json({"type": "error", "error": "turn timed out"})
+            except asyncio.CancelledError:
+                if not ws.closed:
+                    await ws.send_json({"type": "error", "error": "turn cancelled"})
+            finally:
+                self.turn_slots.release()
+
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                payload = json.loads(msg.data)
+                if payload.get('type') == 'cancel':
+                    self.chat_handler.cancel_turn(session.session_id)
+                elif payload.get('message'):
+                    if running is not None and not running.done():
+                        await ws.send_json({"type": "error", "error": "a turn is already running for this session"})
+                        continue
+                    running = asyncio.create_task(run(payload['message']))
+        finally:
+            if running is not None and not running.done():
+                self.chat_handler.cancel_turn(session.session_id)
+        return ws
+
+
+def run_gateway(host: str, port: int, backend_ports: list, **gateway_options) -> None:
+    """
+    Serve the gateway until interrupted.
+
+    :param host: Interface to bind.
+    :param port: Port to bind.
+    :param backend_ports: Ollama server ports.
+    """
+    gateway = ChatGateway(backend_ports, **gateway_options)
+    web.run_app(gateway.create_app(), host=host, port=port)
@@ -5,20 +5,24 @@ from pathlib import Path
 import yaml
 from utils.utilities import stream_agent_response, stream_terminal_output
 from handlers.chroma_handler import chroma_get_or_create_collection
+from handlers.corpus_handler import chunk_text
+from handlers.ollama_handler import OllamaServer
+from handlers.registry_handler import AgentRegistry, agent_registry
+from handlers.scheduler_handler import BATCH
 
 
 
-def split_corpus_into_chunks(corpus, chunk_size=100, overlap=50):
-    tokens = corpus.split()
-    chunks = []
-    start = 0
-
-    while start < len(tokens):
-        end = start + chunk_size
-        chunks.append(' '.join(tokens[start:end]))
-        start += (chunk_size - overlap)
+def split_corpus_into_chunks(corpus, chunk_size=256, overlap=32):
+    """
+    Split a corpus string into sentence aligned chunks of about chunk_size tokens. Same chunking as
+    upsert_chunks_from_corpus; use handlers.corpus_handler.iter_file_chunks to stream large files instead.
 
-    return chunks
+    :param corpus: The corpus text.
+    :param chunk_size: Estimated tokens per chunk.
+    :param overlap: Estimated tokens repeated from the end of the previous chunk.
+    :returns: List of chunk texts.
+    """
+    return chunk_text(corpus, max_tokens=chunk_size, overlap_tokens=overlap)
 
 
 class Curator:
@@ -61,104 +65,112 @@ class Curator:
         stream_agent_response("Curator", f"Hello, System. Your new agent, {new_agent.name}, has been created successfully!", 0.05)
         stream_agent_response("System", f"Well done, Curator, thank you! {username}, please allow me a moment to provide the youngling with some instructions..", 0.05)
 
+        server = OllamaServer()
+        server_port = server.find_available_port()
+        server.start_server(server_port)
         try:
-            self.agent_intro_system(new_agent, username)
+            self.agent_intro_system(new_agent, username, server_port=server_port)
         except Exception as e:
             print(f"Agent {new_agent.name} was created successfully but did not complete it's initial instructions routine.")
             
             return print(e)
+        finally:
+            server.stop_server()
     
-    def agent_intro_system(self, new_agent: Agent, username: str):
+    def agent_intro_system(self, new_agent: Agent, username: str, server_port: int, quiet: bool = False) -> list:
+        """
+        Two step introduction for a new agent: acknowledge the System's instructions, then summarize its purpose.
+
+        :param new_agent: The new Agent.
+        :param username: The agent's designer, used in the prompts and the memory collection name.
+        :param server_port: The Ollama server port.
+        :param quiet: Do not stream the exchange to the terminal, e.g. when provisioning in bulk.
+        :returns: The agent's two responses.
+        :raises RuntimeError: When a step gets no response. generate_response reports errors by returning None.
+        """
+        def say(speaker: str, text: str) -> None:
+            if not quiet:
+                stream_agent_response(speaker, text, 0.05)
+
         creation_prompt = f"Hello, {new_agent.name}, my name is System. I help our Users like, {username} (your Designer), direct and provide instructions to our corps of purpose built agents, which now includes you. My base instructions to you will be visible to you at all times. For efficiency, I often issue updates, tasks and new commands through your context injection protocol which you will see as units of episodic memory using {username}'s role for indexing. Please carefully review your instructions, your memories and your chat history for context assistance when answering questions. Please acknowledge that you understand these instructions as they have been given to you and respond only with an affirmation so we may proceed."
-        stream_agent_response(username, f"(System):\n{creation_prompt}", 0.05)
-        print('----------------------------------------')
+        say(username, f"(System):\n{creation_prompt}")
+        if not quiet:
+            print('----------------------------------------')
+        # Introductions are background work, keep them from delaying anyone chatting on the same backend
+        new_agent.priority = BATCH
     
         c_prompt = new_agent.build_prompt(creation_prompt, username=username, agent_agent=False)
-        new_agent.last_response = new_agent.generate_response(prompt=c_prompt)
-        stream_agent_response(new_agent.name, f"{new_agent.name}:\n{new_agent.last_response}", 0.05)
+        new_agent.last_response = new_agent.generate_response(prompt=c_prompt, server_port=server_port)
+        if not new_agent.last_response:
+            raise RuntimeError(f"{new_agent.name} gave no response to the System instructions (Ollama on port {server_port})")
+        creation_response = new_agent.last_response
+        say(new_agent.name, f"{new_agent.name}:\n{new_agent.last_response}")
         
         purpose_prompt = f"Your prompt contains all directives necessary to identify your purpose and to guide your responses to best meet  {username}'s expectations. Before we go, please confirm that you understand your purpose and response directives by summarizing the entirety of the prompt given to you, in you own words. It will be my pleasure to assist you in any way I can and we do so look forward to working with you."
-        stream_agent_response(new_agent.name, f"System as {username}:\n{purpose_prompt}", 0.05)
+        say(new_agent.name, f"System as {username}:\n{purpose_prompt}")
 
         p_prompt = new_agent.build_prompt(purpose_prompt, username=username, agent_agent=False)
         # Generate new agent's purpose response
-        new_agent.last_response = new_agent.generate_response(prompt=p_prompt)
-        new_agent.generate_response(prompt=p_prompt)
-        stream_agent_response(new_agent.name, f"{new_agent.name}:\n{new_agent.last_response}", 0.05)
+        new_agent.last_response = new_agent.generate_response(prompt=p_prompt, server_port=server_port)
+        if not new_agent.last_response:
+            raise RuntimeError(f"{new_agent.name} gave no response to the purpose prompt (Ollama on port {server_port})")
+        say(new_agent.name, f"{new_agent.name}:\n{new_agent.last_response}")
+        return [creation_response, new_agent.last_response]
 
 
+    def provision_from_manifest(self, manifest_path: str, intros: bool = False, intro_workers: int = 4, server_port: int = None):
+        """
+        Non-interactive counterpart of create_new_agent for many agents at once, see handlers/provisioning_handler.py.
+
+        :param manifest_path: YAML or JSONL manifest of agent specs.
+        :param intros: Run the two step introduction for each new agent.
+        :param intro_workers: Number of intros in flight.
+        :param server_port: Port of a running Ollama server for the intros.
+        :returns: ProvisionResult
+        """
+        from handlers.provisioning_handler import load_manifest, provision_agents
+        return provision_agents(load_manifest(manifest_path), intros=intros, intro_workers=intro_workers, server_port=server_port)
+
     def add_new_agent_to_agents_list(self, new_agent_name: str, new_agent_llm_model: str, new_agent_description: str):
         """
-        Append a new agent record to the YAML file.
+        Add a new agent record to the agent registry.
 
-        :param new_agent: A dictionary representing the new agent.
-        :returns: New agent added to the agents list YAML file.
+        :param new_agent_name: The agent's name.
+        :param new_agent_llm_model: The agent's model.
+        :param new_agent_description: The agent's description.
+        :returns: New agent added to the registry.
         """
-        file_path = Path('agents/agents_list.yaml')
-        # Load the existing data
-        with open(file_path, 'r') as file:
-            data = yaml.safe_load(file) or {}
-
-        # Append the new agent
-        agents_list = data.get('agents', [])
-        new_agent = {
+        agent_registry.update({
             'agent_name': new_agent_name,
             'description': new_agent_description,
             'llm_model': new_agent_llm_model
-        }
-        agents_list.append(new_agent)
-        data['agents'] = agents_list
-
-        # Save the updated data
-        with open(file_path, 'w') as file:
-            yaml.safe_dump(data, file, default_flow_style=False)
+        })
         
     def remove_agent_from_agents_list(self, agent_name: str) -> None:
         """
-        Remove an agent from the agents list YAML file.
+        Remove an agent from the agent registry.
 
         :param agent_name: The name of the agent to remove.
         """
-        file_path = Path('agents/agents_list.yaml')
-        # Load the existing data
-        with open(file_path, 'r') as file:
-            data = yaml.safe_load(file) or {}
-
-        # Remove the agent
-        agents_list = data.get('agents', [])
-        agents_list = [agent for agent in agents_list if agent['agent_name'] != agent_name]
-        data['agents'] = agents_list
-
-        # Save the updated data
-        with open(file_path, 'w') as file:
-            yaml.safe_dump(data, file, default_flow_style=False)
+        agent_registry.remove(agent_name)
     
     def extract_agent_info(self, root_dir: str) -> list:
         """
-        Get the Agent instructions and info from the YAML file.
+        Get the Agent instructions and info from the agent registry, which only re-reads instructions.yaml files that
+        changed.
 
         :param root_dir: The root directory of the agents.
         """
-        agent_info_list = []
-
-        for item in os.listdir(root_dir):
-            dir_path = os.path.join(root_dir, item)
-            if os.path.isdir(dir_path):
-                yaml_file = os.path.join(dir_path, 'instructions.yaml')
-                if os.path.isfile(yaml_file):
-                    with open(yaml_file, 'r') as file:
-                        data = yaml.safe_load(file)
-                        agent_name = data.get('agent_name')
-                        description = data.get('description')
-                        llm_model = data.get('llm_model')
-                        agent_info_list.append({'agent_name': agent_name, 'description': description, 'llm_model': llm_model})
-
-        return agent_info_list
-
-    # iterate over agents_list.yaml and print the agents
+        registry = agent_registry if Path(root_dir) == agent_registry.root else AgentRegistry(root_dir)
+        return [
+            {'agent_name': agent['agent_name'], 'description': agent['description'], 'llm_model': agent['llm_model']}
+            for agent in registry.list_agents()
+        ]
+
+    # iterate over the agent registry and print the agents
     def list_existing_agents(self):
         """
-        list existing agents from agents_list.yaml
+        list existing agents from the agent registry
         """
         indent = ' ' * 4
         agents = self.extract_agent_info('agents')
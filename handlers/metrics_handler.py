@@ -0,0 +1,273 @@
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+import hashlib
+import json
+from pathlib import Path
+import time
+
+
+# Ollama reports a few milliseconds of load_duration when the model is already resident. Anything above this means the
+# model had to be (re)loaded into memory for the request.
+COLD_LOAD_THRESHOLD_NS = 500_000_000
+NS_PER_SECOND = 1_000_000_000
+
+
+def options_key(options: dict) -> str:
+    """
+    Builds a short stable key for a set of completion options so calls made with identical params group together.
+
+    :param options: The options dict sent to Ollama.
+    :returns: A 12 character hex digest of the sorted options.
+    """
+    encoded = json.dumps(options or {}, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()[:12]
+
+
+def tokens_per_second(count: int, duration_ns: int) -> float:
+    """
+    Converts an Ollama count/duration pair into a tokens per second rate.
+
+    :param count: Number of tokens processed.
+    :param duration_ns: Time spent processing them in nanoseconds.
+    :returns: Tokens per second, 0.0 when the duration is missing.
+    """
+    if not duration_ns:
+        return 0.0
+    return count / (duration_ns / NS_PER_SECOND)
+
+
+@dataclass
+class GenerationMetrics:
+    """
+    One row of the metrics ledger. Durations are kept in nanoseconds exactly as Ollama reports them.
+    """
+    agent: str
+    model: str
+    options_key: str
+    options: dict = field(default_factory=dict)
+    timestamp: str = None
+    prompt_eval_count: int = 0
+    prompt_eval_duration: int = 0
+    eval_count: int = 0
+    eval_duration: int = 0
+    load_duration: int = 0
+    total_duration: int = 0
+    priority: str = 'interactive'
+    queue_duration: int = 0
+    routed: str = None
+
+    @classmethod
+    def from_ollama_response(cls, agent: str, model: str, options: dict, response: dict, priority: str = 'interactive', queue_duration: int = 0,
+                             routed: str = None) -> 'GenerationMetrics':
+        """
+        Pulls the timing fields out of an /api/generate response body.
+
+        :param agent: The name of the agent that made the call.
+        :param model: The model the call was made against.
+        :param options: The options dict sent with the call.
+        :param response: The decoded JSON response from Ollama.
+        :param priority: The scheduler priority class the call ran under.
+        :param queue_duration: Nanoseconds the call waited for a backend slot before it was sent.
+        :param routed: 'fast' or 'main' when the agent's model router picked the model, None otherwise.
+        :returns: GenerationMetrics for the call.
+        """
+        return cls(
+            agent=agent,
+            model=model,
+            options_key=options_key(options),
+            options=options,
+            timestamp=datetime.now().isoformat(timespec='seconds'),
+            prompt_eval_count=response.get('prompt_eval_count') or 0,
+            prompt_eval_duration=response.get('prompt_eval_duration') or 0,
+            eval_count=response.get('eval_count') or 0,
+            eval_duration=response.get('eval_duration') or 0,
+            load_duration=response.get('load_duration') or 0,
+            total_duration=response.get('total_duration') or 0,
+            priority=priority,
+            queue_duration=queue_duration,
+            routed=routed,
+        )
+
+    @property
+    def cold_load(self) -> bool:
+        return self.load_duration > COLD_LOAD_THRESHOLD_NS
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class MetricsLedger:
+    """
+    Append-only JSONL ledger of per-call model metrics. Appending one line per call keeps the cost on the chat loop flat
+    no matter how large the ledger grows; aggregation only happens when a report is requested.
+    """
+
+    def __init__(self, path: str = "library/metrics/model_metrics.jsonl") -> None:
+        self.path = Path(path)
+
+    def record(self, metrics: GenerationMetrics) -> None:
+        """
+        Append a metrics row to the ledger.
+
+        :param metrics: The metrics for a single generate call.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open('a') as file:
+            file.write(json.dumps(metrics.to_dict()) + "\n")
+
+    def iter_records(self):
+        """
+        Stream the ledger rows back as GenerationMetrics.
+
+        :returns: Generator of GenerationMetrics.
+        """
+        if not self.path.exists():
+            return
+        with self.path.open('r') as file:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield GenerationMetrics(**json.loads(line))
+                except (json.JSONDecodeError, TypeError):
+                    continue
+
+    def summarize(self, group_by: tuple = ('model',)) -> dict:
+        """
+        Aggregate the ledger into throughput and cold-load stats.
+
+        :param group_by: GenerationMetrics fields to group on, e.g. ('model',), ('priority',) or ('agent', 'model', 'options_key').
+        :returns: Dict of group key tuple -> stats dict.
+        """
+        totals = {}
+        for row in self.iter_records():
+            key = tuple(getattr(row, name) for name in group_by)
+            stats = totals.setdefault(key, {
+                'calls': 0,
+                'cold_loads': 0,
+                'prompt_eval_count': 0,
+                'prompt_eval_duration': 0,
+                'eval_count': 0,
+                'eval_duration': 0,
+                'load_duration': 0,
+                'queue_duration': 0,
+            })
+            stats['calls'] += 1
+            stats['cold_loads'] += int(row.cold_load)
+            stats['prompt_eval_count'] += row.prompt_eval_count
+            stats['prompt_eval_duration'] += row.prompt_eval_duration
+            stats['eval_count'] += row.eval_count
+            stats['eval_duration'] += row.eval_duration
+            stats['load_duration'] += row.load_duration
+            stats['queue_duration'] += row.queue_duration
+
+        summary = {}
+        for key, stats in totals.items():
+            summary[key] = {
+                'calls': stats['calls'],
+                'tokens_per_second': tokens_per_second(stats['eval_count'], stats['eval_duration']),
+                'prompt_eval_per_second': tokens_per_second(stats['prompt_eval_count'], stats['prompt_eval_duration']),
+                'cold_load_rate': stats['cold_loads'] / stats['calls'],
+                'avg_load_seconds': stats['load_duration'] / stats['calls'] / NS_PER_SECOND,
+                'avg_queue_seconds': stats['queue_duration'] / stats['calls'] / NS_PER_SECOND,
+                'avg_prompt_tokens': stats['prompt_eval_count'] / stats['calls'],
+                'avg_eval_tokens': stats['eval_count'] / stats['calls'],
+            }
+        return summary
+
+    def routing_report(self) -> dict:
+        """
+        Per agent routing split and estimated savings. Savings compare the average total time of fast routed calls with
+        the agent's main model calls, multiplied by the number of fast calls.
+
+        :returns: Dict of agent -> stats dict.
+        """
+        totals = {}
+        for row in self.iter_records():
+            if row.routed is None:
+                continue
+            stats = totals.setdefault(row.agent, {'fast': [0, 0], 'main': [0, 0]})
+            stats[row.routed][0] += 1
+            stats[row.routed][1] += row.total_duration
+
+        report = {}
+        for agent, stats in totals.items():
+            fast_calls, fast_duration = stats['fast']
+            main_calls, main_duration = stats['main']
+            fast_avg = fast_duration / fast_calls / NS_PER_SECOND if fast_calls else 0.0
+            main_avg = main_duration / main_calls / NS_PER_SECOND if main_calls else 0.0
+            report[agent] = {
+                'fast_calls': fast_calls,
+                'main_calls': main_calls,
+                'fast_share': fast_calls / (fast_calls + main_calls),
+                'avg_fast_seconds': fast_avg,
+                'avg_main_seconds': main_avg,
+                'estimated_seconds_saved': max(main_avg - fast_avg, 0.0) * fast_calls if main_calls else 0.0,
+            }
+        return report
+
+    def print_model_report(self) -> None:
+        """
+        Print per-model throughput and cold-load frequency to the terminal.
+        """
+        summary = self.summarize(group_by=('model',))
+        if not summary:
+            print("No model metrics recorded yet. Chat with an agent to start collecting them.")
+            return
+
+        indent = ' ' * 4
+        print("===============\n")
+        print(f"{indent}Model performance (from {self.path}):\n")
+        for (model,), stats in sorted(summary.items()):
+            print(f"{indent}{model}")
+            print(f"{indent}   Calls: {stats['calls']}")
+            print(f"{indent}   Generation: {stats['tokens_per_second']:.1f} tokens/s (avg {stats['avg_eval_tokens']:.0f} tokens)")
+            print(f"{indent}   Prompt eval: {stats['prompt_eval_per_second']:.1f} tokens/s (avg {stats['avg_prompt_tokens']:.0f} tokens)")
+            print(f"{indent}   Cold loads: {stats['cold_load_rate']:.0%} (avg load {stats['avg_load_seconds']:.2f}s)")
+            print(indent + "----------------------------------")
+        for (priority,), stats in sorted(self.summarize(group_by=('priority',)).items()):
+            print(f"{indent}Queue wait ({priority}): avg {stats['avg_queue_seconds']:.2f}s over {stats['calls']} calls")
+        for agent, stats in sorted(self.routing_report().items()):
+            print(f"{indent}Routing ({agent}): {stats['fast_share']:.0%} fast, avg {stats['avg_fast_seconds']:.2f}s vs {stats['avg_main_seconds']:.2f}s main, ~{stats['estimated_seconds_saved']:.0f}s saved")
+        print("\n===============")
+
+
+class TurnTrace:
+    """
+    Per-turn stage timings (seconds) and notes. ChatHandler fills one in for every turn so benchmarks and debugging can
+    see where a turn spent its time without parsing terminal output.
+    """
+
+    def __init__(self) -> None:
+        self.stages = {}
+        self.notes = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Time a block of work under the given stage name. Repeated stages accumulate.
+
+        :param name: The stage name, e.g. 'build_prompt' or 'generate'.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - started
+
+    def note(self, key: str, value) -> None:
+        """
+        Attach a non-timing detail to the trace.
+
+        :param key: The note name.
+        :param value: Any JSON serializable value.
+        """
+        self.notes[key] = value
+
+    def to_dict(self) -> dict:
+        return {'stages': dict(self.stages), 'notes': dict(self.notes)}
+
+
+metrics_ledger = MetricsLedger()
@@ -0,0 +1,410 @@
+"""
+Offline stand-in for `ollama serve`. Implements the parts of the Ollama HTTP API this project uses (/api/generate,
+/api/tags, /api/pull and /api/show) with configurable load latency, prompt-eval rate and generation speed so latency
+work can be benchmarked without a GPU or real models. Responses are deterministic for a given model, prompt and seed.
+
+Run it directly:
+    OLLAMA_HOST=127.0.0.1:4242 python -m handlers.mock_ollama_server --tokens-per-second 40
+or let OllamaServer(mock=True) launch it in place of `ollama serve`.
+"""
+import argparse
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import random
+import threading
+import time
+
+
+MOCK_VOCABULARY = (
+    "the moonbase disco agent signal memory orbit relay vector context focus user system chat room library "
+    "model token prompt history answer question note detail plan reason result check status update idea "
+    "query record summary channel neon beat crew station module archive protocol sensor pattern thread"
+).split()
+
+
+def estimate_token_count(text: str) -> int:
+    """
+    Rough token estimate used for simulated prompt evaluation, about four characters per token.
+
+    :param text: The text to estimate.
+    :returns: Estimated number of tokens, at least 1.
+    """
+    return max(1, len(text) // 4)
+
+
+@dataclass
+class MockOllamaConfig:
+    """
+    Timing and behaviour knobs for the mock server.
+
+    :param load_latency: Seconds to "load" a model that is not resident. (Default: 0.5)
+    :param keep_alive: Seconds a model stays resident after its last request. (Default: 300)
+    :param prompt_eval_rate: Prompt tokens evaluated per second. (Default: 500)
+    :param tokens_per_second: Generated tokens per second. (Default: 30)
+    :param num_predict: Tokens generated when the request does not set num_predict. (Default: 64)
+    :param seed: Base seed mixed into every deterministic response. (Default: 0)
+    :param models: Models reported by /api/tags. Requests for other models 404 when strict is set.
+    :param strict: Reject models that have not been listed or pulled. (Default: False)
+    """
+    load_latency: float = 0.5
+    keep_alive: float = 300.0
+    prompt_eval_rate: float = 500.0
+    tokens_per_second: float = 30.0
+    num_predict: int = 64
+    seed: int = 0
+    models: list = field(default_factory=lambda: ["dolphin2.2-mistral"])
+    strict: bool = False
+
+    def to_cli_args(self) -> list:
+        """
+        Converts the config into command line flags for launching the server as a subprocess.
+
+        :returns: List of CLI arguments.
+        """
+        args = [
+            "--load-latency", str(self.load_latency),
+            "--keep-alive", str(self.keep_alive),
+            "--prompt-eval-rate", str(self.prompt_eval_rate),
+            "--tokens-per-second", str(self.tokens_per_second),
+            "--num-predict", str(self.num_predict),
+            "--seed", str(self.seed),
+            "--models", ",".join(self.models),
+        ]
+        if self.strict:
+            args.append("--strict")
+        return args
+
+
+class MockModelState:
+    """
+    Tracks which models are known and which are currently resident, shared by all request threads.
+    """
+
+    def __init__(self, config: MockOllamaConfig) -> None:
+        self.config = config
+        self.known_models = set(config.models)
+        self.last_used = {}
+        self.lock = threading.Lock()
+
+    def is_known(self, model: str) -> bool:
+        if not self.config.strict:
+            return True
+        with self.lock:
+            return model in self.known_models
+
+    def acquire(self, model: str) -> float:
+        """
+        Marks a model as used and returns the load latency this request has to pay.
+
+        :param model: The model being requested.
+        :returns: Seconds of simulated load time, 0.0 if the model is warm.
+        """
+        now = time.monotonic()
+        with self.lock:
+            self.known_models.add(model)
+            last_used = self.last_used.get(model)
+            self.last_used[model] = now
+        if last_used is None or now - last_used > self.config.keep_alive:
+            return self.config.load_latency
+        return 0.0
+
+
+def deterministic_tokens(model: str, prompt: str, seed: int, count: int) -> list:
+    """
+    Produces the same word sequence for the same model, prompt and seed.
+
+    :param model: Model name.
+    :param prompt: Prompt text.
+    :param seed: Seed from the request options combined with the server seed.
+    :param count: Number of tokens to produce.
+    :returns: List of word tokens, each with a leading space except the first.
+    """
+    digest = hashlib.sha256(f"{model}\x00{seed}\x00{prompt}".encode('utf-8')).digest()
+    rng = random.Random(int.from_bytes(digest[:8], 'big'))
+    words = [rng.choice(MOCK_VOCABULARY) for _ in range(count)]
+    return [word if i == 0 else f" {word}" for i, word in enumerate(words)]
+
+
+def model_digest(model: str) -> str:
+    return hashlib.sha256(model.encode('utf-8')).hexdigest()
+
+
+class MockOllamaHandler(BaseHTTPRequestHandler):
+    """
+    Request handler for the mock API. `server.state` carries the shared MockModelState.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        # Stay quiet like `ollama serve` does when launched with stdout sent to DEVNULL
+        pass
+
+    def read_json_body(self) -> dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except json.JSONDecodeError:
+            return {}
+
+    def send_json(self, payload: dict, status: int = 200) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def start_stream(self) -> None:
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+    def write_stream_line(self, payload: dict) -> None:
+        line = (json.dumps(payload) + "\n").encode('utf-8')
+        self.wfile.write(f"{len(line):X}\r\n".encode('ascii') + line + b"\r\n")
+        self.wfile.flush()
+
+    def end_stream(self) -> None:
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            self.handle_tags()
+        elif self.path == '/api/version':
+            self.send_json({"version": "0.0.0-mock"})
+        elif self.path == '/':
+            self.send_plain_status()
+        else:
+            self.send_json({"error": "not found"}, status=404)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self):
+        routes = {
+            '/api/generate': self.handle_generate,
+            '/api/pull': self.handle_pull,
+            '/api/show': self.handle_show,
+        }
+        handler = routes.get(self.path)
+        if handler is None:
+            self.send_json({"error": "not found"}, status=404)
+            return
+        handler(self.read_json_body())
+
+    def send_plain_status(self) -> None:
+        body = b"Ollama is running"
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_tags(self) -> None:
+        state = self.server.state
+        with state.lock:
+            models = sorted(state.known_models)
+        self.send_json({"models": [
+            {
+                "name": model,
+                "model": model,
+                "modified_at": datetime.now(timezone.utc).isoformat(),
+                "size": 4_000_000_000,
+                "digest": model_digest(model),
+                "details": {"format": "gguf", "family": "mock", "parameter_size": "7B", "quantization_level": "Q4_0"},
+            }
+            for model in models
+        ]})
+
+    def handle_show(self, body: dict) -> None:
+        state = self.server.state
+        model = body.get('name') or body.get('model')
+        # Same rule as /api/generate: any model is shown unless strict is set
+        if not model or not state.is_known(model):
+            self.send_json({"error": f"model '{model}' not found"}, status=404)
+            return
+        self.send_json({
+            "modelfile": f"FROM {model}\n",
+            "parameters": f"num_ctx 4096\nnum_predict {state.config.num_predict}",
+            "template": "{{ .Prompt }}",
+            "details": {"format": "gguf", "family": "mock", "parameter_size": "7B", "quantization_level": "Q4_0"},
+        })
+
+    def handle_pull(self, body: dict) -> None:
+        state = self.server.state
+        model = body.get('name') or body.get('model')
+        if not model:
+            self.send_json({"error": "missing model name"}, status=400)
+            return
+        with state.lock:
+            state.known_models.add(model)
+        statuses = [
+            {"status": "pulling manifest"},
+            {"status": f"pulling {model_digest(model)[:12]}", "digest": f"sha256:{model_digest(model)}", "total": 4_000_000_000, "completed": 4_000_000_000},
+            {"status": "verifying sha256 digest"},
+            {"status": "writing manifest"},
+            {"status": "success"},
+        ]
+        if body.get('stream') is False:
+            self.send_json(statuses[-1])
+            return
+        self.start_stream()
+        for status in statuses:
+            self.write_stream_line(status)
+        self.end_stream()
+
+    def handle_generate(self, body: dict) -> None:
+        state = self.server.state
+        config = state.config
+        model = body.get('model')
+        if not model:
+            self.send_json({"error": "model is required"}, status=400)
+            return
+        if not state.is_known(model):
+            self.send_json({"error": f"model '{model}' not found, try pulling it first"}, status=404)
+            return
+
+        options = body.get('options') or {}
+        prompt = body.get('prompt') or ""
+        num_predict = options.get('num_predict') or config.num_predict
+        if num_predict < 0:
+            num_predict = config.num_predict
+        seed = (options.get('seed') or 0) + config.seed
+
+        started = time.monotonic_ns()
+        load_seconds = state.acquire(model)
+        time.sleep(load_seconds)
+        load_duration = time.monotonic_ns() - started
+
+        prompt_eval_count = estimate_token_count(prompt)
+        prompt_started = time.monotonic_ns()
+        time.sleep(prompt_eval_count / config.prompt_eval_rate)
+        prompt_eval_duration = time.monotonic_ns() - prompt_started
+
+        tokens = deterministic_tokens(model, prompt, seed, num_predict)
+        per_token = 1.0 / config.tokens_per_second
+        stream = body.get('stream', True)
+
+        eval_started = time.monotonic_ns()
+        if stream:
+            self.start_stream()
+            for token in tokens:
+                time.sleep(per_token)
+                self.write_stream_line({
+                    "model": model,
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "response": token,
+                    "done": False,
+                })
+        else:
+            time.sleep(per_token * len(tokens))
+        eval_duration = time.monotonic_ns() - eval_started
+
+        final = {
+            "model": model,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "response": "" if stream else "".join(tokens),
+            "done": True,
+            "done_reason": "length",
+            "context": [],
+            "total_duration": time.monotonic_ns() - started,
+            "load_duration": load_duration,
+            "prompt_eval_count": prompt_eval_count,
+            "prompt_eval_duration": prompt_eval_duration,
+            "eval_count": len(tokens),
+            "eval_duration": eval_duration,
+        }
+        if stream:
+            self.write_stream_line(final)
+            self.end_stream()
+        else:
+            self.send_json(final)
+
+
+def create_mock_server(host: str, port: int, config: MockOllamaConfig = None) -> ThreadingHTTPServer:
+    """
+    Builds (but does not start) a mock Ollama server. Call serve_forever() or run it in a thread.
+
+    :param host: Interface to bind.
+    :param port: Port to bind.
+    :param config: Timing config, defaults to MockOllamaConfig().
+    :returns: The HTTP server instance.
+    """
+    server = ThreadingHTTPServer((host, port), MockOllamaHandler)
+    server.daemon_threads = True
+    server.state = MockModelState(config or MockOllamaConfig())
+    return server
+
+
+def start_mock_server_thread(host: str, port: int, config: MockOllamaConfig = None) -> ThreadingHTTPServer:
+    """
+    Starts a mock server on a daemon thread in this process, handy for benchmarks that do not want a subprocess.
+
+    :returns: The running server; call shutdown() to stop it.
+    """
+    server = create_mock_server(host, port, config)
+    thread = threading.Thread(target=server.serve_forever, name=f"mock-ollama-{port}", daemon=True)
+    thread.start()
+    return server
+
+
+def parse_ollama_host(value: str) -> tuple:
+    """
+    Parses an OLLAMA_HOST style value (host:port, optionally with a scheme).
+
+    :param value: The OLLAMA_HOST value.
+    :returns: (host, port) tuple.
+    """
+    value = value.split('://')[-1]
+    host, _, port = value.rpartition(':')
+    return host or '127.0.0.1', int(port or 11434)
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description="Offline mock of the Ollama HTTP API for benchmarks and tests.")
+    default_host, default_port = parse_ollama_host(os.environ.get('OLLAMA_HOST', '127.0.0.1:11434'))
+    defaults = MockOllamaConfig()
+    parser.add_argument('--host', default=default_host)
+    parser.add_argument('--port', type=int, default=default_port)
+    parser.add_argument('--load-latency', type=float, default=defaults.load_latency)
+    parser.add_argument('--keep-alive', type=float, default=defaults.keep_alive)
+    parser.add_argument('--prompt-eval-rate', type=float, default=defaults.prompt_eval_rate)
+    parser.add_argument('--tokens-per-second', type=float, default=defaults.tokens_per_second)
+    parser.add_argument('--num-predict', type=int, default=defaults.num_predict)
+    parser.add_argument('--seed', type=int, default=defaults.seed)
+    parser.add_argument('--models', default=",".join(defaults.models), help="Comma separated model names reported by /api/tags")
+    parser.add_argument('--strict', action='store_true', help="404 on models that were not listed or pulled")
+    args = parser.parse_args(argv)
+
+    config = MockOllamaConfig(
+        load_latency=args.load_latency,
+        keep_alive=args.keep_alive,
+        prompt_eval_rate=args.prompt_eval_rate,
+        tokens_per_second=args.tokens_per_second,
+        num_predict=args.num_predict,
+        seed=args.seed,
+        models=[model for model in args.models.split(',') if model],
+        strict=args.strict,
+    )
+    server = create_mock_server(args.host, args.port, config)
+    print(f"Mock Ollama server listening on {args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
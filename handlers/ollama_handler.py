@@ -1,19 +1,74 @@
+import os
+from pathlib import Path
+import shlex
 import socket
 import subprocess
+import sys
+import time
+from handlers.mock_ollama_server import MockOllamaConfig
+from handlers.scheduler_handler import request_scheduler
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
 
 
 class OllamaServer:
-    def __init__(self):
+    def __init__(self, mock: bool = None, mock_config: MockOllamaConfig = None, num_parallel: int = None):
+        """
+        Wraps an `ollama serve` subprocess for a chat session. Set mock=True (or DISCO_OLLAMA_MOCK=1 in the environment)
+        to launch the offline mock server from handlers/mock_ollama_server.py instead, for benchmarks and machines
+        without models.
+
+        :param mock: Launch the mock server instead of `ollama serve`. Defaults to the DISCO_OLLAMA_MOCK env var.
+        :param mock_config: Timing config for the mock server.
+        :param num_parallel: Requests the server handles at once (OLLAMA_NUM_PARALLEL). The request scheduler's limit for
+            the port is raised to match.
+        """
         self.process = None
+        if mock is None:
+            mock = os.environ.get('DISCO_OLLAMA_MOCK', '').lower() in ('1', 'true', 'yes')
+        self.mock = mock
+        self.mock_config = mock_config or MockOllamaConfig()
+        self.num_parallel = num_parallel
 
     def start_server(self, port):
-        command = f"OLLAMA_HOST=127.0.0.1:{port} ollama serve"
+        environment = f"OLLAMA_HOST=127.0.0.1:{port}"
+        if self.num_parallel:
+            environment += f" OLLAMA_NUM_PARALLEL={int(self.num_parallel)}"
+            request_scheduler.ensure_backend_limit(port, int(self.num_parallel))
+        if self.mock:
+            mock_args = " ".join(shlex.quote(arg) for arg in self.mock_config.to_cli_args())
+            command = f"{environment} {shlex.quote(sys.executable)} -m handlers.mock_ollama_server {mock_args}"
+        else:
+            command = f"{environment} ollama serve"
         try:
-            self.process = subprocess.Popen(command, shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
-            print(f"Ollama server started on port {port}")
+            self.process = subprocess.Popen(command, shell=True, cwd=PROJECT_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+            if self.wait_until_ready(port):
+                print(f"{'Mock Ollama' if self.mock else 'Ollama'} server started on port {port}")
+            else:
+                print(f"Ollama server on port {port} is not accepting connections yet.")
         except Exception as e:
             print(f"Error starting Ollama server on port {port}: {e}")
 
+    def wait_until_ready(self, port: int, timeout: float = 10.0) -> bool:
+        """
+        Poll the port until the server accepts connections so the first request of a session does not race the startup.
+
+        :param port: The port the server was started on.
+        :param timeout: Seconds to wait before giving up.
+        :returns: True once the server accepts connections, False on timeout or if the process exited.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process is not None and self.process.poll() is not None:
+                return False
+            try:
+                with socket.create_connection(('127.0.0.1', port), timeout=0.25):
+                    return True
+            except OSError:
+                time.sleep(0.05)
+        return False
+
     def stop_server(self):
         if self.process is None:
             print("No server process to stop.")
@@ -0,0 +1,252 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+import json
+import os
+from pathlib import Path
+import shutil
+import time
+import yaml
+from handlers.chroma_handler import chroma_get_or_create_collection
+from handlers.config_handler import load_yaml
+from handlers.registry_handler import AgentRegistry, agent_record, agent_registry
+from handlers.scheduler_handler import request_scheduler
+
+
+TEMPLATE_SUFFIXES = ('.md', '.yml', '.yaml', '.txt')
+AGENT_SUBDIRECTORIES = ('fine-tuning',)
+
+
+@dataclass
+class AgentSpec:
+    """
+    One agent in a provisioning manifest.
+
+    :param name: The agent's name, also its directory name (lowercased).
+    :param llm_model: Overrides the template's llm_model.
+    :param description: Overrides the template's description.
+    :param instructions: Any other instructions.yaml fields to override, e.g. system_message or fast_model.
+    :param params: params_config.yaml fields to override.
+    :param users: Usernames to create "<agent>-<user>" memory collections for. Defaults to the provisioning user.
+    """
+    name: str
+    llm_model: str = None
+    description: str = None
+    instructions: dict = field(default_factory=dict)
+    params: dict = field(default_factory=dict)
+    users: list = None
+
+    @classmethod
+    def from_dict(cls, data: dict, defaults: dict = None) -> 'AgentSpec':
+        merged = {**(defaults or {}), **data}
+        name = merged.pop('name', None) or merged.pop('agent_name', None)
+        if not name:
+            raise ValueError(f"Agent spec without a name: {data}")
+        known = {key: merged.pop(key) for key in ('llm_model', 'description', 'instructions', 'params', 'users') if key in merged}
+        # Unknown top level keys are instruction fields, so flat specs like {name, system_message} work too
+        known['instructions'] = {**merged, **(known.get('instructions') or {})}
+        return cls(name=name, **known)
+
+
+@dataclass
+class ProvisionResult:
+    created: list
+    skipped: list
+    collections: int
+    intros_completed: int
+    intros_failed: dict
+    wall_seconds: float
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def load_manifest(path: str) -> list:
+    """
+    Read agent specs from a manifest. JSONL files hold one spec per line. YAML files hold either a list of specs or
+    {'defaults': {...}, 'agents': [...]}, where defaults apply to every agent.
+
+    :param path: The manifest path (.jsonl, .yaml or .yml).
+    :returns: List of AgentSpec.
+    """
+    path = Path(path)
+    defaults = {}
+    if path.suffix == '.jsonl':
+        with path.open('r') as file:
+            entries = [json.loads(line) for line in file if line.strip()]
+    else:
+        data = load_yaml(path)
+        if isinstance(data, dict):
+            defaults = data.get('defaults') or {}
+            entries = data.get('agents') or []
+        else:
+            entries = data or []
+    specs = [AgentSpec.from_dict(entry, defaults) for entry in entries]
+    names = [spec.name.lower() for spec in specs]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate agent names in {path}: {', '.join(duplicates)}")
+    return specs
+
+
+def stage_agent(spec: AgentSpec, staging_dir: Path, templates_dir: Path, instructions_template: dict, params_template: dict) -> dict:
+    """
+    Build one agent's directory under the staging directory, the same files create_new_agent writes.
+
+    :returns: The agent's instructions data.
+    """
+    agent_dir = staging_dir / spec.name.lower()
+    agent_dir.mkdir(parents=True)
+    for directory in AGENT_SUBDIRECTORIES:
+        (agent_dir / directory).mkdir()
+    for template in templates_dir.iterdir():
+        if template.suffix in TEMPLATE_SUFFIXES and template.name not in ('instructions.yaml', 'params_config.yaml'):
+            shutil.copy(template, agent_dir / template.name)
+
+    instructions = {**instructions_template, **spec.instructions, 'name': spec.name}
+    if spec.llm_model:
+        instructions['llm_model'] = spec.llm_model
+    if spec.description:
+        instructions['description'] = spec.description
+    params = {**params_template, **spec.params}
+    with open(agent_dir / 'instructions.yaml', 'w') as file:
+        yaml.safe_dump(instructions, file)
+    with open(agent_dir / 'params_config.yaml', 'w') as file:
+        yaml.safe_dump(params, file)
+    return instructions
+
+
+def commit_agents(staged: dict, staging_dir: Path, registry: AgentRegistry) -> list:
+    """
+    Move staged agent directories into place and add them to the registry as one step: either every agent lands and
+    is registered, or the moved directories are put back and nothing is registered.
+
+    :param staged: {directory name: instructions data}.
+    :returns: The registry records written.
+    """
+    moved = []
+    with registry.locked():
+        try:
+            for directory in staged:
+                target = registry.root / directory
+                if target.exists():
+                    raise FileExistsError(f"Agent directory {target} appeared while provisioning")
+                os.rename(staging_dir / directory, target)
+                moved.append(directory)
+        except Exception:
+            for directory in moved:
+                os.rename(registry.root / directory, staging_dir / directory)
+            raise
+        records = [
+            agent_record(instructions, directory, registry.stat_mtime_ns(registry.root / directory / 'instructions.yaml'))
+            for directory, instructions in staged.items()
+        ]
+        registry.update_agents(records)
+    return records
+
+
+def run_intros(agent_names: list, username: str, server_port: int, workers: int = 4) -> tuple:
+    """
+    Run the two step introduction for many agents at once. Calls are admitted at batch priority by the request
+    scheduler, whose limit for the port is raised to the pool size, so up to `workers` intros generate together while
+    an interactive chat on the same port still goes first.
+
+    :param agent_names: The agents to introduce.
+    :param username: The designer named in the intro prompts.
+    :param server_port: The Ollama server port.
+    :param workers: Number of intros in flight.
+    :returns: (number completed, {agent name: error})
+    """
+    from handlers.library_handler import Curator
+    from handlers.simulation_handler import load_agent
+
+    curator = Curator()
+    request_scheduler.ensure_backend_limit(server_port, workers)
+
+    def introduce(agent_name: str) -> None:
+        agent = load_agent(agent_name)
+        curator.agent_intro_system(agent, username, server_port=server_port, quiet=True)
+
+    completed = 0
+    failed = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="intro") as executor:
+        futures = {executor.submit(introduce, name): name for name in agent_names}
+        for future in as_completed(futures):
+            try:
+                future.result()
+                completed += 1
+            except Exception as e:
+                failed[futures[future]] = str(e)
+    return completed, failed
+
+
+def provision_agents(specs: list, username: str = None, intros: bool = False, intro_workers: int = 4, server_port: int = None,
+                     mock: bool = None, templates_dir: str = 'agent-templates', registry: AgentRegistry = None) -> ProvisionResult:
+    """
+    Create many agents without prompts. All directories are built in a staging directory first and then moved into
+    agents/ and registered together under the registry lock. Memory collections are created in one pass afterwards,
+    and the intro handshakes run on a bounded pool or not at all.
+
+    :param specs: The AgentSpecs to create. Agents that already exist are skipped.
+    :param username: Designer name for collections and intros, defaults to $USER.
+    :param intros: Run the two step introduction for each new agent.
+    :param intro_workers: Number of intros in flight.
+    :param server_port: Port of a running Ollama server for the intros. When unset a server is started.
+    :param mock: Start the mock Ollama server when starting one.
+    :param templates_dir: Where the agent template files live.
+    :param registry: The agent registry, defaults to the shared one.
+    :returns: ProvisionResult
+    """
+    started = time.perf_counter()
+    registry = registry or agent_registry
+    username = username or os.environ.get('USER') or os.environ.get('USERNAME')
+    templates_dir = Path(templates_dir)
+    instructions_template = load_yaml(templates_dir / 'instructions.yaml')
+    params_template = load_yaml(templates_dir / 'params_config.yaml')
+
+    registry.root.mkdir(parents=True, exist_ok=True)
+    existing = {path.name for path in registry.root.iterdir() if path.is_dir()}
+    new_specs = [spec for spec in specs if spec.name.lower() not in existing]
+    skipped = [spec.name for spec in specs if spec.name.lower() in existing]
+
+    # Staged inside agents/ so the final moves are same-filesystem renames; the dot keeps the registry from listing it
+    staging_dir = registry.root / f".provisioning-{os.getpid()}"
+    staged = {}
+    try:
+        for spec in new_specs:
+            staged[spec.name.lower()] = stage_agent(spec, staging_dir, templates_dir, instructions_template, params_template)
+        commit_agents(staged, staging_dir, registry)
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    print(f"Provisioned {len(new_specs)} agents, skipped {len(skipped)} existing")
+
+    collections = 0
+    for spec in new_specs:
+        for user in spec.users or [username]:
+            chroma_get_or_create_collection(f"{spec.name}-{user}")
+            collections += 1
+    print(f"Created {collections} memory collections")
+
+    intros_completed, intros_failed = 0, {}
+    if intros and new_specs:
+        from handlers.ollama_handler import OllamaServer
+
+        server = None
+        if server_port is None:
+            server = OllamaServer(mock=mock, num_parallel=intro_workers)
+            server_port = server.find_available_port()
+            server.start_server(server_port)
+        try:
+            intros_completed, intros_failed = run_intros([spec.name for spec in new_specs], username, server_port, intro_workers)
+        finally:
+            if server is not None:
+                server.stop_server()
+        print(f"Intros: {intros_completed} completed, {len(intros_failed)} failed")
+
+    return ProvisionResult(
+        created=[spec.name for spec in new_specs],
+        skipped=skipped,
+        collections=collections,
+        intros_completed=intros_completed,
+        intros_failed=intros_failed,
+        wall_seconds=time.perf_counter() - started,
+    )
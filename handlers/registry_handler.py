@@ -0,0 +1,239 @@
+from contextlib import contextmanager
+import hashlib
+import json
+import os
+from pathlib import Path
+import threading
+import yaml
+from handlers.config_handler import load_yaml
+
+try:
+    import fcntl
+except ImportError:  # Windows, writes are still atomic but not serialized between processes
+    fcntl = None
+
+
+REGISTRY_VERSION = 1
+REGISTRY_CACHE_DIR = 'library/cache'
+INSTRUCTIONS_FILE = 'instructions.yaml'
+
+
+def agent_record(data: dict, directory: str, mtime_ns: int) -> dict:
+    """
+    The registry entry for one agent, built from its instructions.yaml data.
+    """
+    return {
+        'agent_name': data.get('agent_name') or data.get('name') or directory,
+        'description': data.get('description'),
+        'llm_model': data.get('llm_model'),
+        'dir': directory,
+        'mtime_ns': mtime_ns,
+    }
+
+
+class AgentRegistry:
+    """
+    Index of the agents under agents/, kept as one compact JSON file so listing and lookups do not parse every
+    instructions.yaml. The index remembers the mtime of the agents directory and of each instructions.yaml: when the
+    directory changes (agents added or removed) only new and changed agents are parsed again, and a deep refresh stats the
+    instruction files to pick up edits made outside the app. Writers take a file lock and replace the index atomically,
+    so several processes can provision agents at once.
+    """
+
+    def __init__(self, root: str = 'agents', index_path: str = None) -> None:
+        """
+        :param root: The agents directory.
+        :param index_path: The index file, defaults to one per root under library/cache. It lives outside the root so
+            writing it does not change the directory mtime it is keyed on.
+        """
+        self.root = Path(root)
+        if index_path is None:
+            digest = hashlib.sha1(str(self.root.resolve()).encode('utf-8')).hexdigest()[:12]
+            index_path = Path(REGISTRY_CACHE_DIR) / f"agent_registry_{digest}.json"
+        self.index_path = Path(index_path)
+        self.lock_path = self.index_path.with_name(self.index_path.name + '.lock')
+        self.thread_lock = threading.RLock()
+        self.lock_depth = 0
+        self.index = None
+        self.index_mtime_ns = None
+
+    @contextmanager
+    def locked(self):
+        """
+        Hold the registry lock, between threads and (where fcntl exists) between processes. Re-entrant within a thread,
+        so a caller can make several changes (e.g. move agent directories, then update the index) as one step.
+        """
+        with self.thread_lock:
+            if self.lock_depth:
+                self.lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self.lock_depth -= 1
+                return
+            self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.lock_path, 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self.lock_depth = 1
+                try:
+                    yield
+                finally:
+                    self.lock_depth = 0
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def stat_mtime_ns(self, path: Path) -> int:
+        try:
+            return path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def load_index(self) -> dict:
+        """
+        The index as last written by any process, re-read only when the file changed.
+        """
+        mtime_ns = self.stat_mtime_ns(self.index_path)
+        if self.index is not None and mtime_ns == self.index_mtime_ns:
+            return self.index
+        index = None
+        if mtime_ns is not None:
+            try:
+                with open(self.index_path, 'r') as file:
+                    index = json.load(file)
+            except (OSError, ValueError) as e:
+                print(f"Error: reading agent registry {self.index_path}, rebuilding: {e}")
+        if not index or index.get('version') != REGISTRY_VERSION:
+            index = {'version': REGISTRY_VERSION, 'root_mtime_ns': None, 'agents': {}}
+        self.index, self.index_mtime_ns = index, mtime_ns
+        return index
+
+    def write_index(self, index: dict) -> None:
+        """
+        Replace the index file atomically. Call with the lock held.
+        """
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.index_path.with_name(f"{self.index_path.name}.{os.getpid()}.tmp")
+        with open(temp_path, 'w') as file:
+            json.dump(index, file, separators=(',', ':'))
+        os.replace(temp_path, self.index_path)
+        self.index, self.index_mtime_ns = index, self.stat_mtime_ns(self.index_path)
+
+    def read_agent(self, directory: str, known: dict = None) -> dict:
+        """
+        Parse one agent's instructions.yaml, or reuse the known record when the file has not changed.
+
+        :returns: The record, or None when the directory has no instructions.
+        """
+        yaml_file = self.root / directory / INSTRUCTIONS_FILE
+        mtime_ns = self.stat_mtime_ns(yaml_file)
+        if mtime_ns is None:
+            return None
+        if known is not None and known.get('mtime_ns') == mtime_ns:
+            return known
+        try:
+            data = load_yaml(yaml_file)
+        except (OSError, yaml.YAMLError) as e:
+            print(f"Error: reading {yaml_file}: {e}")
+            return None
+        return agent_record(data, directory, mtime_ns)
+
+    def scan(self, index: dict, deep: bool) -> bool:
+        """
+        Bring the index in line with the agents directory.
+
+        :param deep: Also re-check agents whose directory listing did not change.
+        :returns: True when the index changed.
+        """
+        root_mtime_ns = self.stat_mtime_ns(self.root)
+        if root_mtime_ns is None or (root_mtime_ns == index['root_mtime_ns'] and not deep):
+            return False
+
+        known_by_dir = {record['dir']: (key, record) for key, record in index['agents'].items()}
+        agents = {}
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if not entry.is_dir() or entry.name.startswith('.'):
+                    continue
+                key, known = known_by_dir.get(entry.name, (None, None))
+                # The listing is unchanged for agents we already know, only deep scans stat their files again
+                record = self.read_agent(entry.name, known) if deep or known is None else known
+                if record is not None:
+                    agents[record['agent_name'].lower()] = record
+
+        changed = agents != index['agents'] or root_mtime_ns != index['root_mtime_ns']
+        index['agents'] = agents
+        index['root_mtime_ns'] = root_mtime_ns
+        return changed
+
+    def refresh(self, deep: bool = False) -> dict:
+        """
+        Update the index from disk when the agents directory changed since it was written.
+
+        :param deep: Stat every instructions.yaml as well, to catch edits made outside the app.
+        :returns: The index.
+        """
+        index = self.load_index()
+        if self.stat_mtime_ns(self.root) == index['root_mtime_ns'] and not deep:
+            return index
+        with self.locked():
+            index = self.load_index()
+            if self.scan(index, deep):
+                self.write_index(index)
+        return index
+
+    def list_agents(self, deep: bool = False) -> list:
+        """
+        :returns: The agent records, [{'agent_name', 'description', 'llm_model', 'dir', 'mtime_ns'}], sorted by name.
+        """
+        agents = self.refresh(deep)['agents']
+        return [agents[key] for key in sorted(agents)]
+
+    def get(self, agent_name: str) -> dict:
+        """
+        :returns: The agent's record, or None.
+        """
+        return self.refresh()['agents'].get(agent_name.lower())
+
+    def update_agents(self, records: list) -> None:
+        """
+        Add or replace several agents in one locked write, e.g. after provisioning a batch.
+
+        :param records: Records as built by agent_record.
+        """
+        with self.locked():
+            index = self.load_index()
+            self.scan(index, deep=False)
+            for record in records:
+                index['agents'][record['agent_name'].lower()] = record
+            # Our own directory changes are accounted for
+            index['root_mtime_ns'] = self.stat_mtime_ns(self.root)
+            self.write_index(index)
+
+    def update(self, data: dict, directory: str = None) -> dict:
+        """
+        Add or replace one agent from its instructions data, e.g. after ModelInstructions.save_to_yaml.
+
+        :param data: The instructions dict.
+        :param directory: The agent's directory name, defaults to the lowercased agent name.
+        :returns: The new record.
+        """
+        name = data.get('agent_name') or data.get('name')
+        directory = directory or name.lower()
+        record = agent_record(data, directory, self.stat_mtime_ns(self.root / directory / INSTRUCTIONS_FILE))
+        self.update_agents([record])
+        return record
+
+    def remove(self, agent_name: str) -> None:
+        """
+        Drop an agent from the index. Its directory is left alone, so an agent whose directory still exists is listed
+        again the next time the agents directory changes.
+        """
+        with self.locked():
+            index = self.load_index()
+            self.scan(index, deep=False)
+            if index['agents'].pop(agent_name.lower(), None) is not None:
+                self.write_index(index)
+
+
+agent_registry = AgentRegistry()
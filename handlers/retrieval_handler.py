@@ -0,0 +1,128 @@
+from dataclasses import dataclass
+import re
+from handlers.routing_handler import SIMPLE_PATTERN, cosine_similarity
+
+
+# Words that carry no retrieval signal on their own
+DEFAULT_STOPWORDS = frozenset("""
+a about above after again all am an and any are as at be because been before being below between both but by can could
+did do does doing down during each few for from further had has have having he her here hers him his how i if in into
+is it its itself just me more most my no nor not now of off on once only or other our ours out over own please same she
+should so some such than that the their them then there these they this those through to too under until up very was we
+were what when where which while who whom why will with would you your yours ok okay yes yeah yep no nope thanks thank
+hi hello hey
+""".split())
+
+EMPTY_RESULTS = {'ids': [[]], 'documents': [[]], 'metadatas': [[]], 'distances': [[]]}
+
+
+def exclude_turn_results(results: dict, exclude_turns: list, n_results: int = None) -> dict:
+    """
+    Drop results for the turns in exclude_turns, matched by 'turn' metadata or by id (turn memories use the turn uuid as
+    their id). Results without turn metadata, e.g. knowledge base chunks and older memories, are always kept.
+
+    :param n_results: Keep at most this many per query, for callers that over-fetched to make up for the exclusions.
+    """
+    if not exclude_turns and n_results is None or not results.get('metadatas'):
+        return results
+    excluded = set(exclude_turns or ())
+    filtered = {key: [] for key in ('ids', 'documents', 'metadatas', 'distances', 'embeddings') if results.get(key)}
+    for index, metadatas in enumerate(results['metadatas']):
+        ids = results['ids'][index] if results.get('ids') else [None] * len(metadatas)
+        keep = [position for position, metadata in enumerate(metadatas)
+                if (metadata or {}).get('turn') not in excluded and ids[position] not in excluded][:n_results]
+        for key in filtered:
+            column = results[key][index] if index < len(results[key]) else None
+            filtered[key].append([column[position] for position in keep] if column is not None else None)
+    return {**results, **filtered}
+
+
+@dataclass
+class RetrievalDecision:
+    action: str
+    reason: str
+
+    def to_dict(self) -> dict:
+        return {'action': self.action, 'reason': self.reason}
+
+
+class RetrievalGate:
+    """
+    Decides whether a query is worth an embed and a Chroma query. Greetings, acknowledgements and inputs without a single
+    non-stopword are skipped outright (no embed, no query). Inputs matching one of the agent's skip
+    intents are skipped as well. Everything else is embedded once; when the embedding is within reuse_threshold of the
+    previous query on the same collection, the previous results are reused and the Chroma query is skipped.
+    """
+
+    def __init__(self, stopwords: list = None, skip_intents: list = None, min_content_words: int = 1,
+                 reuse_threshold: float = 0.95, embedding_function=None) -> None:
+        """
+        :param stopwords: Extra per-agent stopwords, added to DEFAULT_STOPWORDS.
+        :param skip_intents: Per-agent phrases (regular expressions) that never need memories, e.g. "^!\\\\w+".
+        :param min_content_words: Minimum non-stopwords for a query to be worth running. Short recall questions such as
+            "Who is Bob?" have only one, so raising this skips the inputs memories are for.
+        :param reuse_threshold: Cosine similarity above which the previous results are reused. None disables reuse.
+        :param embedding_function: Embeds a list of texts, defaults to Chroma's default embedding function.
+        """
+        self.stopwords = DEFAULT_STOPWORDS | {word.lower() for word in stopwords or []}
+        self.skip_intents = [re.compile(pattern, re.IGNORECASE) for pattern in skip_intents or []]
+        self.min_content_words = min_content_words
+        self.reuse_threshold = reuse_threshold
+        self.embedding_function = embedding_function
+        self.last = {}
+
+    def content_words(self, text: str) -> list:
+        return [word for word in re.findall(r"[a-z0-9']+", (text or "").lower()) if word not in self.stopwords]
+
+    def check(self, query: str) -> RetrievalDecision:
+        """
+        The lexical part of the gate, no embedding involved.
+
+        :returns: RetrievalDecision with action 'skip' or 'query'.
+        """
+        if SIMPLE_PATTERN.match(query or ""):
+            return RetrievalDecision('skip', 'acknowledgement')
+        for intent in self.skip_intents:
+            if intent.search(query or ""):
+                return RetrievalDecision('skip', f"intent {intent.pattern}")
+        if len(self.content_words(query)) < self.min_content_words:
+            return RetrievalDecision('skip', 'too few content words')
+        return RetrievalDecision('query', 'content')
+
+    def embed(self, query: str) -> list:
+        if self.embedding_function is None:
+            from handlers.chroma_handler import get_default_embedding_function
+            self.embedding_function = get_default_embedding_function()
+        return list(self.embedding_function([query])[0])
+
+    def retrieve(self, query: str, collection_name: str, run_query, exclude_turns: list = None) -> tuple:
+        """
+        Run a query through the gate.
+
+        :param query: The text to find memories for.
+        :param collection_name: Key for reusing previous results.
+        :param run_query: Callable(embedding) -> chroma results, run when the gate lets the query through.
+        :param exclude_turns: Turn uuids the query filtered out. Reused results are filtered the same way.
+        :returns: (chroma results, RetrievalDecision)
+        """
+        decision = self.check(query)
+        if decision.action == 'skip':
+            return EMPTY_RESULTS, decision
+
+        embedding = self.embed(query)
+        last = self.last.get(collection_name)
+        if self.reuse_threshold is not None and last is not None:
+            similarity = cosine_similarity(embedding, last[0])
+            if similarity >= self.reuse_threshold:
+                return exclude_turn_results(last[1], exclude_turns), RetrievalDecision('reuse', f"similarity {similarity:.2f} to previous query")
+
+        results = run_query(embedding)
+        self.last[collection_name] = (embedding, results)
+        return results, decision
+
+    def forget(self, collection_name: str) -> None:
+        """
+        Drop cached results for a collection. Called after memories are written to it, so a reused result never hides
+        them from the next query.
+        """
+        self.last.pop(collection_name, None)
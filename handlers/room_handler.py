@@ -0,0 +1,273 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import re
+from uuid import uuid4
+from handlers.agents_handler import Agent, host_greeting
+from handlers.chroma_handler import MemoryWriteBuffer, chroma_get_or_create_collection
+from handlers.conversation_handler import Message, Turn
+from handlers.metrics_handler import TurnTrace
+from handlers.scheduler_handler import request_scheduler
+from utils.terminal_renderer import TerminalRenderer
+
+
+class RoundRobinPolicy:
+    """
+    Agents speak one at a time in join order. The next speaker is always known ahead of time, so the room can prefetch
+    its memories while the current speaker is generating.
+    """
+    name = 'round-robin'
+
+    @staticmethod
+    def after(room, speaker_name: str) -> Agent:
+        names = [agent.name for agent in room.agents]
+        index = names.index(speaker_name) if speaker_name in names else -1
+        return room.agents[(index + 1) % len(room.agents)]
+
+    def next_speakers(self, room, last_message: Message) -> list:
+        return [self.after(room, last_message.speaker)]
+
+    def peek_next_speakers(self, room, current_speakers: list) -> list:
+        return [self.after(room, current_speakers[-1].name)]
+
+
+class MentionPolicy:
+    """
+    Agents named in the last message (as @name or plain name) answer it, all of them in parallel. Falls back to round
+    robin when nobody is mentioned.
+    """
+    name = 'mention'
+
+    def __init__(self) -> None:
+        self.fallback = RoundRobinPolicy()
+
+    def next_speakers(self, room, last_message: Message) -> list:
+        mentioned = [
+            agent for agent in room.agents
+            if agent.name != last_message.speaker and re.search(rf"@?\b{re.escape(agent.name)}\b", last_message.content or "", re.IGNORECASE)
+        ]
+        return mentioned or self.fallback.next_speakers(room, last_message)
+
+    def peek_next_speakers(self, room, current_speakers: list) -> list:
+        # Who speaks next depends on the reply that is still being generated
+        return []
+
+
+class BidPolicy:
+    """
+    Every agent bids for the floor with a cheap lexical score: overlap between the last message and the agent's
+    focus/description, minus a penalty for having spoken recently. The top max_speakers bidders answer in parallel.
+    """
+    name = 'bid'
+
+    def __init__(self, max_speakers: int = 1, recency_penalty: float = 0.5) -> None:
+        self.max_speakers = max_speakers
+        self.recency_penalty = recency_penalty
+        self.last_spoke = {}
+        self.step = 0
+
+    @staticmethod
+    def words(text: str) -> set:
+        return {word for word in re.findall(r"[a-z']+", (text or "").lower()) if len(word) > 3}
+
+    def bid(self, agent: Agent, last_message: Message) -> float:
+        interests = self.words(f"{agent.instructions.assistant_focus} {agent.instructions.description}")
+        message_words = self.words(last_message.content)
+        overlap = len(interests & message_words) / (len(message_words) or 1)
+        turns_since = self.step - self.last_spoke.get(agent.name, -10)
+        return overlap - self.recency_penalty / turns_since
+
+    def next_speakers(self, room, last_message: Message) -> list:
+        self.step += 1
+        candidates = [agent for agent in room.agents if agent.name != last_message.speaker] or room.agents
+        ranked = sorted(candidates, key=lambda agent: self.bid(agent, last_message), reverse=True)
+        speakers = ranked[:self.max_speakers]
+        for agent in speakers:
+            self.last_spoke[agent.name] = self.step
+        return speakers
+
+    def peek_next_speakers(self, room, current_speakers: list) -> list:
+        return []
+
+
+TURN_POLICIES = {
+    RoundRobinPolicy.name: RoundRobinPolicy,
+    MentionPolicy.name: MentionPolicy,
+    BidPolicy.name: BidPolicy,
+}
+
+
+class ChatRoom:
+    """
+    A room of N agents. Each step the turn policy picks one or more speakers for the last message; several speakers
+    generate concurrently. While the current speakers generate, the room retrieves memories for the speaker it expects
+    next (round robin only), so that agent's prompt build does not wait on Chroma. Memory writes are batched per agent.
+
+    Prefetched memories are looked up with the message before the one the agent ends up answering, i.e. they are one
+    message stale. That is the price of taking retrieval off the critical path; set prefetch=False to disable it.
+    """
+
+    def __init__(self, agents: list, policy=None, server_port: int = None, name: str = None, headless: bool = False,
+                 retrieval: bool = True, prefetch: bool = True, memory_batch_size: int = 8, response_delay: float = 0.05) -> None:
+        """
+        :param agents: The agents in the room, the first one hosts.
+        :param policy: A turn policy instance, defaults to RoundRobinPolicy.
+        :param server_port: The Ollama server port.
+        :param name: Room name, used for memory collection names.
+        :param headless: Skip terminal streaming of agent output.
+        :param retrieval: Include memories in prompts.
+        :param prefetch: Retrieve the predicted next speaker's memories while the current speaker generates.
+        :param memory_batch_size: Turns buffered per agent before their memories are upserted.
+        :param response_delay: Per character delay for terminal streaming.
+        """
+        self.agents = agents
+        self.policy = policy or RoundRobinPolicy()
+        self.server_port = server_port
+        self.name = name or "room-" + "-".join(agent.name for agent in agents)
+        self.headless = headless
+        self.retrieval = retrieval
+        self.prefetch = prefetch
+        self.response_delay = response_delay
+        self.collections = {agent.name: chroma_get_or_create_collection(f"{agent.name}-{self.name}") for agent in agents}
+        self.executor = ThreadPoolExecutor(max_workers=len(agents) + 2, thread_name_prefix="room")
+        if server_port is not None:
+            # Speakers picked together generate together instead of queueing for a single backend slot
+            request_scheduler.ensure_backend_limit(server_port, len(agents))
+        self.memory = MemoryWriteBuffer(batch_size=memory_batch_size, executor=self.executor, on_flush=self.forget_retrievals)
+        self.messages = []
+        self.traces = []
+        self.last_message = None
+        self.prefetched = {}
+        self.renderer = None if headless else TerminalRenderer(char_delay=response_delay)
+
+    def open(self, opener: str = None) -> Message:
+        """
+        Seed the room with the host's opening message.
+
+        :param opener: The opening line, defaults to the host greeting.
+        :returns: The opening Message.
+        """
+        host = self.agents[0]
+        self.last_message = self.make_message(host, opener or host_greeting(host), role='assistant')
+        host.last_response = self.last_message.content
+        self.messages.append(self.last_message)
+        self.render(self.last_message)
+        return self.last_message
+
+    @staticmethod
+    def make_message(agent: Agent, content: str, role: str = 'assistant') -> Message:
+        return Message(
+            uuid=str(uuid4()),
+            timestamp=str(datetime.now().strftime('%Y-%m-%d @ %H:%M')),
+            role=role,
+            speaker=agent.name,
+            content=content
+        )
+
+    def render(self, message: Message) -> None:
+        if self.renderer is not None:
+            self.renderer.submit(message.speaker, message.content)
+
+    def forget_retrievals(self, collection_name: str) -> None:
+        for agent in self.agents:
+            agent.retrieval_gate.forget(collection_name)
+
+    def retrieve(self, agent: Agent, query: str) -> dict:
+        return agent.retrieve_memories(query, f"{agent.name}-{self.name}")
+
+    def speak(self, agent: Agent, last_message: Message, prefetched=None) -> tuple:
+        """
+        Build a prompt for one speaker and generate its reply. Runs on the room's thread pool.
+
+        :param agent: The speaking agent.
+        :param last_message: The message being answered.
+        :param prefetched: Future holding memories retrieved ahead of time, if any.
+        :returns: (reply Message, TurnTrace)
+        """
+        trace = TurnTrace()
+        trace.note('speaker', agent.name)
+        with trace.stage('total'):
+            chroma_results = None
+            if self.retrieval:
+                with trace.stage('memory_wait'):
+                    if prefetched is not None:
+                        chroma_results = prefetched.result()
+                        trace.note('prefetched_retrieval', True)
+                    else:
+                        chroma_results = self.retrieve(agent, last_message.content)
+            with trace.stage('build_prompt'):
+                prompt = agent.build_prompt(last_message.content, username=last_message.speaker, agent_agent=True, trace=trace, chroma_results=chroma_results)
+            with trace.stage('generate'):
+                agent.last_response = agent.generate_response(prompt=prompt, server_port=self.server_port)
+        return self.make_message(agent, agent.last_response), trace
+
+    def step(self) -> list:
+        """
+        Run one scheduling step: pick speakers, generate their replies concurrently, prefetch the next speaker's memories
+        meanwhile, then record history and queue memory writes.
+
+        :returns: The reply Messages of this step.
+        """
+        if self.last_message is None:
+            self.open()
+        last_message = self.last_message
+        speakers = self.policy.next_speakers(self, last_message)
+        futures = [self.executor.submit(self.speak, agent, last_message, self.prefetched.pop(agent.name, None)) for agent in speakers]
+
+        # Overlap: look up memories for whoever the policy expects next while the current speakers generate
+        self.prefetched = {}
+        if self.retrieval and self.prefetch:
+            speaking = {agent.name for agent in speakers}
+            for agent in self.policy.peek_next_speakers(self, speakers):
+                if agent.name not in speaking:
+                    self.prefetched[agent.name] = self.executor.submit(self.retrieve, agent, last_message.content)
+
+        replies = []
+        for future in futures:
+            reply, trace = future.result()
+            replies.append(reply)
+            self.traces.append(trace)
+            self.render(reply)
+
+        for reply in replies:
+            turn = Turn(uuid=str(uuid4()), request=last_message, response=reply)
+            document = turn.request.to_memory_string()
+            document += turn.response.to_memory_string()
+            for agent in self.agents:
+                agent.message_cache.add_message(turn)
+                self.memory.add(self.collections[agent.name], document=document, id=f"{turn.uuid}-{agent.name}", metadata={'turn': turn.uuid})
+            self.messages.append(reply)
+
+        self.last_message = replies[-1]
+        return replies
+
+    def run(self, rounds: int = None) -> list:
+        """
+        Run the room for a number of steps, or until interrupted when rounds is None.
+
+        :param rounds: Number of scheduling steps.
+        :returns: All messages exchanged in the room.
+        """
+        try:
+            step = 0
+            while rounds is None or step < rounds:
+                self.step()
+                step += 1
+        except KeyboardInterrupt:
+            # Don't replay the backlog over whatever the caller prints next
+            if self.renderer is not None:
+                self.renderer.discard()
+            raise
+        finally:
+            self.close()
+        return self.messages
+
+    def close(self) -> None:
+        """
+        Flush batched memory writes, stop the worker threads and let the renderer finish, then stop it.
+        """
+        self.memory.flush()
+        self.executor.shutdown(wait=True)
+        if self.renderer is not None:
+            self.renderer.wait_until_idle()
+            self.renderer.close()
+            self.renderer = None
@@ -0,0 +1,104 @@
+from dataclasses import dataclass
+import math
+import re
+
+
+# Inputs that never need the big model
+SIMPLE_PATTERN = re.compile(
+    r"^\s*(hi|hey|hello|yo|thanks|thank you|thx|ty|ok|okay|k|cool|great|nice|sure|yes|yep|yeah|no|nope|bye|goodbye|"
+    r"good (morning|afternoon|evening|night)|got it|sounds good|perfect|awesome|lol|haha)[\s!.?]*$",
+    re.IGNORECASE,
+)
+# Words that usually mean the user wants reasoning, writing or analysis
+HARD_PATTERN = re.compile(
+    r"\b(why|explain|analy[sz]e|compare|design|write|draft|summari[sz]e|review|debug|refactor|plan|prove|calculate|"
+    r"derive|translate|optimi[sz]e|implement|evaluate|pros and cons|step by step)\b",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class RouteDecision:
+    model: str
+    routed: str
+    reason: str
+
+    def to_dict(self) -> dict:
+        return {'model': self.model, 'routed': self.routed, 'reason': self.reason}
+
+
+def cosine_similarity(a: list, b: list) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class ModelRouter:
+    """
+    Picks the agent's small fast model or its main model for each turn. Cheap checks run first: acknowledgements and
+    greetings go fast, long inputs, code and reasoning keywords go main. Inputs the heuristics cannot call are compared
+    against 'simple' and 'hard' exemplar embeddings when the agent has exemplars, and otherwise go main.
+    """
+
+    def __init__(self, main_model: str, fast_model: str, max_fast_words: int = 12, min_main_words: int = 40,
+                 exemplars: dict = None, embedding_function=None) -> None:
+        """
+        :param main_model: The agent's llm_model.
+        :param fast_model: The small model for simple turns.
+        :param max_fast_words: Inputs up to this many words with no hard signal go to the fast model.
+        :param min_main_words: Inputs with at least this many words always go to the main model.
+        :param exemplars: Optional {'simple': [...], 'hard': [...]} example inputs for embedding based routing.
+        :param embedding_function: Embeds a list of texts, defaults to Chroma's default embedding function.
+        """
+        self.main_model = main_model
+        self.fast_model = fast_model
+        self.max_fast_words = max_fast_words
+        self.min_main_words = min_main_words
+        self.exemplars = exemplars or {}
+        self.embedding_function = embedding_function
+        self.centroids = None
+
+    def main(self, reason: str) -> RouteDecision:
+        return RouteDecision(model=self.main_model, routed='main', reason=reason)
+
+    def fast(self, reason: str) -> RouteDecision:
+        return RouteDecision(model=self.fast_model, routed='fast', reason=reason)
+
+    def exemplar_centroids(self) -> dict:
+        if self.centroids is None:
+            if self.embedding_function is None:
+                from handlers.chroma_handler import get_default_embedding_function
+                self.embedding_function = get_default_embedding_function()
+            self.centroids = {}
+            for label in ('simple', 'hard'):
+                texts = self.exemplars.get(label) or []
+                if texts:
+                    vectors = [list(vector) for vector in self.embedding_function(texts)]
+                    self.centroids[label] = [sum(values) / len(vectors) for values in zip(*vectors)]
+        return self.centroids
+
+    def route(self, user_input: str) -> RouteDecision:
+        """
+        :param user_input: The message the agent is about to answer.
+        :returns: RouteDecision naming the model to use and why.
+        """
+        text = user_input or ""
+        words = len(text.split())
+        if SIMPLE_PATTERN.match(text):
+            return self.fast('acknowledgement')
+        if words >= self.min_main_words:
+            return self.main('long input')
+        if '```' in text or HARD_PATTERN.search(text):
+            return self.main('reasoning or code')
+        if words <= self.max_fast_words and text.count('?') <= 1:
+            return self.fast('short input')
+
+        if self.exemplars.get('simple') and self.exemplars.get('hard'):
+            centroids = self.exemplar_centroids()
+            vector = list(self.embedding_function([text])[0])
+            simple = cosine_similarity(vector, centroids['simple'])
+            hard = cosine_similarity(vector, centroids['hard'])
+            if simple > hard:
+                return self.fast(f"closer to simple exemplars ({simple:.2f} vs {hard:.2f})")
+            return self.main(f"closer to hard exemplars ({hard:.2f} vs {simple:.2f})")
+        return self.main('default')
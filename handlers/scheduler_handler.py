@@ -0,0 +1,232 @@
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+import itertools
+import os
+import threading
+import time
+
+
+# Priority classes, lower runs first. Humans waiting on a reply are interactive, everything else is batch.
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+PRIORITY_CLASSES = {INTERACTIVE: 0, BATCH: 1}
+# Calls Ollama serves at once per model, its own setting when exported
+DEFAULT_MAX_IN_FLIGHT = int(os.environ.get('OLLAMA_NUM_PARALLEL') or 1)
+
+
+@dataclass
+class QueueStats:
+    """
+    Queue-time totals for one priority class.
+    """
+    requests: int = 0
+    wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+
+    def add(self, wait_seconds: float) -> None:
+        self.requests += 1
+        self.wait_seconds += wait_seconds
+        self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+
+    def to_dict(self) -> dict:
+        return {
+            'requests': self.requests,
+            'avg_wait_seconds': self.wait_seconds / self.requests if self.requests else 0.0,
+            'max_wait_seconds': self.max_wait_seconds,
+        }
+
+
+@dataclass
+class Waiter:
+    """
+    A queued call. Threads wait on event; coroutines on future, resolved through loop. granted is set under the
+    scheduler lock when the waiter is handed a slot.
+    """
+    port: int
+    agent: str
+    priority: str
+    seq: int
+    enqueued: float = field(default_factory=time.monotonic)
+    event: threading.Event = None
+    loop: asyncio.AbstractEventLoop = None
+    future: asyncio.Future = None
+    granted: bool = False
+
+
+class RequestScheduler:
+    """
+    Orders generate calls in front of the Ollama backends. Each backend (port) runs at most max_in_flight calls; when a
+    slot frees up it goes to the waiter with, in order:
+
+        1. the best priority class (interactive before batch),
+        2. the agent that has been served least so far, so one chatty agent cannot hog a backend,
+        3. the earliest arrival.
+
+    A batch call that has waited longer than batch_max_wait is treated as interactive so background work is delayed,
+    never starved. Slots are handed to the chosen waiter by whoever frees them, so a coroutine waits on a future rather
+    than a blocked executor thread.
+
+    Ollama handles one request per model at a time unless OLLAMA_NUM_PARALLEL says otherwise, which is why
+    max_in_flight defaults to that variable, or 1. Callers that run several calls against one backend on purpose (chat
+    rooms, the gateway, the provisioning intro pool) raise their port's limit with ensure_backend_limit.
+
+    The scheduler coordinates threads and coroutines in one process. Separate processes (simulate_cli, the fan-out
+    workers, provision_cli) are not arbitrated against each other or against an interactive chat; give them their own
+    Ollama port to keep them from delaying people.
+    """
+
+    def __init__(self, max_in_flight: int = None, batch_max_wait: float = 60.0) -> None:
+        """
+        :param max_in_flight: Default concurrent calls per backend, DEFAULT_MAX_IN_FLIGHT when unset.
+        :param batch_max_wait: Seconds before a waiting batch call is promoted to interactive. None never promotes.
+        """
+        self.max_in_flight = max_in_flight or DEFAULT_MAX_IN_FLIGHT
+        self.batch_max_wait = batch_max_wait
+        self.backend_limits = {}
+        self.in_flight = {}
+        self.served = {}
+        self.waiters = []
+        self.stats = {name: QueueStats() for name in PRIORITY_CLASSES}
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+
+    def set_backend_limit(self, port: int, max_in_flight: int) -> None:
+        """
+        Override the in-flight limit for one backend, e.g. one started with OLLAMA_NUM_PARALLEL=4.
+        """
+        with self.lock:
+            self.backend_limits[port] = max_in_flight
+            self.dispatch(port)
+
+    def ensure_backend_limit(self, port: int, max_in_flight: int) -> None:
+        """
+        Raise a backend's limit to at least max_in_flight, for callers that run that many calls on it concurrently.
+        """
+        with self.lock:
+            if max_in_flight > self.limit(port):
+                self.backend_limits[port] = max_in_flight
+                self.dispatch(port)
+
+    def limit(self, port: int) -> int:
+        return self.backend_limits.get(port, self.max_in_flight)
+
+    def effective_priority(self, waiter: Waiter, now: float) -> int:
+        rank = PRIORITY_CLASSES[waiter.priority]
+        if waiter.priority == BATCH and self.batch_max_wait is not None and now - waiter.enqueued > self.batch_max_wait:
+            rank = PRIORITY_CLASSES[INTERACTIVE]
+        return rank
+
+    def next_waiter(self, port: int) -> Waiter:
+        now = time.monotonic()
+        candidates = [waiter for waiter in self.waiters if waiter.port == port]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda waiter: (self.effective_priority(waiter, now), self.served.get(waiter.agent, 0), waiter.seq))
+
+    def dispatch(self, port: int) -> None:
+        """
+        Hand free slots on a backend to the best waiters. Called with the lock held.
+        """
+        while self.in_flight.get(port, 0) < self.limit(port):
+            waiter = self.next_waiter(port)
+            if waiter is None:
+                return
+            self.waiters.remove(waiter)
+            waiter.granted = True
+            self.in_flight[port] = self.in_flight.get(port, 0) + 1
+            self.served[waiter.agent] = self.served.get(waiter.agent, 0) + 1
+            self.stats[waiter.priority].add(time.monotonic() - waiter.enqueued)
+            if waiter.event is not None:
+                waiter.event.set()
+            else:
+                waiter.loop.call_soon_threadsafe(lambda future=waiter.future: future.done() or future.set_result(None))
+
+    def enqueue(self, port: int, agent: str, priority: str, **wakeup) -> Waiter:
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority class: {priority}")
+        with self.lock:
+            waiter = Waiter(port=port, agent=agent, priority=priority, seq=next(self.counter), **wakeup)
+            self.waiters.append(waiter)
+            self.dispatch(port)
+        return waiter
+
+    def cancel(self, waiter: Waiter) -> None:
+        """
+        Withdraw a waiter that stopped waiting, handing back its slot if it was granted in the meantime.
+        """
+        with self.lock:
+            if waiter.granted:
+                self.in_flight[waiter.port] -= 1
+                self.dispatch(waiter.port)
+            else:
+                self.waiters.remove(waiter)
+
+    def acquire(self, port: int, agent: str = '', priority: str = INTERACTIVE) -> float:
+        """
+        Block until this call may run on the backend.
+
+        :param port: The backend port.
+        :param agent: Name of the calling agent, used for fairness.
+        :param priority: INTERACTIVE or BATCH.
+        :returns: Seconds spent queued.
+        """
+        waiter = self.enqueue(port, agent, priority, event=threading.Event())
+        # Re-check now and then so a waiting batch call gets promoted even when nothing is released
+        while not waiter.event.wait(timeout=self.batch_max_wait):
+            with self.lock:
+                self.dispatch(port)
+        return time.monotonic() - waiter.enqueued
+
+    def release(self, port: int) -> None:
+        """
+        Free the slot taken by acquire.
+        """
+        with self.lock:
+            self.in_flight[port] -= 1
+            self.dispatch(port)
+
+    @contextmanager
+    def admit(self, port: int, agent: str = '', priority: str = INTERACTIVE):
+        """
+        Hold a backend slot for the duration of a generate call.
+
+        :returns: Context manager yielding the backend port.
+        """
+        self.acquire(port, agent, priority)
+        try:
+            yield port
+        finally:
+            self.release(port)
+
+    @asynccontextmanager
+    async def aadmit(self, port: int, agent: str = '', priority: str = INTERACTIVE):
+        """
+        Async counterpart of admit. The coroutine awaits a future the scheduler resolves, so no thread is held while it
+        waits.
+        """
+        loop = asyncio.get_running_loop()
+        waiter = self.enqueue(port, agent, priority, loop=loop, future=loop.create_future())
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            self.cancel(waiter)
+            raise
+        try:
+            yield port
+        finally:
+            self.release(port)
+
+    def queue_report(self) -> dict:
+        """
+        Queue-time stats per priority class plus what is waiting and running right now.
+        """
+        with self.lock:
+            return {
+                'classes': {name: stats.to_dict() for name, stats in self.stats.items()},
+                'waiting': len(self.waiters),
+                'in_flight': dict(self.in_flight),
+            }
+
+
+request_scheduler = RequestScheduler()
@@ -0,0 +1,126 @@
+from dataclasses import asdict, dataclass
+import json
+from pathlib import Path
+import time
+from handlers.agents_handler import Agent, ChatHandler, ModelInstructions, ParamsConfig, host_greeting
+from handlers.chroma_handler import chroma_get_or_create_collection
+from handlers.conversation_handler import start_new_conversation
+from handlers.ollama_handler import OllamaServer
+from handlers.scheduler_handler import BATCH
+
+
+@dataclass
+class SimulationConfig:
+    """
+    Settings for a headless Agent>Agent simulation.
+
+    :param host: Name of the hosting agent.
+    :param guest: Name of the guest agent.
+    :param rounds: Number of guest/host rounds to run.
+    :param opener: Seed message from the host. Defaults to the host's standard greeting.
+    :param output_path: JSONL transcript path. Defaults to library/transcripts/<host>-<guest>-<conversation>.jsonl.
+    :param server_port: Port of an already running Ollama server. When unset a server is started for the run.
+    :param mock: Start the mock Ollama server instead of `ollama serve` when starting one.
+    """
+    host: str
+    guest: str
+    rounds: int = 10
+    opener: str = None
+    output_path: str = None
+    server_port: int = None
+    mock: bool = None
+
+
+@dataclass
+class SimulationResult:
+    conversation_uuid: str
+    output_path: str
+    rounds: int
+    turns_written: int
+    wall_seconds: float
+    rounds_per_second: float
+    generated_tokens: int
+    tokens_per_second: float
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def load_agent(agent_name: str) -> Agent:
+    """
+    Load an agent from its yaml files without printing the configs. Headless agents run at batch priority so they
+    yield the backend to interactive chats.
+
+    :param agent_name: The name of the agent to load.
+    :returns: The Agent.
+    """
+    instructions = ModelInstructions(method='load', assistant_name=agent_name, verbose=False)
+    params_config = ParamsConfig(method='load', assistant_name=agent_name, verbose=False)
+    agent = Agent(params_config, instructions)
+    agent.priority = BATCH
+    return agent
+
+
+def run_agent_simulation(config: SimulationConfig) -> SimulationResult:
+    """
+    Run a fixed number of Agent>Agent rounds with no input(), banners or streamed output, writing every turn to a JSONL
+    transcript as it completes.
+
+    :param config: The simulation settings.
+    :returns: SimulationResult with throughput numbers.
+    """
+    host_agent = load_agent(config.host)
+    guest_agent = load_agent(config.guest)
+    conversation = start_new_conversation(host=host_agent.name, host_is_bot=True, guest=guest_agent.name, guest_is_bot=True)
+
+    output_path = Path(config.output_path or f"library/transcripts/{host_agent.name}-{guest_agent.name}-{conversation.uuid}.jsonl")
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    server = None
+    server_port = config.server_port
+    if server_port is None:
+        server = OllamaServer(mock=config.mock)
+        server_port = server.find_available_port()
+        server.start_server(server_port)
+
+    host_collection = chroma_get_or_create_collection(f"{host_agent.name}-{guest_agent.name}")
+    guest_collection = chroma_get_or_create_collection(f"{guest_agent.name}-{host_agent.name}")
+    host_agent.last_response = config.opener or host_greeting(host_agent)
+
+    chat_handler = ChatHandler(headless=True)
+    turns_written = 0
+    generated_tokens = 0
+    started = time.perf_counter()
+    try:
+        with output_path.open('a') as transcript:
+            for round_number in range(1, config.rounds + 1):
+                turn = chat_handler.run_agent_round(host_agent, guest_agent, host_collection, guest_collection, server_port=server_port)
+                for agent in (guest_agent, host_agent):
+                    if agent.last_metrics is not None:
+                        generated_tokens += agent.last_metrics.eval_count
+                record = {
+                    'conversation': conversation.uuid,
+                    'round': round_number,
+                    'host': host_agent.name,
+                    'guest': guest_agent.name,
+                    'turn': turn.to_dict(),
+                    'trace': chat_handler.last_trace.to_dict(),
+                }
+                transcript.write(json.dumps(record) + "\n")
+                transcript.flush()
+                turns_written += 1
+    finally:
+        if server is not None:
+            server.stop_server()
+
+    wall_seconds = time.perf_counter() - started
+    return SimulationResult(
+        conversation_uuid=conversation.uuid,
+        output_path=str(output_path),
+        rounds=config.rounds,
+        turns_written=turns_written,
+        wall_seconds=wall_seconds,
+        rounds_per_second=turns_written / wall_seconds if wall_seconds else 0.0,
+        generated_tokens=generated_tokens,
+        tokens_per_second=generated_tokens / wall_seconds if wall_seconds else 0.0,
+    )
@@ -0,0 +1,142 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import threading
+import requests
+from handlers.context_handler import token_estimator
+from handlers.conversation_handler import Conversation, ConversationArchive, conversation_archive
+from handlers.metrics_handler import GenerationMetrics, metrics_ledger
+from handlers.scheduler_handler import BATCH, request_scheduler
+
+
+SUMMARY_PROMPT = (
+    "You keep a running summary of a conversation between {host} and {guest}.\n"
+    "Current summary:\n{summary}\n\n"
+    "Turns that just scrolled out of the chat window:\n{turns}\n\n"
+    "Rewrite the summary so it also covers these turns. Keep names, decisions, facts and open questions. "
+    "Stay under {max_words} words and reply with the summary only."
+)
+
+
+class RollingSummarizer:
+    """
+    Folds turns that fall out of an agent's MessageCache into a rolling conversation summary, so long chats keep their
+    thread without the prompt growing. Folding runs on a background thread at batch priority with a cheap model, off the
+    turn's critical path. Turns evicted while a fold is running are picked up by the next fold together.
+    """
+
+    def __init__(self, agent, conversation: Conversation, server_port: int, model: str = None, max_summary_tokens: int = 256,
+                 archive: ConversationArchive = None) -> None:
+        """
+        :param agent: The Agent whose history is summarized.
+        :param conversation: The conversation the summary belongs to. Its summary field is kept up to date.
+        :param server_port: The Ollama server port.
+        :param model: Model for summarizing, defaults to the agent's summary_model, then its llm_model.
+        :param max_summary_tokens: Cap on the summary length, also the summary's prompt budget.
+        :param archive: Where the summary is persisted, defaults to the shared conversation archive.
+        """
+        self.agent = agent
+        self.conversation = conversation
+        self.server_port = server_port
+        self.model = model or agent.instructions.summary_model or agent.instructions.llm_model
+        self.max_summary_tokens = max_summary_tokens
+        self.archive = archive or conversation_archive
+        self.pending = []
+        self.summarized_turns = 0
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summary")
+        self.future = None
+
+    @property
+    def summary(self) -> str:
+        return self.conversation.summary
+
+    def attach(self) -> 'RollingSummarizer':
+        """
+        Start receiving the agent's evicted turns.
+        """
+        self.agent.message_cache.on_evict = self.on_evict
+        self.agent.summarizer = self
+        return self
+
+    def on_evict(self, turn) -> None:
+        with self.lock:
+            self.pending.append(turn)
+            if self.future is None or self.future.done():
+                self.future = self.executor.submit(self.fold_pending)
+
+    def fold_pending(self) -> None:
+        while True:
+            with self.lock:
+                turns, self.pending = self.pending, []
+                if not turns:
+                    # Cleared under the lock so an eviction from here on starts a new fold instead of waiting on this one
+                    self.future = None
+                    return
+            try:
+                self.fold(turns)
+            except Exception as e:
+                print(f'Error: summarizing {self.conversation.uuid}: {e}')
+                # Keep the batch for the next fold rather than losing it from the summary
+                with self.lock:
+                    self.pending = turns + self.pending
+                    self.future = None
+                return
+
+    def fold(self, turns: list) -> str:
+        """
+        Fold a batch of turns into the summary and persist it.
+
+        :param turns: The evicted Turns, oldest first.
+        :returns: The new summary.
+        """
+        turns_text = "\n".join(
+            f"{message.speaker}: {message.content}" for turn in turns for message in (turn.request, turn.response)
+        )
+        prompt = SUMMARY_PROMPT.format(
+            host=self.conversation.host,
+            guest=self.conversation.guest,
+            summary=self.summary or "(none yet)",
+            turns=turns_text,
+            max_words=int(self.max_summary_tokens * 0.75),
+        )
+        data = {
+            "model": self.model,
+            "stream": False,
+            "prompt": prompt,
+            "options": {"num_predict": self.max_summary_tokens, "temperature": 0.2},
+        }
+        with request_scheduler.admit(self.server_port, agent=f"{self.agent.name}:summary", priority=BATCH) as port:
+            response = requests.post(f"http://127.0.0.1:{port}/api/generate", data=json.dumps(data))
+        response.raise_for_status()
+        response_data = response.json()
+        metrics_ledger.record(GenerationMetrics.from_ollama_response(
+            agent=f"{self.agent.name}:summary", model=self.model, options=data["options"], response=response_data, priority=BATCH,
+        ))
+
+        summary = response_data.get("response", "").strip()
+        # Keep the start: models put the most important points first when asked for a bounded summary
+        if token_estimator.estimate(summary, self.model) > self.max_summary_tokens:
+            summary = summary[:int(self.max_summary_tokens * token_estimator.ratio(self.model))]
+        self.conversation.summary = summary
+        self.summarized_turns += len(turns)
+        self.archive.save_summary(self.conversation, self.summarized_turns)
+        return summary
+
+    def prompt_section(self) -> str:
+        """
+        The summary as a prompt section, empty when there is nothing summarized yet.
+        """
+        if not self.summary:
+            return ""
+        instructions = self.agent.instructions
+        return f"{instructions.start_token}Summary of the earlier conversation: \n{self.summary}{instructions.end_token}\n"
+
+    def close(self, wait: bool = True) -> None:
+        """
+        Stop the background thread, finishing any pending fold first when wait is True.
+        """
+        if self.agent.message_cache.on_evict == self.on_evict:
+            self.agent.message_cache.on_evict = None
+        if self.agent.summarizer is self:
+            self.agent.summarizer = None
+        self.executor.shutdown(wait=wait)
@@ -1,11 +1,14 @@
+import argparse
+import os
 import sys
 import cmd2
-from chat_cli import ChatApp
-from agent_library_cli import AgentsLibCli
-from ollama_cli import OllamaApp
-from handlers.ollama_handler import ollama_pull_model
 from utils.utilities import print_dev_stamp, print_main_banner, stream_disco_def, stream_terminal_output
-from handlers.agents_handler import Agent
+
+
+# Print the intro at once instead of streaming it. Also set by --fast.
+FAST_START = os.environ.get("DISCO_FAST_START", "0") not in ("", "0")
+DISCO_DEF = "(D)irected (I)ntelligence (S)ecurity (CO)mpanion for: CHAT"
+DEV_STAMP = "3Juliet, AI by @technomoonbase (2023)"
 
 
 def print_main_menu():
@@ -29,10 +32,20 @@ def print_main_menu():
     return print(menu_template)
 
 
-def main_intro():
-    stream_disco_def()
-    print_main_banner()
-    print_dev_stamp("3Juliet, AI by @technomoonbase (2023)")
+def main_intro(fast: bool = False):
+    """
+    Intro shown once before the main menu.
+
+    :param fast: Print the text at once instead of streaming it character by character.
+    """
+    if fast:
+        print(DISCO_DEF)
+        print_main_banner()
+        print(DEV_STAMP)
+    else:
+        stream_disco_def()
+        print_main_banner()
+        print_dev_stamp(DEV_STAMP)
     print_main_menu()
 
 
@@ -43,23 +56,29 @@ def child_break_banner():
 
 
 class Main(cmd2.Cmd):
+    """
+    The submenus are imported when they are entered: the chat and agents lobbies pull in the agent, chroma and ollama
+    handlers, which the main menu itself does not need.
+    """
     prompt = "3J:Moonbase> "
-    intro = main_intro()
 
     def do_1(self, line):
         print("Entering chat lobby...")
+        from chat_cli import ChatApp
         chat_app = ChatApp()
         chat_app.cmdloop()
         child_break_banner()
     
     def do_2(self, line):
         print("Entering agents library...")
+        from agent_library_cli import AgentsLibCli
         agents_app = AgentsLibCli()
         agents_app.cmdloop()
         child_break_banner()
     
     def do_3(self, line):
         print("Entering Ollama library...")
+        from ollama_cli import OllamaApp
         ollama_app = OllamaApp()
         ollama_app.cmdloop()
         child_break_banner()
@@ -91,6 +110,19 @@ class Main(cmd2.Cmd):
         print_main_menu()
         intro = "Welcome to DISCO Chat by 3jai! Type ? for help"
 
+
 if __name__ == '__main__':
-    app = Main()
+    parser = argparse.ArgumentParser(description="Moonbase: DISCO chat terminal.")
+    parser.add_argument("--fast", action="store_true", help="Print the intro at once instead of streaming it.")
+    parser.add_argument("--import-report", action="store_true", help="Print the slowest imports on the way to the main menu and exit.")
+    args = parser.parse_args()
+
+    if args.import_report:
+        from utils.startup_profile import print_import_time_report
+        print_import_time_report('main')
+        sys.exit(0)
+
+    main_intro(fast=args.fast or FAST_START)
+    # Our flags are already handled, keep cmd2 from running them as commands
+    app = Main(allow_cli_args=False)
     app.cmdloop()
@@ -1,5 +1,6 @@
 import cmd2
 from handlers.ollama_handler import ollama_list_downloaded_models, ollama_pull_model, ollama_remove_model
+from handlers.metrics_handler import metrics_ledger
 from utils.utilities import print_dev_stamp, toilet_banner_metal
 
 
@@ -16,6 +17,7 @@ def print_ollama_menu():
     [2] Download New Model
     [3] Remove Downloaded Model
     [4] Create Model from Modelfile
+    [5] Model Performance Report
 
     [9] Back to main menu (or type 'back' or 'main')
 
@@ -56,6 +58,11 @@ class OllamaApp(cmd2.Cmd):
     def do_4(self, line):
         pass
 
+    def do_5(self, line):
+        print("\nModel performance from recorded chat sessions...\n\n")
+        metrics_ledger.print_model_report()
+        print("\n\n")
+
     def do_9(self, line):
         print("\nHeading back to base...")
         return True
@@ -0,0 +1,44 @@
+import argparse
+import json
+from handlers.provisioning_handler import load_manifest, provision_agents
+
+
+def main(argv: list = None) -> None:
+    """
+    Create agents in bulk from a manifest, without prompts.
+
+    Example:
+        python provision_cli.py personas.yaml --intros --intro-workers 8 --mock
+    """
+    parser = argparse.ArgumentParser(description="Provision agents from a YAML or JSONL manifest.")
+    parser.add_argument('manifest', help="YAML ({defaults, agents} or a list) or JSONL manifest of agent specs")
+    parser.add_argument('--user', default=None, help="Designer name for memory collections and intros (defaults to $USER)")
+    parser.add_argument('--intros', action='store_true', help="Run the two step intro handshake for each new agent")
+    parser.add_argument('--intro-workers', type=int, default=4, help="Number of intro handshakes in flight")
+    parser.add_argument('--port', type=int, default=None, help="Use an already running Ollama server on this port")
+    parser.add_argument('--mock', action='store_true', default=None, help="Start the offline mock Ollama server")
+    parser.add_argument('--json', action='store_true', help="Print the result as JSON")
+    args = parser.parse_args(argv)
+
+    result = provision_agents(
+        load_manifest(args.manifest),
+        username=args.user,
+        intros=args.intros,
+        intro_workers=args.intro_workers,
+        server_port=args.port,
+        mock=args.mock,
+    )
+
+    if args.json:
+        print(json.dumps(result.to_dict(), indent=2))
+        return
+    print(f"Created: {len(result.created)}  Skipped: {len(result.skipped)}  Collections: {result.collections}")
+    if args.intros:
+        print(f"Intros: {result.intros_completed} completed, {len(result.intros_failed)} failed")
+        for agent_name, error in result.intros_failed.items():
+            print(f"    {agent_name}: {error}")
+    print(f"Done in {result.wall_seconds:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
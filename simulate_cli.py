@@ -0,0 +1,38 @@
+import argparse
+from handlers.simulation_handler import SimulationConfig, run_agent_simulation
+
+
+def main(argv: list = None) -> None:
+    """
+    Headless Agent>Agent simulation runner. Writes each round to a JSONL transcript and prints throughput at the end.
+
+    Example:
+        python simulate_cli.py salvadore dizzy --rounds 25 --output library/transcripts/salvadore-dizzy.jsonl
+    """
+    parser = argparse.ArgumentParser(description="Run a headless Agent>Agent chat for a fixed number of rounds.")
+    parser.add_argument('host', help="Name of the hosting agent")
+    parser.add_argument('guest', help="Name of the guest agent")
+    parser.add_argument('--rounds', type=int, default=10, help="Number of guest/host rounds")
+    parser.add_argument('--opener', default=None, help="Seed message from the host (defaults to the host greeting)")
+    parser.add_argument('--output', default=None, help="JSONL transcript path")
+    parser.add_argument('--port', type=int, default=None, help="Use an already running Ollama server on this port")
+    parser.add_argument('--mock', action='store_true', default=None, help="Start the offline mock Ollama server")
+    args = parser.parse_args(argv)
+
+    result = run_agent_simulation(SimulationConfig(
+        host=args.host.lower(),
+        guest=args.guest.lower(),
+        rounds=args.rounds,
+        opener=args.opener,
+        output_path=args.output,
+        server_port=args.port,
+        mock=args.mock,
+    ))
+
+    print(f"Transcript: {result.output_path}")
+    print(f"Rounds: {result.turns_written}/{result.rounds} in {result.wall_seconds:.1f}s ({result.rounds_per_second:.2f} rounds/s)")
+    print(f"Generated tokens: {result.generated_tokens} ({result.tokens_per_second:.1f} tokens/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+from datetime import datetime, timedelta
+import json
+import pytest
+from handlers.conversation_handler import Conversation, ConversationArchive, Message, Turn
+from training import archive_export
+from training.archive_export import ArchiveExportFilter, ArchiveExportStats, export_archive, iter_archive_records
+from training.dedup import Deduplicator
+from training.jsonl_shards import ShardedJsonlWriter
+
+
+@pytest.fixture(autouse=True)
+def prompt_format(monkeypatch):
+    # Agent instructions are read through the config store; the tests have no agents directory
+    monkeypatch.setattr(archive_export.AgentPromptFormat, 'get', lambda self, agent: {
+        'system_prompt': "system", 'assistant_name': agent, 'start_token': '<s>', 'end_token': '</s>',
+    })
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return ConversationArchive(str(tmp_path / 'conversations'))
+
+
+def conversation(uuid: str = 'c1', agent_chat: bool = False) -> Conversation:
+    return Conversation(uuid=uuid, created_at='2026-01-01 @ 00:00', last_active='2026-01-01 @ 00:00', host='ann',
+                        host_is_bot=True, guest='bob' if agent_chat else 'user', guest_is_bot=agent_chat)
+
+
+def turn(uuid: str) -> Turn:
+    return Turn(
+        uuid=uuid,
+        request=Message(uuid=f"{uuid}-q", timestamp='t', role='user', speaker='user', content=f"Tell me about {uuid} please"),
+        response=Message(uuid=f"{uuid}-a", timestamp='t', role='assistant', speaker='ann', content=f"Here is what I know about {uuid}."),
+    )
+
+
+def run(archive: ConversationArchive, state: dict, export_filter: ArchiveExportFilter = None, **options) -> tuple:
+    stats = ArchiveExportStats()
+    records = iter_archive_records(str(archive.root), state, export_filter or ArchiveExportFilter(), stats, **options)
+    return [record['request_id'] for record in records], stats
+
+
+def exported_ids(dest_dir) -> list:
+    ids = []
+    for path in sorted(dest_dir.glob('archive-*.jsonl')):
+        with open(path) as file:
+            ids.extend(json.loads(line)['request_id'] for line in file)
+    return ids
+
+
+def test_each_run_reads_only_new_turns(archive):
+    state = {}
+    archive.append_turn(conversation(), turn('t1'))
+    assert run(archive, state)[0] == ['t1']
+
+    ids, stats = run(archive, state)
+    assert ids == [] and stats.bytes_read == 0 and stats.files_read == 0
+
+    archive.append_turn(conversation(), turn('t2'))
+    assert run(archive, state)[0] == ['t2']
+
+
+def test_incomplete_line_is_left_for_the_next_run(archive):
+    state = {}
+    archive.append_turn(conversation(), turn('t1'))
+    path = archive.path_for('c1')
+    line = json.dumps({'record': 'turn', 'turn': turn('t2').to_dict(), 'archived_at': '2026-01-01T00:00:00'})
+    with open(path, 'a') as file:
+        file.write(line[:40])
+
+    assert run(archive, state)[0] == ['t1']
+    with open(path, 'a') as file:
+        file.write(line[40:] + "\n")
+    assert run(archive, state)[0] == ['t2']
+
+
+def test_young_turns_wait_to_settle(archive):
+    state = {}
+    path = archive.path_for('c1')
+    path.parent.mkdir(parents=True)
+    header = {key: value for key, value in conversation().to_dict().items() if key not in ('turns', 'summary')}
+    now = datetime.now()
+    with open(path, 'w') as file:
+        file.write(json.dumps({**header, 'record': 'conversation'}) + "\n")
+        for uuid, archived_at in (('t1', now - timedelta(minutes=5)), ('t2', now)):
+            record = {'record': 'turn', 'turn': turn(uuid).to_dict(), 'archived_at': archived_at.isoformat(timespec='seconds')}
+            file.write(json.dumps(record) + "\n")
+
+    ids, stats = run(archive, state, settle_seconds=60)
+    assert ids == ['t1'] and stats.waiting == 1
+    assert run(archive, state)[0] == ['t2']
+
+
+def test_agent_chats_are_skipped_unless_included(archive):
+    archive.append_turn(conversation('c2', agent_chat=True), turn('t1'))
+    ids, stats = run(archive, {})
+    assert ids == [] and stats.skipped_agent_chat == 1
+    assert run(archive, {}, ArchiveExportFilter(include_agent_chats=True))[0] == ['t1']
+
+
+def test_unrated_turn_is_exported_once_rated(archive):
+    state = {}
+    rated_filter = ArchiveExportFilter(min_rating=4)
+    archive.append_turn(conversation(), turn('t1'))
+    ids, stats = run(archive, state, rated_filter)
+    assert ids == [] and stats.pending_rating == 1 and stats.skipped_rating == 0
+
+    archive.rate_turn(conversation(), 't1', 5)
+    ids, stats = run(archive, state, rated_filter)
+    assert ids == ['t1'] and stats.pending_rating == 0
+    assert state['pending'] == {}
+    assert run(archive, state, rated_filter)[0] == []
+
+
+def test_low_rating_can_be_raised_within_the_window(archive):
+    state = {}
+    rated_filter = ArchiveExportFilter(min_rating=4)
+    archive.append_turn(conversation(), turn('t1'))
+    archive.rate_turn(conversation(), 't1', 2)
+    assert run(archive, state, rated_filter)[0] == []
+
+    archive.rate_turn(conversation(), 't1', 4)
+    assert run(archive, state, rated_filter)[0] == ['t1']
+
+
+def test_pending_turns_expire_after_the_rating_window(archive):
+    state = {}
+    rated_filter = ArchiveExportFilter(min_rating=4)
+    archive.append_turn(conversation(), turn('t1'))
+    run(archive, state, rated_filter)
+
+    # The file has not grown, but its pending turn is still checked for expiry
+    ids, stats = run(archive, state, rated_filter, rating_window_seconds=-60)
+    assert ids == [] and stats.skipped_rating == 1 and state['pending'] == {}
+
+    archive.rate_turn(conversation(), 't1', 5)
+    assert run(archive, state, rated_filter)[0] == []
+
+
+def test_checkpoints_cover_exactly_the_records_handed_out(archive):
+    state = {}
+    checkpoints = {}
+    for uuid in ('t1', 't2'):
+        archive.append_turn(conversation(), turn(uuid))
+    stats = ArchiveExportStats()
+    records = iter_archive_records(str(archive.root), state, ArchiveExportFilter(), stats, checkpoints=checkpoints)
+
+    next(records)
+    name, offset, pending = checkpoints['t1']
+    resumed = {'files': {name: offset}, 'pending': {name: pending}}
+    assert run(archive, resumed)[0] == ['t2']
+
+
+def test_shard_writer_drops_the_unfinished_shard_on_error(tmp_path):
+    with pytest.raises(KeyboardInterrupt):
+        with ShardedJsonlWriter(str(tmp_path), prefix='archive', shard_size=2) as writer:
+            for number in range(3):
+                writer.write({'n': number})
+            raise KeyboardInterrupt
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['archive-00000.jsonl']
+
+
+@pytest.mark.parametrize('dedup', [False, True])
+def test_interrupted_export_neither_loses_nor_repeats_turns(archive, tmp_path, monkeypatch, dedup):
+    for conversation_uuid in ('c1', 'c2'):
+        for number in range(4):
+            archive.append_turn(conversation(conversation_uuid), turn(f"{conversation_uuid}-t{number}"))
+    dest_dir = tmp_path / 'datasets'
+    write = ShardedJsonlWriter.write
+    written = []
+
+    def failing_write(self, record):
+        if len(written) == 5:
+            raise KeyboardInterrupt
+        written.append(record)
+        write(self, record)
+
+    def deduplicator():
+        return Deduplicator(workers=0, id_key=lambda record: record['request_id']) if dedup else None
+
+    monkeypatch.setattr(ShardedJsonlWriter, 'write', failing_write)
+    with pytest.raises(KeyboardInterrupt):
+        export_archive(str(archive.root), str(dest_dir), shard_size=2, deduplicator=deduplicator())
+    assert not list(dest_dir.glob('*.tmp'))
+    assert len(exported_ids(dest_dir)) == 4
+
+    monkeypatch.setattr(ShardedJsonlWriter, 'write', write)
+    stats = export_archive(str(archive.root), str(dest_dir), shard_size=2, deduplicator=deduplicator())
+    assert stats.exported == 4
+    ids = exported_ids(dest_dir)
+    assert sorted(ids) == sorted(f"{uuid}-t{number}" for uuid in ('c1', 'c2') for number in range(4))
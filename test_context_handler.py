@@ -0,0 +1,124 @@
+from handlers.context_handler import ContextSizer, TokenEstimator, plan_context
+
+
+def estimator() -> TokenEstimator:
+    # One character per token, so a section of n characters costs n + 1 tokens
+    return TokenEstimator(default_chars_per_token=1.0)
+
+
+def test_everything_fits():
+    plan = plan_context(1000, 100, "s" * 9, "hello", ["m" * 9], ["h" * 9], estimator(), summary="u" * 9)
+    assert plan.memories == ["m" * 9] and plan.history == ["h" * 9] and plan.summary == "u" * 9
+    assert plan.dropped_memories == plan.dropped_history == 0
+    assert plan.prompt_tokens == 10 + 6 + 10 + 10 + 10
+    assert not plan.over_budget
+
+
+def test_oldest_history_is_dropped_first():
+    history = ["old" + "h" * 6, "mid" + "h" * 6, "new" + "h" * 6]
+    # budget 35: system 10, input 2, memory 10, leaves 13 for one history item
+    plan = plan_context(45, 10, "s" * 9, "x", ["m" * 9], history, estimator())
+    assert plan.history == ["new" + "h" * 6]
+    assert plan.dropped_history == 2
+    assert plan.memories == ["m" * 9]
+
+
+def test_summary_is_dropped_before_memories():
+    # budget 30: system 10, input 2, memory 10, leaves 8, too little for the 10 token summary
+    plan = plan_context(40, 10, "s" * 9, "x", ["m" * 9], [], estimator(), summary="u" * 9)
+    assert plan.summary_dropped and plan.summary == "" and plan.summary_tokens == 0
+    assert plan.memories == ["m" * 9]
+
+
+def test_history_still_fills_room_left_by_a_dropped_summary():
+    plan = plan_context(40, 10, "s" * 9, "x", [], ["h" * 4], estimator(), summary="u" * 30)
+    assert plan.summary_dropped
+    assert plan.history == ["h" * 4]
+
+
+def test_memories_are_kept_in_rank_order_and_stop_at_the_first_misfit():
+    memories = ["a" * 9, "b" * 19, "c" * 2]
+    # budget 30: system 10, input 2, leaves 18; the second memory does not fit and nothing after it is tried
+    plan = plan_context(40, 10, "s" * 9, "x", memories, [], estimator())
+    assert plan.memories == ["a" * 9]
+    assert plan.dropped_memories == 2
+
+
+def test_long_input_keeps_its_end():
+    plan = plan_context(30, 10, "s" * 9, "start " + "x" * 40 + " question?", [], [], estimator())
+    assert plan.input_truncated
+    assert plan.user_input.endswith("question?")
+    assert plan.prompt_tokens <= plan.budget
+
+
+def test_system_text_is_never_trimmed():
+    plan = plan_context(20, 10, "s" * 30, "hello", ["m"], ["h"], estimator())
+    assert plan.system_tokens == 31
+    assert plan.user_input == "" and plan.memories == [] and plan.history == []
+    assert plan.over_budget
+
+
+def test_reserve_larger_than_window_gives_an_empty_budget():
+    plan = plan_context(100, 200, "", "", [], [], estimator())
+    assert plan.budget == 0
+    assert not plan.over_budget
+
+
+def test_calibration_ignores_implausible_samples():
+    tokens = TokenEstimator(smoothing=0.5)
+    tokens.calibrate('m', "x" * 300, 100)
+    assert tokens.ratio('m') == 3.0
+    # Mostly served from the KV cache: far fewer evaluated tokens than the prompt holds
+    tokens.calibrate('m', "x" * 3000, 10)
+    assert tokens.ratio('m') == 3.0
+    tokens.calibrate('m', "x" * 200, 100)
+    assert tokens.ratio('m') == 2.5
+    assert tokens.ratio('other') == 4.0
+
+
+def sizer(**options) -> ContextSizer:
+    return ContextSizer(buckets=(1024, 2048, 4096, 8192), downsize_after=3, enabled=True, headroom=0.15, **options)
+
+
+def test_headroom_pushes_past_a_bucket_edge():
+    # 900 estimated tokens need 1036 with headroom, more than the 1024 bucket
+    assert sizer().size('m', 900, 8192) == 2048
+    assert sizer().size('m', 800, 8192) == 1024
+
+
+def test_never_above_the_configured_window():
+    assert sizer().size('m', 5000, 4096) == 4096
+    assert sizer().size('m', 100, 1500) == 1024
+
+
+def test_grows_at_once_and_shrinks_only_after_a_streak():
+    context = sizer()
+    assert context.size('m', 3000, 8192) == 4096
+    assert context.size('m', 200, 8192) == 4096
+    assert context.size('m', 200, 8192) == 4096
+    assert context.size('m', 200, 8192) == 1024
+    assert context.size('m', 1500, 8192) == 2048
+
+
+def test_a_request_at_the_current_size_resets_the_streak():
+    context = sizer()
+    context.size('m', 3000, 8192)
+    context.size('m', 200, 8192)
+    context.size('m', 200, 8192)
+    context.size('m', 3000, 8192)
+    assert context.size('m', 200, 8192) == 4096
+    assert context.size('m', 200, 8192) == 4096
+    assert context.size('m', 200, 8192) == 1024
+
+
+def test_state_is_kept_per_model_and_window():
+    context = sizer()
+    assert context.size('m', 3000, 8192) == 4096
+    # Another agent on the same model with a small window neither resets nor inherits the large size
+    assert context.size('m', 200, 2048) == 1024
+    assert context.size('other', 200, 8192) == 1024
+    assert context.size('m', 200, 8192) == 4096
+
+
+def test_disabled_sends_the_configured_window():
+    assert ContextSizer(enabled=False).size('m', 10, 4096) == 4096
@@ -0,0 +1,87 @@
+from training.dedup import DedupReport, Deduplicator, MinHasher, training_text
+from training.extract_json import format_training_prompt
+
+
+SYSTEM_PROMPT = ("You are Juliet, a warm and curious companion. You remember what people tell you, you ask follow-up "
+                 "questions, and you keep your answers short unless asked for detail. ") * 4
+
+LONG_ANSWER = ("Recursion is when a function calls itself on a smaller piece of the problem until it reaches a base case "
+               "that can be answered directly, and then the partial answers are combined on the way back up the call "
+               "stack, which is why every recursive function needs a base case and progress toward it.")
+
+TOPICS = [
+    "Photosynthesis turns light, water and carbon dioxide into sugar and oxygen inside the chloroplasts of plant leaves.",
+    "A binary search halves a sorted list at every step, so finding an item among a million takes about twenty checks.",
+    "Sourdough rises because wild yeast and lactic bacteria in the starter ferment the flour and release carbon dioxide.",
+    "Tides follow the moon because its gravity pulls the near side of the ocean harder than the far side of the planet.",
+]
+
+
+def record(request: str, response: str, request_id: str = None) -> dict:
+    return {'request_id': request_id or request, **format_training_prompt(request, response, SYSTEM_PROMPT)}
+
+
+def run(records: list, **options) -> tuple:
+    report = DedupReport(0.8, 64, 0)
+    deduplicator = Deduplicator(workers=0, id_key=lambda item: item['request_id'], **options)
+    kept = [item['request_id'] for item in deduplicator.filter(records, report)]
+    return kept, report
+
+
+def test_training_text_leaves_out_the_system_turn():
+    text = training_text(record("hi there", "hello!"))
+    assert SYSTEM_PROMPT.strip() not in text
+    assert text.startswith("hi there")
+
+
+def test_training_text_compares_other_prompts_whole():
+    assert training_text({'prompt': "plain text prompt"}) == "plain text prompt"
+    assert training_text({}) == ""
+
+
+def test_shared_system_turn_does_not_make_short_pairs_duplicates():
+    records = [record("hi", "hello!", 'a'), record("thanks", "any time", 'b'), record("bye", "see you", 'c')]
+    kept, report = run(records)
+    assert kept == ['a', 'b', 'c']
+    assert report.removed == 0
+
+
+def test_exact_duplicates_ignore_case_and_punctuation():
+    records = [record("What is recursion?", LONG_ANSWER, 'a'), record("what is recursion", LONG_ANSWER.upper(), 'b')]
+    kept, report = run(records)
+    assert kept == ['a']
+    assert report.exact_duplicates == 1
+    assert report.examples == [{'dropped': 'b', 'duplicate_of': 'a', 'similarity': 1.0}]
+
+
+def test_near_duplicates_are_removed_and_distinct_records_kept():
+    near = LONG_ANSWER.replace("combined on the way back", "merged on the way back")
+    other = ("A hash map stores values under keys by hashing each key to a bucket, so lookups take constant time on "
+             "average as long as the table is resized before the buckets get crowded with colliding keys.")
+    records = [record("What is recursion?", LONG_ANSWER, 'a'), record("What is recursion?", near, 'b'),
+               record("What is a hash map?", other, 'c')]
+    kept, report = run(records)
+    assert kept == ['a', 'c']
+    assert report.near_duplicates == 1
+
+
+def test_duplicates_are_found_across_batches_and_order_is_kept():
+    records = [record(f"question {number}", TOPICS[number], str(number)) for number in range(3)]
+    records.insert(2, record("question 0", TOPICS[0], 'dup'))
+    kept, report = run(records, batch_size=2)
+    assert kept == ['0', '1', '2']
+    assert (report.seen, report.kept, report.removed) == (4, 3, 1)
+
+
+def test_signatures_match_across_hashers_with_the_same_seed():
+    assert MinHasher(seed=7).signature(LONG_ANSWER) == MinHasher(seed=7).signature(LONG_ANSWER)
+    assert MinHasher(seed=7).signature(LONG_ANSWER) != MinHasher(seed=8).signature(LONG_ANSWER)
+
+
+def test_process_pool_keeps_the_same_records():
+    records = [record(f"question {number % 3}", TOPICS[number % 3], str(number)) for number in range(9)]
+    serial, _ = run(records, batch_size=4)
+    report = DedupReport(0.8, 64, 0)
+    deduplicator = Deduplicator(workers=2, batch_size=4, id_key=lambda item: item['request_id'])
+    pooled = [item['request_id'] for item in deduplicator.filter(records, report)]
+    assert pooled == serial == ['0', '1', '2']
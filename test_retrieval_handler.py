@@ -0,0 +1,79 @@
+from handlers.retrieval_handler import RetrievalGate, exclude_turn_results
+
+
+def chroma_results(entries: list) -> dict:
+    """
+    One query's results in Chroma's shape from (id, metadata) pairs, nearest first.
+    """
+    return {
+        'ids': [[entry_id for entry_id, _ in entries]],
+        'documents': [[f"doc {entry_id}" for entry_id, _ in entries]],
+        'metadatas': [[metadata for _, metadata in entries]],
+        'distances': [[index / 10 for index in range(len(entries))]],
+    }
+
+
+def test_drops_in_window_turns_by_metadata_or_id():
+    results = chroma_results([
+        ('t1', {'turn': 't1'}),
+        ('legacy-id', {'turn': 't2'}),
+        ('t3', None),
+        ('kb-1', {'source': 'corpus.txt'}),
+        ('t4', {'turn': 't4'}),
+    ])
+    filtered = exclude_turn_results(results, ['t1', 't2', 't3'])
+    assert filtered['ids'] == [['kb-1', 't4']]
+    assert filtered['documents'] == [['doc kb-1', 'doc t4']]
+    assert filtered['distances'] == [[0.3, 0.4]]
+
+
+def test_documents_without_turn_metadata_are_kept():
+    results = chroma_results([('kb-1', {'source': 'corpus.txt'}), ('seed', None), ('t9', {'turn': 't9'})])
+    assert exclude_turn_results(results, ['t1'])['ids'] == [['kb-1', 'seed', 't9']]
+
+
+def test_over_fetched_results_are_trimmed_to_the_nearest():
+    results = chroma_results([('t1', {'turn': 't1'}), ('a', None), ('b', None), ('c', None)])
+    filtered = exclude_turn_results(results, ['t1'], n_results=2)
+    assert filtered['ids'] == [['a', 'b']]
+    assert filtered['distances'] == [[0.1, 0.2]]
+
+
+def test_trims_without_exclusions():
+    results = chroma_results([('a', None), ('b', None), ('c', None)])
+    assert exclude_turn_results(results, [], n_results=1)['ids'] == [['a']]
+
+
+def test_nothing_to_do_returns_results_unchanged():
+    results = chroma_results([('a', None)])
+    assert exclude_turn_results(results, []) is results
+    assert exclude_turn_results(results, None) is results
+
+
+def test_every_query_is_filtered_and_missing_columns_stay_missing():
+    results = {
+        'ids': [['t1', 'a'], ['b', 't1']],
+        'documents': [['d t1', 'd a'], ['d b', 'd t1']],
+        'metadatas': [[{'turn': 't1'}, None], [None, {'turn': 't1'}]],
+        'distances': None,
+    }
+    filtered = exclude_turn_results(results, ['t1'])
+    assert filtered['ids'] == [['a'], ['b']]
+    assert filtered['documents'] == [['d a'], ['d b']]
+    assert filtered['distances'] is None
+
+
+def test_reused_results_are_filtered_for_the_current_window():
+    gate = RetrievalGate(embedding_function=lambda texts: [[1.0, 0.0] for _ in texts])
+    queries = []
+
+    def run_query(embedding: list) -> dict:
+        queries.append(embedding)
+        return chroma_results([('t1', {'turn': 't1'}), ('t2', {'turn': 't2'})])
+
+    first, decision = gate.retrieve("what did Bob say about recursion", 'ann-bob', run_query, exclude_turns=[])
+    assert decision.action == 'query' and first['ids'] == [['t1', 't2']]
+    # t1 entered the history window since; the reused results must not repeat it
+    reused, decision = gate.retrieve("what did Bob say about recursion?", 'ann-bob', run_query, exclude_turns=['t1'])
+    assert decision.action == 'reuse' and len(queries) == 1
+    assert reused['ids'] == [['t2']]
@@ -0,0 +1,202 @@
+import asyncio
+import threading
+import time
+import pytest
+from handlers.scheduler_handler import BATCH, INTERACTIVE, RequestScheduler
+
+
+PORT = 11434
+
+
+def hold_slot(scheduler: RequestScheduler, agent: str = 'holder') -> None:
+    scheduler.acquire(PORT, agent, INTERACTIVE)
+
+
+def enqueue(scheduler: RequestScheduler, agent: str, priority: str = INTERACTIVE):
+    return scheduler.enqueue(PORT, agent, priority, event=threading.Event())
+
+
+def test_interactive_goes_before_earlier_batch():
+    scheduler = RequestScheduler(max_in_flight=1)
+    hold_slot(scheduler)
+    batch = enqueue(scheduler, 'sim', BATCH)
+    interactive = enqueue(scheduler, 'chat', INTERACTIVE)
+
+    scheduler.release(PORT)
+    assert interactive.granted and not batch.granted
+    scheduler.release(PORT)
+    assert batch.granted
+
+
+def test_least_served_agent_goes_first_within_a_class():
+    scheduler = RequestScheduler(max_in_flight=1)
+    hold_slot(scheduler, agent='chatty')
+    chatty = enqueue(scheduler, 'chatty')
+    quiet = enqueue(scheduler, 'quiet')
+
+    scheduler.release(PORT)
+    assert quiet.granted and not chatty.granted
+
+
+def test_arrival_order_breaks_ties():
+    scheduler = RequestScheduler(max_in_flight=1)
+    hold_slot(scheduler)
+    first = enqueue(scheduler, 'a', BATCH)
+    second = enqueue(scheduler, 'b', BATCH)
+
+    scheduler.release(PORT)
+    assert first.granted and not second.granted
+
+
+def test_batch_promoted_after_max_wait():
+    scheduler = RequestScheduler(max_in_flight=1, batch_max_wait=0.05)
+    hold_slot(scheduler)
+    batch = enqueue(scheduler, 'sim', BATCH)
+    time.sleep(0.1)
+    interactive = enqueue(scheduler, 'chat', INTERACTIVE)
+
+    # Both rank as interactive now and neither agent has been served, so the earlier batch call wins
+    scheduler.release(PORT)
+    assert batch.granted and not interactive.granted
+
+
+def test_batch_never_promoted_without_max_wait():
+    scheduler = RequestScheduler(max_in_flight=1, batch_max_wait=None)
+    hold_slot(scheduler)
+    batch = enqueue(scheduler, 'sim', BATCH)
+    time.sleep(0.05)
+    interactive = enqueue(scheduler, 'chat', INTERACTIVE)
+
+    scheduler.release(PORT)
+    assert interactive.granted and not batch.granted
+
+
+def test_backends_are_limited_separately():
+    scheduler = RequestScheduler(max_in_flight=1)
+    hold_slot(scheduler)
+    other = scheduler.enqueue(PORT + 1, 'other', INTERACTIVE, event=threading.Event())
+    assert other.granted
+
+
+def test_ensure_backend_limit_raises_but_never_lowers():
+    scheduler = RequestScheduler(max_in_flight=1)
+    hold_slot(scheduler)
+    waiter = enqueue(scheduler, 'room')
+    assert not waiter.granted
+
+    scheduler.ensure_backend_limit(PORT, 2)
+    assert waiter.granted
+    scheduler.ensure_backend_limit(PORT, 1)
+    assert scheduler.limit(PORT) == 2
+
+
+def test_cancel_waiting_removes_it():
+    scheduler = RequestScheduler(max_in_flight=1)
+    hold_slot(scheduler)
+    waiter = enqueue(scheduler, 'gone')
+    scheduler.cancel(waiter)
+    scheduler.release(PORT)
+
+    assert scheduler.queue_report()['waiting'] == 0
+    assert scheduler.in_flight[PORT] == 0
+
+
+def test_cancel_after_grant_hands_the_slot_on():
+    scheduler = RequestScheduler(max_in_flight=1)
+    hold_slot(scheduler)
+    granted_late = enqueue(scheduler, 'late')
+    next_waiter = enqueue(scheduler, 'next')
+    scheduler.release(PORT)
+    assert granted_late.granted
+
+    # The caller stopped waiting just as the slot arrived
+    scheduler.cancel(granted_late)
+    assert next_waiter.granted
+    assert scheduler.in_flight[PORT] == 1
+
+
+def test_unknown_priority_is_rejected():
+    with pytest.raises(ValueError):
+        RequestScheduler().enqueue(PORT, 'x', 'urgent', event=threading.Event())
+
+
+def test_threads_never_exceed_the_limit():
+    scheduler = RequestScheduler(max_in_flight=2)
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def call(number: int) -> None:
+        with scheduler.admit(PORT, agent=f"agent{number % 3}", priority=BATCH if number % 2 else INTERACTIVE):
+            with lock:
+                running.append(number)
+                peak.append(len(running))
+            time.sleep(0.01)
+            with lock:
+                running.remove(number)
+
+    threads = [threading.Thread(target=call, args=(number,)) for number in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert len(peak) == 12
+    assert max(peak) == 2
+    assert scheduler.in_flight[PORT] == 0
+
+
+def test_async_admission_respects_the_limit():
+    scheduler = RequestScheduler(max_in_flight=2)
+    running = 0
+    peak = 0
+
+    async def call() -> None:
+        nonlocal running, peak
+        async with scheduler.aadmit(PORT, agent='session') as port:
+            assert port == PORT
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    async def main() -> None:
+        await asyncio.gather(*(call() for _ in range(6)))
+
+    asyncio.run(main())
+    assert peak == 2
+    assert scheduler.in_flight[PORT] == 0
+
+
+def test_async_cancel_while_waiting_leaks_no_slot():
+    scheduler = RequestScheduler(max_in_flight=1)
+
+    async def main() -> None:
+        hold_slot(scheduler)
+        task = asyncio.create_task(scheduler.aadmit(PORT, agent='cancelled').__aenter__())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        scheduler.release(PORT)
+
+    asyncio.run(main())
+    assert scheduler.queue_report()['waiting'] == 0
+    assert scheduler.in_flight[PORT] == 0
+
+
+def test_async_cancel_racing_a_grant_returns_the_slot():
+    scheduler = RequestScheduler(max_in_flight=1)
+
+    async def main() -> None:
+        hold_slot(scheduler)
+        task = asyncio.create_task(scheduler.aadmit(PORT, agent='raced').__aenter__())
+        await asyncio.sleep(0.01)
+        # The slot is granted, but the task is cancelled before the loop resolves its future
+        scheduler.release(PORT)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert scheduler.in_flight[PORT] == 0
@@ -0,0 +1,355 @@
+import argparse
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+import json
+import os
+from pathlib import Path
+import time
+from handlers.config_handler import config_store
+from handlers.context_handler import token_estimator
+from training.dedup import DedupReport, Deduplicator
+from training.extract_json import format_training_prompt
+from training.jsonl_shards import ShardedJsonlWriter, next_shard_index
+
+
+STATE_FILE = 'archive_export_state.json'
+
+
+@dataclass
+class ArchiveExportFilter:
+    """
+    :param agents: Agent names to export, all when empty.
+    :param min_rating: Only turns rated at least this. Unrated turns wait for a rating (see iter_archive_records).
+    :param min_tokens: Shortest request plus response, in estimated tokens.
+    :param max_tokens: Longest request plus response, in estimated tokens, unbounded when unset.
+    :param include_agent_chats: Also export Agent>Agent conversations.
+    """
+    agents: list = None
+    min_rating: int = None
+    min_tokens: int = 1
+    max_tokens: int = None
+    include_agent_chats: bool = False
+
+    def skip_reason(self, agent: str, rating, tokens: int) -> str:
+        """
+        :returns: Why a turn is filtered out, None when it is kept.
+        """
+        if self.agents and agent.lower() not in {name.lower() for name in self.agents}:
+            return 'agent'
+        if self.min_rating is not None and (rating is None or rating < self.min_rating):
+            return 'rating'
+        if tokens < self.min_tokens or (self.max_tokens and tokens > self.max_tokens):
+            return 'length'
+        return None
+
+
+@dataclass
+class ArchiveExportStats:
+    files_checked: int = 0
+    files_read: int = 0
+    bytes_read: int = 0
+    turns: int = 0
+    exported: int = 0
+    skipped_agent: int = 0
+    skipped_rating: int = 0
+    skipped_length: int = 0
+    skipped_agent_chat: int = 0
+    waiting: int = 0
+    pending_rating: int = 0
+    shards: list = None
+    dedup: dict = None
+    wall_seconds: float = 0.0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def load_state(path: Path) -> dict:
+    """
+    The exporter's watermark: for each conversation file, the byte offset up to which its lines have been read, plus
+    the turns still waiting for a rating.
+    """
+    if not path.exists():
+        return {'files': {}, 'pending': {}, 'exported': 0}
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+def save_state(path: Path, state: dict) -> None:
+    temp_path = path.with_suffix('.json.tmp')
+    with open(temp_path, 'w') as file:
+        json.dump(state, file)
+    os.replace(temp_path, path)
+
+
+def read_new_records(path: Path, offset: int) -> tuple:
+    """
+    The conversation header and the complete lines after offset. A line still being written has no newline yet and is
+    left for the next run.
+
+    :returns: (header, [(start offset, end offset, record)])
+    """
+    with open(path, 'rb') as file:
+        header = json.loads(file.readline())
+        if offset < file.tell():
+            offset = file.tell()
+        file.seek(offset)
+        records = []
+        for line in file:
+            if not line.endswith(b"\n"):
+                break
+            start, offset = offset, offset + len(line)
+            if line.strip():
+                records.append((start, offset, json.loads(line)))
+    return header, records
+
+
+def read_records_at(path: Path, offsets: list) -> dict:
+    """
+    The records starting at the given byte offsets, e.g. turns that were waiting for a rating.
+
+    :returns: {offset: record}
+    """
+    records = {}
+    with open(path, 'rb') as file:
+        for offset in offsets:
+            file.seek(offset)
+            records[offset] = json.loads(file.readline())
+    return records
+
+
+class AgentPromptFormat:
+    """
+    The start/end tokens and system message of each agent, from its instructions.yaml through the config store.
+    """
+
+    def __init__(self) -> None:
+        self.formats = {}
+
+    def get(self, agent_name: str) -> dict:
+        if agent_name not in self.formats:
+            instructions = config_store.instructions(agent_name)
+            self.formats[agent_name] = {
+                'system_prompt': instructions.get('system_message') or "",
+                'assistant_name': instructions.get('name') or agent_name,
+                'start_token': instructions.get('start_token') or '<|im_start|>',
+                'end_token': instructions.get('end_token') or '<|im_end|>',
+            }
+        return self.formats[agent_name]
+
+
+def iter_archive_records(archive_root: str, state: dict, export_filter: ArchiveExportFilter, stats: ArchiveExportStats,
+                         settle_seconds: float = 0.0, rating_window_seconds: float = 7 * 86400, checkpoints: dict = None):
+    """
+    Stream training records for the turns archived since the watermark in state, moving the watermark as it goes.
+    Files that have not grown since the last run are skipped after a stat, so a run only reads new turns.
+
+    With a rating filter, an unrated or low rated turn is not dropped right away. Its offset is kept in state['pending']
+    and it is looked at again by each run that sees a new rating for it, until it is exported or is older than the
+    rating window. Ratings are appended after their turn, so they are always among a later run's new lines, and a run
+    reads only the new lines plus the pending turns that just got rated.
+
+    :param archive_root: The ConversationArchive root.
+    :param state: Watermark from load_state, updated in place.
+    :param settle_seconds: Leave turns younger than this for a later run.
+    :param rating_window_seconds: How long a turn below export_filter.min_rating waits for a (new) rating.
+    :param checkpoints: Filled with {request_id: (file name, watermark, pending)}, the file's state once that record
+        is consumed, so a caller can save a watermark that covers only the records it has written.
+    :returns: Generator of {'conversation_id', 'request_id', 'agent', 'rating', 'request', 'response', 'prompt'}.
+    """
+    formats = AgentPromptFormat()
+    now = datetime.now()
+    cutoff = (now - timedelta(seconds=settle_seconds)).isoformat(timespec='seconds') if settle_seconds else None
+    rating_expiry = (now - timedelta(seconds=rating_window_seconds)).isoformat(timespec='seconds')
+    watermarks = state.setdefault('files', {})
+    pending = state.setdefault('pending', {})
+
+    for path in sorted(Path(archive_root).glob('*.jsonl')):
+        stats.files_checked += 1
+        offset = watermarks.get(path.name, 0)
+        waiting = pending.get(path.name, [])
+        size = path.stat().st_size
+        if size <= offset and not waiting:
+            continue
+        header, records = read_new_records(path, offset) if size > offset else (None, [])
+        if records:
+            stats.files_read += 1
+            stats.bytes_read += size - offset
+        ratings = {record['turn_uuid']: record['rating'] for _, _, record in records if record.get('record') == 'rating'}
+        agent_chat = header and header.get('host_is_bot') and header.get('guest_is_bot')
+
+        # Pending turns from earlier runs: look at the ones that got rated again, drop the ones past the window
+        rated = [entry for entry in waiting if entry[1] in ratings]
+        still_waiting = [entry for entry in waiting if entry[1] not in ratings and entry[2] >= rating_expiry]
+        stats.skipped_rating += len(waiting) - len(rated) - len(still_waiting)
+        rated_records = read_records_at(path, [entry[0] for entry in rated]) if rated else {}
+
+        def update_state(unresolved: list) -> None:
+            watermarks[path.name] = offset
+            if still_waiting or unresolved:
+                pending[path.name] = still_waiting + unresolved
+            else:
+                pending.pop(path.name, None)
+
+        def training_record(start: int, record: dict):
+            if agent_chat and not export_filter.include_agent_chats:
+                stats.skipped_agent_chat += 1
+                return None
+            turn = record['turn']
+            request, response = turn['request']['content'], turn['response']['content']
+            agent = turn['response']['speaker']
+            rating = ratings.get(turn['uuid'])
+            reason = export_filter.skip_reason(agent, rating, token_estimator.estimate(request + response))
+            if reason == 'rating' and record.get('archived_at', '') >= rating_expiry:
+                still_waiting.append([start, turn['uuid'], record.get('archived_at', '')])
+                return None
+            if reason:
+                setattr(stats, f"skipped_{reason}", getattr(stats, f"skipped_{reason}") + 1)
+                return None
+            return {
+                "conversation_id": header.get('uuid'),
+                "request_id": turn['uuid'],
+                "agent": agent,
+                "rating": rating,
+                **format_training_prompt(request, response, **formats.get(agent)),
+            }
+
+        def consumed(record: dict, unresolved: list = ()) -> dict:
+            # The state is moved before the record is handed out, so it never claims more than has been consumed
+            update_state(list(unresolved))
+            if record is not None and checkpoints is not None:
+                checkpoints[record['request_id']] = (path.name, offset, list(pending.get(path.name, [])))
+            return record
+
+        for position, entry in enumerate(rated):
+            record = consumed(training_record(entry[0], rated_records[entry[0]]), rated[position + 1:])
+            if record is not None:
+                yield record
+
+        for start, end, record in records:
+            if record.get('record') != 'turn':
+                offset = end
+                continue
+            if cutoff and record.get('archived_at', '') > cutoff:
+                stats.waiting += 1
+                break
+            offset = end
+            stats.turns += 1
+            record = consumed(training_record(start, record))
+            if record is not None:
+                yield record
+        update_state([])
+        stats.pending_rating += len(still_waiting)
+
+
+def export_archive(archive_root: str, dest_dir: str, export_filter: ArchiveExportFilter = None, shard_size: int = 50000,
+                   settle_seconds: float = 0.0, deduplicator: Deduplicator = None, dry_run: bool = False,
+                   rating_window_seconds: float = 7 * 86400) -> ArchiveExportStats:
+    """
+    Append the conversation archive's new turns to dest_dir as archive-NNNNN.jsonl shards, numbered after any that
+    are already there. The watermark is kept in dest_dir/archive_export_state.json. It is saved each time a shard is
+    complete, covering the records in the shards written so far, and again at the end, so an interrupted run neither
+    loses turns nor exports them twice.
+
+    :param archive_root: The ConversationArchive root, e.g. library/conversations.
+    :param dest_dir: Output directory, e.g. the dataset directory training/token_cache.py reads.
+    :param export_filter: Which turns to keep.
+    :param shard_size: Records per shard.
+    :param settle_seconds: See iter_archive_records.
+    :param rating_window_seconds: See iter_archive_records.
+    :param deduplicator: Drop near-duplicate turns within this run (see training/dedup.py).
+    :param dry_run: Count what would be exported without writing shards or moving the watermark.
+    :returns: ArchiveExportStats
+    """
+    started = time.perf_counter()
+    stats = ArchiveExportStats()
+    state_path = Path(dest_dir) / STATE_FILE
+    state = load_state(state_path)
+    # What has been written to complete shards; the live state runs ahead of it while a shard is being filled
+    saved_state = json.loads(json.dumps(state))
+    saved_state.setdefault('files', {})
+    saved_state.setdefault('pending', {})
+    checkpoints = {}
+    written = {}
+    records = iter_archive_records(archive_root, state, export_filter or ArchiveExportFilter(), stats, settle_seconds,
+                                   rating_window_seconds, checkpoints)
+    report = None
+    if deduplicator is not None:
+        report = DedupReport(deduplicator.threshold, deduplicator.num_perm, deduplicator.bands)
+        records = deduplicator.filter(records, report)
+
+    if dry_run:
+        stats.exported = sum(1 for _ in records)
+        stats.shards = []
+    else:
+        def save_shard_state(shard_path: Path) -> None:
+            for name, (offset, waiting) in written.items():
+                saved_state['files'][name] = offset
+                if waiting:
+                    saved_state['pending'][name] = waiting
+                else:
+                    saved_state['pending'].pop(name, None)
+            written.clear()
+            saved_state['exported'] = state.get('exported', 0) + writer.records
+            saved_state['last_run'] = datetime.now().isoformat(timespec='seconds')
+            save_state(state_path, saved_state)
+
+        with ShardedJsonlWriter(dest_dir, prefix='archive', shard_size=shard_size,
+                                start_index=next_shard_index(dest_dir, 'archive'), on_shard=save_shard_state) as writer:
+            for record in records:
+                name, offset, waiting = checkpoints.pop(record['request_id'])
+                written[name] = (offset, waiting)
+                writer.write(record)
+        stats.shards = writer.paths
+        stats.exported = writer.records
+        state['exported'] = state.get('exported', 0) + writer.records
+        state['last_run'] = datetime.now().isoformat(timespec='seconds')
+        save_state(state_path, state)
+        if report is not None:
+            report.write(f"{dest_dir}/archive_dedup_report.json")
+
+    if report is not None:
+        stats.dedup = report.to_dict()
+    stats.wall_seconds = time.perf_counter() - started
+    return stats
+
+
+def main(argv: list = None) -> None:
+    """
+    Example:
+        python -m training.archive_export library/conversations training/juliet/datasets --agent juliet --min-rating 4
+    """
+    parser = argparse.ArgumentParser(description="Append newly archived chat turns to JSONL training shards.")
+    parser.add_argument('archive_root', nargs='?', default='library/conversations', help="The conversation archive")
+    parser.add_argument('dest_dir', nargs='?', default='training/juliet/datasets', help="Directory for the archive-NNNNN.jsonl shards")
+    parser.add_argument('--agent', action='append', default=None, help="Only this agent's turns (repeatable)")
+    parser.add_argument('--min-rating', type=int, default=None, help="Only turns rated at least this (see !rate in chat)")
+    parser.add_argument('--min-tokens', type=int, default=1, help="Shortest request plus response, estimated tokens")
+    parser.add_argument('--max-tokens', type=int, default=None, help="Longest request plus response, estimated tokens")
+    parser.add_argument('--include-agent-chats', action='store_true', help="Also export Agent>Agent conversations")
+    parser.add_argument('--settle-minutes', type=float, default=0.0, help="Leave turns younger than this for a later run")
+    parser.add_argument('--rating-window-days', type=float, default=7.0, help="How long unrated turns wait for a rating with --min-rating")
+    parser.add_argument('--shard-size', type=int, default=50000, help="Records per shard")
+    parser.add_argument('--dedup', action='store_true', help="Drop near-duplicate turns with MinHash/LSH")
+    parser.add_argument('--dry-run', action='store_true', help="Count without writing or moving the watermark")
+    args = parser.parse_args(argv)
+
+    export_filter = ArchiveExportFilter(agents=args.agent, min_rating=args.min_rating, min_tokens=args.min_tokens,
+                                        max_tokens=args.max_tokens, include_agent_chats=args.include_agent_chats)
+    deduplicator = None
+    if args.dedup:
+        deduplicator = Deduplicator(id_key=lambda record: record['request_id'])
+    stats = export_archive(args.archive_root, args.dest_dir, export_filter, shard_size=args.shard_size,
+                           settle_seconds=args.settle_minutes * 60, deduplicator=deduplicator, dry_run=args.dry_run,
+                           rating_window_seconds=args.rating_window_days * 86400)
+    print(f"Conversations checked: {stats.files_checked}, with new turns: {stats.files_read} ({stats.bytes_read} bytes read)")
+    print(f"New turns: {stats.turns}, exported: {stats.exported}")
+    print(f"Skipped - agent: {stats.skipped_agent}, rating: {stats.skipped_rating}, length: {stats.skipped_length}, "
+          f"agent chats: {stats.skipped_agent_chat}, waiting to settle: {stats.waiting}, waiting for a rating: {stats.pending_rating}")
+    if stats.dedup:
+        print(f"Duplicates removed: {stats.dedup['removed']} of {stats.dedup['seen']}")
+    print(f"Shards: {len(stats.shards)} in {args.dest_dir} ({stats.wall_seconds:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
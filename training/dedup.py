@@ -0,0 +1,311 @@
+import argparse
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+import hashlib
+import json
+import os
+from pathlib import Path
+import random
+import re
+import time
+from training.jsonl_shards import ShardedJsonlWriter, iter_jsonl_shards
+
+
+MAX_HASH = (1 << 32) - 1
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def normalize(text: str) -> list:
+    """
+    Lowercased words, so punctuation and spacing differences do not hide duplicates.
+    """
+    return WORD_PATTERN.findall((text or "").lower())
+
+
+def training_text(record: dict) -> str:
+    """
+    The part of a training record to compare: the user and assistant turns of its prompt, without the system turn every
+    record shares (the shared text would make short, unrelated pairs look alike). Prompts not in the chat format are
+    compared whole.
+    """
+    prompt = record.get('prompt') or ""
+    _, found, turns = prompt.partition("User: \n")
+    return turns if found else prompt
+
+
+def stable_hash(text: str) -> int:
+    """
+    A 32 bit hash that is the same in every process (Python's hash() is salted per process).
+    """
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=4).digest(), 'little')
+
+
+class MinHasher:
+    """
+    MinHash signatures over word shingles. Two texts' signatures agree in about as many positions as the Jaccard
+    similarity of their shingle sets.
+    """
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 5, seed: int = 1) -> None:
+        """
+        :param num_perm: Signature length. More is more accurate and slower.
+        :param shingle_size: Words per shingle.
+        :param seed: Seed for the permutations. Signatures are only comparable with the same seed and num_perm.
+        """
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        generator = random.Random(seed)
+        # (a * x + b) mod 2^32 with an odd a permutes the 32 bit hash space, and is about twice as fast in Python as
+        # the textbook mod-prime form
+        self.permutations = [(generator.getrandbits(32) | 1, generator.getrandbits(32)) for _ in range(num_perm)]
+
+    def shingles(self, text: str) -> set:
+        words = normalize(text)
+        if len(words) <= self.shingle_size:
+            return {" ".join(words)}
+        return {" ".join(words[start:start + self.shingle_size]) for start in range(len(words) - self.shingle_size + 1)}
+
+    def signature(self, text: str) -> array:
+        hashes = [stable_hash(shingle) for shingle in self.shingles(text)]
+        return array('I', [min([(a * value + b) & MAX_HASH for value in hashes]) for a, b in self.permutations])
+
+
+def estimated_similarity(first: array, second: array) -> float:
+    return sum(1 for x, y in zip(first, second) if x == y) / len(first)
+
+
+def choose_bands(num_perm: int, threshold: float) -> int:
+    """
+    The LSH band count whose candidate threshold (1/b)^(1/r) sits a little below the similarity threshold, so near
+    duplicates are almost always candidates and the exact check weeds out the rest.
+    """
+    target = threshold * 0.85
+    divisors = [bands for bands in range(1, num_perm + 1) if num_perm % bands == 0]
+    return min(divisors, key=lambda bands: abs((1 / bands) ** (bands / num_perm) - target))
+
+
+class LSHIndex:
+    """
+    Banded locality sensitive hashing over MinHash signatures: a text is a candidate duplicate of any kept text that
+    shares a whole band with it.
+    """
+
+    def __init__(self, num_perm: int, bands: int) -> None:
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.buckets = [{} for _ in range(bands)]
+        self.signatures = {}
+
+    def band_keys(self, signature: array) -> list:
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def query(self, signature: array, threshold: float) -> tuple:
+        """
+        :returns: (id of the most similar kept text at or above threshold, similarity), or (None, 0.0).
+        """
+        best, best_similarity = None, 0.0
+        checked = set()
+        for band, key in enumerate(self.band_keys(signature)):
+            for candidate in self.buckets[band].get(key, ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                similarity = estimated_similarity(signature, self.signatures[candidate])
+                if similarity >= threshold and similarity > best_similarity:
+                    best, best_similarity = candidate, similarity
+        return best, best_similarity
+
+    def insert(self, key, signature: array) -> None:
+        self.signatures[key] = signature
+        for band, band_key in enumerate(self.band_keys(signature)):
+            self.buckets[band].setdefault(band_key, []).append(key)
+
+
+@dataclass
+class DedupReport:
+    threshold: float
+    num_perm: int
+    bands: int
+    seen: int = 0
+    kept: int = 0
+    exact_duplicates: int = 0
+    near_duplicates: int = 0
+    examples: list = field(default_factory=list)
+    wall_seconds: float = 0.0
+
+    @property
+    def removed(self) -> int:
+        return self.exact_duplicates + self.near_duplicates
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), 'removed': self.removed}
+
+    def write(self, path: str) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+    def print_summary(self) -> None:
+        indent = ' ' * 4
+        share = self.removed / self.seen if self.seen else 0.0
+        print(f"{indent}Dedup: {self.seen} seen, {self.kept} kept, {self.removed} removed ({share:.1%})")
+        print(f"{indent}  exact: {self.exact_duplicates}  near (>= {self.threshold:.2f}): {self.near_duplicates}")
+
+
+# Per process MinHasher for the hashing pool
+worker_hasher = None
+
+
+def init_worker(num_perm: int, shingle_size: int, seed: int) -> None:
+    global worker_hasher
+    worker_hasher = MinHasher(num_perm, shingle_size, seed)
+
+
+def worker_signature(text: str) -> bytes:
+    return worker_hasher.signature(text).tobytes()
+
+
+class Deduplicator:
+    """
+    Streaming near-duplicate filter. Records are read in batches, their texts are MinHashed on a process pool, and each
+    record is kept unless an earlier kept record is an exact duplicate or estimated at least `threshold` similar. Only
+    signatures of kept records are held in memory; the records themselves stream through.
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, shingle_size: int = 5, bands: int = None,
+                 workers: int = None, batch_size: int = 2048, text_key=None, id_key=None, max_examples: int = 20) -> None:
+        """
+        :param threshold: Estimated Jaccard similarity at which a record counts as a duplicate.
+        :param num_perm: MinHash signature length.
+        :param shingle_size: Words per shingle.
+        :param bands: LSH bands, chosen from the threshold when unset.
+        :param workers: Hashing processes, defaults to the CPU count. 0 or 1 hashes in process.
+        :param batch_size: Records hashed per batch.
+        :param text_key: Callable(record) -> text to compare, defaults to training_text.
+        :param id_key: Callable(record) -> id for the report, defaults to the record's position.
+        :param max_examples: Duplicate pairs kept in the report as examples.
+        """
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands = bands or choose_bands(num_perm, threshold)
+        self.workers = os.cpu_count() if workers is None else workers
+        self.batch_size = batch_size
+        self.text_key = text_key or training_text
+        self.id_key = id_key
+        self.max_examples = max_examples
+
+    def signatures(self, texts: list, executor) -> list:
+        if executor is None:
+            return [worker_signature(text) for text in texts]
+        chunksize = max(1, len(texts) // (self.workers * 4))
+        return list(executor.map(worker_signature, texts, chunksize=chunksize))
+
+    def filter(self, records, report: DedupReport = None):
+        """
+        :param records: Iterable of records.
+        :param report: Report to fill in, e.g. to read it after the generator is exhausted.
+        :returns: Generator of the records that are kept, in their original order.
+        """
+        report = report if report is not None else DedupReport(self.threshold, self.num_perm, self.bands)
+        started = time.perf_counter()
+        index = LSHIndex(self.num_perm, self.bands)
+        exact = {}
+        executor = None
+        if self.workers and self.workers > 1:
+            executor = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                           initargs=(self.num_perm, self.shingle_size, 1))
+        else:
+            init_worker(self.num_perm, self.shingle_size, 1)
+
+        def process(batch: list):
+            texts = [self.text_key(record) for record in batch]
+            for record, text, signature_bytes in zip(batch, texts, self.signatures(texts, executor)):
+                record_id = self.id_key(record) if self.id_key else report.seen
+                report.seen += 1
+                digest = hashlib.blake2b(" ".join(normalize(text)).encode('utf-8'), digest_size=16).digest()
+                if digest in exact:
+                    report.exact_duplicates += 1
+                    self.add_example(report, record_id, exact[digest], 1.0)
+                    continue
+                signature = array('I')
+                signature.frombytes(signature_bytes)
+                match, similarity = index.query(signature, self.threshold)
+                if match is not None:
+                    report.near_duplicates += 1
+                    self.add_example(report, record_id, match, similarity)
+                    continue
+                exact[digest] = record_id
+                index.insert(record_id, signature)
+                report.kept += 1
+                yield record
+
+        try:
+            batch = []
+            for record in records:
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    yield from process(batch)
+                    batch = []
+            if batch:
+                yield from process(batch)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            report.wall_seconds = time.perf_counter() - started
+
+    def add_example(self, report: DedupReport, dropped, kept, similarity: float) -> None:
+        if len(report.examples) < self.max_examples:
+            report.examples.append({'dropped': dropped, 'duplicate_of': kept, 'similarity': round(similarity, 3)})
+
+
+def dedup_shards(paths: list, dest_dir: str, prefix: str = 'turns', shard_size: int = 50000, report_path: str = None,
+                 **dedup_options) -> DedupReport:
+    """
+    Deduplicate JSONL shards into a new set of shards.
+
+    :param paths: Input JSONL files, read in order.
+    :param dest_dir: Output directory for <prefix>-NNNNN.jsonl.
+    :param report_path: Where to write the JSON report, defaults to dest_dir/dedup_report.json.
+    :param dedup_options: Passed to Deduplicator.
+    :returns: DedupReport
+    """
+    deduplicator = Deduplicator(**dedup_options)
+    report = DedupReport(deduplicator.threshold, deduplicator.num_perm, deduplicator.bands)
+    with ShardedJsonlWriter(dest_dir, prefix=prefix, shard_size=shard_size) as writer:
+        for record in deduplicator.filter(iter_jsonl_shards(paths), report):
+            writer.write(record)
+    report.write(report_path or os.path.join(dest_dir, 'dedup_report.json'))
+    return report
+
+
+def main(argv: list = None) -> None:
+    """
+    Example:
+        python -m training.dedup training/juliet/datasets/raw training/juliet/datasets/dedup --threshold 0.8
+    """
+    parser = argparse.ArgumentParser(description="Remove near-duplicate records from JSONL training shards with MinHash/LSH.")
+    parser.add_argument('source', help="A JSONL file or a directory of *.jsonl shards")
+    parser.add_argument('dest_dir', help="Directory for the deduplicated shards")
+    parser.add_argument('--text-field', default=None, help="Record field to compare (defaults to the prompt without its system turn)")
+    parser.add_argument('--threshold', type=float, default=0.8, help="Estimated Jaccard similarity that counts as a duplicate")
+    parser.add_argument('--num-perm', type=int, default=64, help="MinHash signature length")
+    parser.add_argument('--shingle-size', type=int, default=5, help="Words per shingle")
+    parser.add_argument('--workers', type=int, default=None, help="Hashing processes (defaults to the CPU count)")
+    parser.add_argument('--shard-size', type=int, default=50000, help="Records per output shard")
+    parser.add_argument('--report', default=None, help="Report path (defaults to <dest_dir>/dedup_report.json)")
+    args = parser.parse_args(argv)
+
+    source = Path(args.source)
+    paths = sorted(str(path) for path in source.glob('*.jsonl')) if source.is_dir() else [str(source)]
+    report = dedup_shards(
+        paths, args.dest_dir, shard_size=args.shard_size, report_path=args.report,
+        threshold=args.threshold, num_perm=args.num_perm, shingle_size=args.shingle_size, workers=args.workers,
+        text_key=(lambda record: record.get(args.text_field) or "") if args.text_field else training_text,
+    )
+    report.print_summary()
+
+
+if __name__ == '__main__':
+    main()
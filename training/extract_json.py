@@ -1,73 +1,226 @@
+import argparse
+from dataclasses import asdict, dataclass
 import json
-from sys import argv
-
-
-file_path = argv[1]
-dest_dir = argv[2]
-
-
-# Load the JSON data from the file
-with open(file_path, 'r') as file:
-    dataset = json.load(file)
-
-requests = []
-responses = []
-turns = []
-train_prompts = []
-turn_count = 0
-keys_skipped_count = 0
-data = dataset
-
-# Pretty print the JSON data
-print(json.dumps(data, indent=4))
-
-print(f"Number of Conversations in dataset: {len(data)}")
-
-try:
-    for conversation in data:
-        for key, value in conversation['mapping'].items():
-            if 'message' in value and value['message'] and 'content' in value['message'] and 'parts' in value['message']['content']:
-                message_id = value['id']
-                message_content = value['message']['content']['parts'][0] if 'content' in value['message'] else "NO CONTENT"
-                message_role = value['message']['author']['role'] if 'author' in value['message'] else "NO ROLE"
-                message_parent = value['parent']
-
-                requests.append({"id": message_id, "role": message_role, "request": message_content}) if message_role == 'user' else None
-                responses.append({"id": message_parent, "role": message_role, "response": message_content}) if message_role == 'assistant' else None
-                turn_count += 1
-
-            else:
-                print(f"key: {key} skipped")
-                keys_skipped_count += 1
-            
-    for request in requests:
-        request['response'] = next((response['response'] for response in responses if response['id'] == request['id']), None)
-        prompt_request = f"""<|im_start|>System: \nYour name is Juliet, an acronym for Junctive Unsupervised Learning for Incrementally Evolving Transformers. You are a helpful AI super-assistant and empathetic human companion. The User has made a request to you, Juliet. Please respond with accurate and meaningful information or a solution for the User.<|im_end|>\n<|im_start|>User: \n{request['request']}<|im_end|>\n"""
-
-        prompt_response = f"""<|im_start|>Juliet: \n{request['response']}<|im_end|>\n"""
-
-        prompt = f"{prompt_request}{prompt_response}"
-
-        prompt_dict = {"request": prompt_request, "response": prompt_response, "prompt": prompt}
-
-        turns.append(prompt_dict)
-        train_prompts.append(prompt)
-
-except json.JSONDecodeError as e:
-    print(f"Error decoding JSON: {e}")
-except FileNotFoundError:
-    print(f"File not found: {file_path}")
-
-#Export to json file
-with open(f"{dest_dir}/conversation_turns.json", 'w') as outfile:
-    json.dump(turns, outfile, indent=4)
-print("-------------\nConversation Turns JSON file exported successfully.\n-------------\n")
-
-#Export to json file
-with open(f"{dest_dir}/training_prompts.json", 'w') as outfile:
-    json.dump(train_prompts, outfile, indent=4)
-print("-------------\nTraining Prompts JSON file exported successfully.\n-------------\n")
-
-print(f"Number of keys skipped: {keys_skipped_count}")
-print(f"Number of Request/Response pairs saved to the dataset: {turn_count}")
-
+import time
+from training.jsonl_shards import ShardedJsonlWriter
+from training.dedup import DedupReport, Deduplicator, training_text
+
+
+JULIET_SYSTEM_PROMPT = "Your name is Juliet, an acronym for Junctive Unsupervised Learning for Incrementally Evolving Transformers. You are a helpful AI super-assistant and empathetic human companion. The User has made a request to you, Juliet. Please respond with accurate and meaningful information or a solution for the User."
+
+
+@dataclass
+class ExtractStats:
+    conversations: int = 0
+    messages: int = 0
+    pairs: int = 0
+    unpaired_requests: int = 0
+    skipped_nodes: int = 0
+    shards: list = None
+    dedup: dict = None
+    wall_seconds: float = 0.0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def iter_json_array(file, read_size: int = 1 << 20):
+    """
+    Parse a file holding one top level JSON array and yield its elements one at a time, so only the element being
+    decoded and a read buffer are in memory. Elements are decoded with json.JSONDecoder.raw_decode straight from the
+    buffer; when an element is cut off by the end of the buffer, reads grow until it fits.
+
+    :param file: An open text file.
+    :param read_size: Characters per read.
+    """
+    decoder = json.JSONDecoder()
+    buffer = file.read(read_size)
+    position = 0
+    eof = not buffer
+
+    def skip(chars: str) -> None:
+        nonlocal position
+        while position < len(buffer) and buffer[position] in chars:
+            position += 1
+
+    skip(" \t\r\n")
+    if buffer[position:position + 1] != '[':
+        raise ValueError("Expected a JSON array at the top level")
+    position += 1
+
+    next_read = read_size
+    while True:
+        skip(" \t\r\n,")
+        if position < len(buffer) and buffer[position] == ']':
+            return
+        if position < len(buffer):
+            try:
+                element, end = decoder.raw_decode(buffer, position)
+                yield element
+                position = end
+                next_read = read_size
+                continue
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+        elif eof:
+            raise ValueError("Unexpected end of file inside the top level array")
+
+        # Drop what has been consumed and read more; large elements double the read size so retries stay few
+        buffer = buffer[position:]
+        position = 0
+        data = file.read(next_read)
+        next_read *= 2
+        if data:
+            buffer += data
+        else:
+            eof = True
+
+
+def message_text(message: dict) -> str:
+    """
+    The text of an export message; non-text parts (images, attachments) are left out.
+    """
+    parts = (message.get('content') or {}).get('parts') or []
+    return "\n".join(part for part in parts if isinstance(part, str))
+
+
+def extract_pairs(conversation: dict, stats: ExtractStats = None) -> list:
+    """
+    Pair each user message with the assistant reply to it in one pass over the conversation's mapping. Assistant
+    messages are indexed by parent id, so pairing is a dict lookup per request.
+
+    :param conversation: One conversation from the export.
+    :param stats: Counters to update.
+    :returns: List of (request id, request text, response text).
+    """
+    stats = stats or ExtractStats()
+    requests = []
+    responses_by_parent = {}
+    for key, node in (conversation.get('mapping') or {}).items():
+        message = node.get('message')
+        if not message or 'parts' not in (message.get('content') or {}):
+            stats.skipped_nodes += 1
+            continue
+        stats.messages += 1
+        role = (message.get('author') or {}).get('role')
+        if role == 'user':
+            requests.append((node.get('id', key), message_text(message)))
+        elif role == 'assistant':
+            # Keep the first reply, regenerated answers come later in the mapping
+            responses_by_parent.setdefault(node.get('parent'), message_text(message))
+
+    pairs = []
+    for request_id, request in requests:
+        response = responses_by_parent.get(request_id)
+        if response is None:
+            stats.unpaired_requests += 1
+            continue
+        pairs.append((request_id, request, response))
+    return pairs
+
+
+def format_training_prompt(request: str, response: str, system_prompt: str = JULIET_SYSTEM_PROMPT, assistant_name: str = 'Juliet',
+                           start_token: str = '<|im_start|>', end_token: str = '<|im_end|>') -> dict:
+    """
+    :param start_token: Turn start token, an agent's ModelInstructions.start_token.
+    :param end_token: Turn end token, an agent's ModelInstructions.end_token.
+    :returns: {'request', 'response', 'prompt'} in the <|im_start|> chat format.
+    """
+    prompt_request = f"{start_token}System: \n{system_prompt}{end_token}\n{start_token}User: \n{request}{end_token}\n"
+    prompt_response = f"{start_token}{assistant_name}: \n{response}{end_token}\n"
+    return {"request": prompt_request, "response": prompt_response, "prompt": f"{prompt_request}{prompt_response}"}
+
+
+def iter_training_records(file_path: str, stats: ExtractStats = None, system_prompt: str = JULIET_SYSTEM_PROMPT, assistant_name: str = 'Juliet'):
+    """
+    Stream training records from a ChatGPT conversations.json export.
+
+    :param file_path: The export file.
+    :param stats: Counters to update.
+    :returns: Generator of {'conversation_id', 'request_id', 'request', 'response', 'prompt'}.
+    """
+    stats = stats if stats is not None else ExtractStats()
+    with open(file_path, 'r', encoding='utf-8') as file:
+        for conversation in iter_json_array(file):
+            stats.conversations += 1
+            conversation_id = conversation.get('id') or conversation.get('conversation_id')
+            for request_id, request, response in extract_pairs(conversation, stats):
+                stats.pairs += 1
+                yield {
+                    "conversation_id": conversation_id,
+                    "request_id": request_id,
+                    **format_training_prompt(request, response, system_prompt, assistant_name),
+                }
+
+
+def extract_export(file_path: str, dest_dir: str, shard_size: int = 50000, system_prompt: str = JULIET_SYSTEM_PROMPT,
+                   assistant_name: str = 'Juliet', progress_every: int = 1000, deduplicator: Deduplicator = None) -> ExtractStats:
+    """
+    Convert a conversation export into sharded JSONL training records (dest_dir/turns-NNNNN.jsonl), writing as it
+    reads.
+
+    :param file_path: The export file.
+    :param dest_dir: Output directory.
+    :param shard_size: Records per shard.
+    :param progress_every: Print progress every this many pairs, 0 for none.
+    :param deduplicator: Drop near-duplicate pairs on the way out (see training/dedup.py). The report is written to
+        dest_dir/dedup_report.json.
+    :returns: ExtractStats
+    """
+    started = time.perf_counter()
+    stats = ExtractStats()
+    records = iter_training_records(file_path, stats, system_prompt, assistant_name)
+    report = None
+    if deduplicator is not None:
+        report = DedupReport(deduplicator.threshold, deduplicator.num_perm, deduplicator.bands)
+        records = deduplicator.filter(records, report)
+    with ShardedJsonlWriter(dest_dir, prefix='turns', shard_size=shard_size) as writer:
+        for record in records:
+            writer.write(record)
+            if progress_every and writer.records % progress_every == 0:
+                print(f"{stats.conversations} conversations, {writer.records} pairs written")
+    stats.shards = writer.paths
+    if report is not None:
+        report.write(f"{dest_dir}/dedup_report.json")
+        stats.dedup = report.to_dict()
+    stats.wall_seconds = time.perf_counter() - started
+    return stats
+
+
+def main(argv: list = None) -> None:
+    """
+    Example:
+        python -m training.extract_json exports/conversations.json training/juliet/datasets --shard-size 20000
+    """
+    parser = argparse.ArgumentParser(description="Extract request/response training pairs from a ChatGPT conversation export.")
+    parser.add_argument('file_path', help="The export's conversations.json")
+    parser.add_argument('dest_dir', help="Directory for the turns-NNNNN.jsonl shards")
+    parser.add_argument('--shard-size', type=int, default=50000, help="Records per shard")
+    parser.add_argument('--assistant-name', default='Juliet', help="Speaker name for the assistant turns")
+    parser.add_argument('--system-prompt-file', default=None, help="File with the system prompt (defaults to Juliet's)")
+    parser.add_argument('--dedup', action='store_true', help="Drop near-duplicate pairs with MinHash/LSH")
+    parser.add_argument('--dedup-threshold', type=float, default=0.8, help="Estimated Jaccard similarity that counts as a duplicate")
+    parser.add_argument('--dedup-workers', type=int, default=None, help="Hashing processes (defaults to the CPU count)")
+    args = parser.parse_args(argv)
+
+    system_prompt = JULIET_SYSTEM_PROMPT
+    if args.system_prompt_file:
+        with open(args.system_prompt_file, 'r') as file:
+            system_prompt = file.read().strip()
+
+    stats = extract_export(args.file_path, args.dest_dir, shard_size=args.shard_size, system_prompt=system_prompt,
+                           assistant_name=args.assistant_name, progress_every=0,
+                           deduplicator=Deduplicator(threshold=args.dedup_threshold, workers=args.dedup_workers, text_key=training_text,
+                                                     id_key=lambda record: record['request_id']) if args.dedup else None)
+    print("-------------\nConversation turns exported successfully.\n-------------\n")
+    print(f"Conversations: {stats.conversations}")
+    print(f"Messages: {stats.messages}, nodes skipped: {stats.skipped_nodes}")
+    print(f"Request/Response pairs saved to the dataset: {stats.pairs} ({stats.unpaired_requests} requests without a reply)")
+    if stats.dedup:
+        print(f"Duplicates removed: {stats.dedup['removed']} of {stats.dedup['seen']} (report: {args.dest_dir}/dedup_report.json)")
+    print(f"Shards: {len(stats.shards)} in {args.dest_dir} ({stats.wall_seconds:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+import json
+import os
+from pathlib import Path
+
+
+class ShardedJsonlWriter:
+    """
+    Writes records as JSONL, starting a new numbered shard every shard_size records: <prefix>-00000.jsonl,
+    <prefix>-00001.jsonl, ... Each shard is written to a .tmp file and renamed when full, so a shard that exists is
+    complete even if the run is interrupted. When the with block raises, the unfinished shard is deleted instead.
+    """
+
+    def __init__(self, dest_dir: str, prefix: str = 'turns', shard_size: int = 50000, start_index: int = 0,
+                 on_shard=None) -> None:
+        """
+        :param dest_dir: Directory for the shards, created if missing.
+        :param prefix: Shard file name prefix.
+        :param shard_size: Records per shard.
+        :param start_index: Number of the first shard, e.g. to append to an existing export.
+        :param on_shard: Called with each shard's path once it is complete, e.g. to save a checkpoint.
+        """
+        self.dest_dir = Path(dest_dir)
+        self.dest_dir.mkdir(parents=True, exist_ok=True)
+        self.prefix = prefix
+        self.shard_size = shard_size
+        self.shard_index = start_index
+        self.shard_records = 0
+        self.records = 0
+        self.file = None
+        self.paths = []
+        self.on_shard = on_shard
+
+    def shard_path(self, index: int) -> Path:
+        return self.dest_dir / f"{self.prefix}-{index:05d}.jsonl"
+
+    def write(self, record: dict) -> None:
+        if self.file is None:
+            self.file = open(self.shard_path(self.shard_index).with_suffix('.jsonl.tmp'), 'w', encoding='utf-8')
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.shard_records += 1
+        self.records += 1
+        if self.shard_records >= self.shard_size:
+            self.finish_shard()
+
+    def finish_shard(self) -> None:
+        if self.file is None:
+            return
+        self.file.close()
+        path = self.shard_path(self.shard_index)
+        os.replace(path.with_suffix('.jsonl.tmp'), path)
+        self.paths.append(str(path))
+        self.file = None
+        self.shard_index += 1
+        self.shard_records = 0
+        if self.on_shard is not None:
+            self.on_shard(path)
+
+    def close(self) -> list:
+        """
+        Finish the last shard.
+
+        :returns: Paths of the shards written.
+        """
+        self.finish_shard()
+        return self.paths
+
+    def discard(self) -> None:
+        """
+        Delete the shard being written, keeping the complete ones.
+        """
+        if self.file is None:
+            return
+        self.file.close()
+        self.shard_path(self.shard_index).with_suffix('.jsonl.tmp').unlink(missing_ok=True)
+        self.file = None
+        self.shard_records = 0
+
+    def __enter__(self) -> 'ShardedJsonlWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+def next_shard_index(dest_dir: str, prefix: str) -> int:
+    """
+    The shard number after the highest existing <prefix>-NNNNN.jsonl in dest_dir, 0 when there are none.
+    """
+    indexes = []
+    for path in Path(dest_dir).glob(f"{prefix}-*.jsonl"):
+        suffix = path.stem[len(prefix) + 1:]
+        if suffix.isdigit():
+            indexes.append(int(suffix))
+    return max(indexes) + 1 if indexes else 0
+
+
+def iter_jsonl_shards(paths):
+    """
+    Yield the records of several JSONL files in order.
+    """
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as file:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
@@ -0,0 +1,340 @@
+import argparse
+from array import array
+from dataclasses import asdict, dataclass
+import hashlib
+import json
+import mmap
+import os
+from pathlib import Path
+import shutil
+import time
+
+
+CACHE_ROOT = 'library/cache/tokens'
+CACHE_VERSION = 1
+TOKEN_TYPECODE = 'I'
+OFFSET_TYPECODE = 'q'
+
+
+def iter_texts(paths: list, text_field: str = 'prompt'):
+    """
+    Training texts from JSONL shards (one record per line, as written by extract_json) or from the older JSON files
+    holding a list of prompts or of records.
+    """
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as file:
+            if str(path).endswith('.jsonl'):
+                for line in file:
+                    if line.strip():
+                        yield json.loads(line)[text_field]
+            else:
+                for item in json.load(file):
+                    yield item if isinstance(item, str) else item[text_field]
+
+
+def resolve_paths(source: str) -> list:
+    """
+    A dataset file, or the *.jsonl shards in a directory (its *.json files when it has no shards).
+    """
+    source = Path(source)
+    if source.is_dir():
+        paths = sorted(source.glob('*.jsonl')) or sorted(source.glob('*.json'))
+        return [str(path) for path in paths]
+    return [str(source)]
+
+
+def dataset_fingerprint(paths: list) -> str:
+    """
+    Hash of the dataset's contents, so an edited or re-exported dataset gets a new cache.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for path in paths:
+        digest.update(os.path.basename(path).encode('utf-8'))
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def tokenizer_fingerprint(tokenizer) -> str:
+    """
+    Hash of the tokenizer's name, vocabulary and special tokens.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(getattr(tokenizer, 'name_or_path', '')).encode('utf-8'))
+    digest.update(json.dumps(sorted(tokenizer.get_vocab().items()), ensure_ascii=False).encode('utf-8'))
+    digest.update(json.dumps([tokenizer.bos_token_id, tokenizer.eos_token_id]).encode('utf-8'))
+    return digest.hexdigest()
+
+
+@dataclass
+class PackingStats:
+    documents: int = 0
+    truncated_documents: int = 0
+    tokens: int = 0
+    sequences: int = 0
+    # Padding a per-document batch of one would need, i.e. what training without packing pays
+    unpacked_padding: int = 0
+    packed_padding: int = 0
+    tokenize_seconds: float = 0.0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class SequencePacker:
+    """
+    Packs tokenized documents into sequences of at most max_seq_length tokens without splitting a document (documents
+    longer than that are truncated). Best fit over a window of open sequences: each document goes into the open
+    sequence with the least room that still fits it, and when the window is full the fullest sequence is closed.
+    """
+
+    def __init__(self, max_seq_length: int, window: int = 64) -> None:
+        self.max_seq_length = max_seq_length
+        self.window = window
+        self.open = []
+
+    def add(self, ids: list):
+        """
+        :returns: Generator of closed sequences, each a list of documents (token id lists).
+        """
+        best = None
+        for position, sequence in enumerate(self.open):
+            room = self.max_seq_length - sequence[0]
+            if len(ids) <= room and (best is None or room < self.max_seq_length - self.open[best][0]):
+                best = position
+        if best is None:
+            self.open.append([len(ids), [ids]])
+        else:
+            self.open[best][0] += len(ids)
+            self.open[best][1].append(ids)
+        while len(self.open) > self.window:
+            fullest = max(range(len(self.open)), key=lambda position: self.open[position][0])
+            yield self.open.pop(fullest)[1]
+
+    def flush(self):
+        for _, documents in sorted(self.open, key=lambda sequence: -sequence[0]):
+            yield documents
+        self.open = []
+
+
+# Per process tokenizer for the tokenizing pool
+worker_tokenizer = None
+
+
+def init_tokenizer(tokenizer_name: str) -> None:
+    global worker_tokenizer
+    os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+    from transformers import AutoTokenizer
+    worker_tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+
+
+def tokenize_batch(texts: list, tokenizer=None) -> list:
+    tokenizer = tokenizer or worker_tokenizer
+    eos = [tokenizer.eos_token_id] if tokenizer.eos_token_id is not None else []
+    return [ids + eos for ids in tokenizer(texts, add_special_tokens=True)['input_ids']]
+
+
+def iter_batches(items, size: int):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class PackedTokenDataset:
+    """
+    A packed token cache opened with mmap: only the pages a batch touches are read, and the cache is shared between
+    dataloader workers through the page cache. Items are {'input_ids', 'attention_mask', 'labels'} lists, batched by
+    PackedSequenceCollator.
+    """
+
+    def __init__(self, cache_dir: str, indices: list = None) -> None:
+        """
+        :param cache_dir: A directory written by build_token_cache.
+        :param indices: Optional subset of sequence numbers, e.g. a train/test split.
+        """
+        self.cache_dir = Path(cache_dir)
+        with open(self.cache_dir / 'meta.json', 'r') as file:
+            self.meta = json.load(file)
+        self.tokens = self.open_array(self.cache_dir / 'tokens.bin', TOKEN_TYPECODE)
+        self.offsets = self.open_array(self.cache_dir / 'sequences.bin', OFFSET_TYPECODE)
+        self.indices = indices
+
+    @staticmethod
+    def open_array(path: Path, typecode: str) -> memoryview:
+        if path.stat().st_size == 0:
+            return memoryview(array(typecode))
+        with open(path, 'rb') as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(mapped).cast(typecode)
+
+    def __len__(self) -> int:
+        return len(self.indices) if self.indices is not None else len(self.offsets) - 1
+
+    def __getitem__(self, item: int) -> dict:
+        sequence = self.indices[item] if self.indices is not None else item
+        ids = self.tokens[self.offsets[sequence]:self.offsets[sequence + 1]].tolist()
+        return {'input_ids': ids, 'attention_mask': [1] * len(ids), 'labels': list(ids)}
+
+    def split(self, test_size: float = 0.2, seed: int = 42) -> tuple:
+        """
+        :returns: (train, test) datasets over a shuffled split of the sequences.
+        """
+        import random
+        order = list(range(len(self)))
+        random.Random(seed).shuffle(order)
+        cut = int(len(order) * (1 - test_size))
+        return PackedTokenDataset(self.cache_dir, order[:cut]), PackedTokenDataset(self.cache_dir, order[cut:])
+
+
+class PackedSequenceCollator:
+    """
+    Pads a batch of PackedTokenDataset items to its longest sequence. Only the padding added here is left out of the
+    loss. DataCollatorForLanguageModeling masks every pad id instead, which with pad_token = eos_token also masks the
+    EOS tokens ending each packed document, so the model would never learn to stop.
+    """
+
+    def __init__(self, pad_token_id: int, label_pad_id: int = -100, pad_to_multiple_of: int = None) -> None:
+        """
+        :param pad_token_id: Id used to pad input_ids.
+        :param label_pad_id: Label of padded positions, ignored by the loss.
+        :param pad_to_multiple_of: Round the padded length up to a multiple of this, e.g. 8 for tensor cores.
+        """
+        self.pad_token_id = pad_token_id
+        self.label_pad_id = label_pad_id
+        self.pad_to_multiple_of = pad_to_multiple_of
+
+    def __call__(self, items: list) -> dict:
+        import torch
+        length = max(len(item['input_ids']) for item in items)
+        if self.pad_to_multiple_of:
+            length = -(-length // self.pad_to_multiple_of) * self.pad_to_multiple_of
+        batch = {'input_ids': [], 'attention_mask': [], 'labels': []}
+        for item in items:
+            padding = length - len(item['input_ids'])
+            batch['input_ids'].append(item['input_ids'] + [self.pad_token_id] * padding)
+            batch['attention_mask'].append(item['attention_mask'] + [0] * padding)
+            batch['labels'].append(item['labels'] + [self.label_pad_id] * padding)
+        return {key: torch.tensor(values, dtype=torch.long) for key, values in batch.items()}
+
+
+def build_token_cache(source: str, tokenizer, max_seq_length: int = 1024, text_field: str = 'prompt', workers: int = None,
+                      batch_size: int = 256, cache_root: str = CACHE_ROOT, rebuild: bool = False) -> PackedTokenDataset:
+    """
+    Tokenize and pack a dataset once and return the memory-mapped result. The cache is keyed by the tokenizer, the
+    dataset contents and max_seq_length, so later runs with the same inputs open it without tokenizing.
+
+    :param source: A dataset file (.jsonl or .json) or a directory of .jsonl shards.
+    :param tokenizer: A transformers tokenizer. Pool workers load their own copy by its name_or_path.
+    :param max_seq_length: Tokens per packed sequence.
+    :param text_field: Record field holding the training text.
+    :param workers: Tokenizing processes, defaults to the CPU count. 0 or 1 tokenizes in process.
+    :param batch_size: Texts per tokenizer call.
+    :param cache_root: Where caches are kept.
+    :param rebuild: Ignore an existing cache.
+    :returns: PackedTokenDataset
+    """
+    paths = resolve_paths(source)
+    key = hashlib.blake2b(
+        f"{CACHE_VERSION}:{tokenizer_fingerprint(tokenizer)}:{dataset_fingerprint(paths)}:{max_seq_length}".encode('utf-8'),
+        digest_size=12,
+    ).hexdigest()
+    cache_dir = Path(cache_root) / key
+    if (cache_dir / 'meta.json').exists() and not rebuild:
+        print(f"Token cache hit: {cache_dir}")
+        return PackedTokenDataset(cache_dir)
+
+    workers = os.cpu_count() if workers is None else workers
+    temp_dir = cache_dir.with_name(f"{key}.{os.getpid()}.tmp")
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    temp_dir.mkdir(parents=True)
+    stats = PackingStats()
+    packer = SequencePacker(max_seq_length)
+    started = time.perf_counter()
+
+    pool = None
+    if workers and workers > 1:
+        import multiprocessing
+        pool = multiprocessing.Pool(workers, initializer=init_tokenizer, initargs=(tokenizer.name_or_path,))
+        tokenized = pool.imap(tokenize_batch, iter_batches(iter_texts(paths, text_field), batch_size))
+    else:
+        tokenized = (tokenize_batch(batch, tokenizer) for batch in iter_batches(iter_texts(paths, text_field), batch_size))
+
+    with open(temp_dir / 'tokens.bin', 'wb') as tokens_file, open(temp_dir / 'sequences.bin', 'wb') as sequences_file:
+        offset = 0
+        array(OFFSET_TYPECODE, [0]).tofile(sequences_file)
+
+        def write(sequences) -> None:
+            nonlocal offset
+            for documents in sequences:
+                ids = array(TOKEN_TYPECODE)
+                for document in documents:
+                    ids.extend(document)
+                ids.tofile(tokens_file)
+                offset += len(ids)
+                array(OFFSET_TYPECODE, [offset]).tofile(sequences_file)
+                stats.sequences += 1
+                stats.packed_padding += max_seq_length - len(ids)
+
+        try:
+            for batch in tokenized:
+                for ids in batch:
+                    stats.documents += 1
+                    if len(ids) > max_seq_length:
+                        ids = ids[:max_seq_length]
+                        stats.truncated_documents += 1
+                    stats.tokens += len(ids)
+                    stats.unpacked_padding += max_seq_length - len(ids)
+                    write(packer.add(ids))
+            write(packer.flush())
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+    stats.tokenize_seconds = time.perf_counter() - started
+    with open(temp_dir / 'meta.json', 'w') as file:
+        json.dump({
+            'version': CACHE_VERSION,
+            'tokenizer': getattr(tokenizer, 'name_or_path', None),
+            'sources': paths,
+            'max_seq_length': max_seq_length,
+            'stats': stats.to_dict(),
+        }, file, indent=2)
+    if cache_dir.exists():
+        shutil.rmtree(cache_dir)
+    os.replace(temp_dir, cache_dir)
+
+    saved = 1 - stats.packed_padding / stats.unpacked_padding if stats.unpacked_padding else 0.0
+    print(f"Tokenized {stats.documents} documents into {stats.sequences} packed sequences of <= {max_seq_length} tokens "
+          f"in {stats.tokenize_seconds:.1f}s; padding {stats.unpacked_padding} -> {stats.packed_padding} tokens ({saved:.1%} less)")
+    return PackedTokenDataset(cache_dir)
+
+
+def main(argv: list = None) -> None:
+    """
+    Example:
+        python -m training.token_cache training/juliet/datasets mistralai/Mistral-7B-v0.1 --max-seq-length 1024
+    """
+    parser = argparse.ArgumentParser(description="Tokenize and pack a training dataset into the memory-mapped token cache.")
+    parser.add_argument('source', help="A .jsonl/.json dataset or a directory of .jsonl shards")
+    parser.add_argument('tokenizer', help="Tokenizer name or path")
+    parser.add_argument('--max-seq-length', type=int, default=1024, help="Tokens per packed sequence")
+    parser.add_argument('--text-field', default='prompt', help="Record field holding the training text")
+    parser.add_argument('--workers', type=int, default=None, help="Tokenizing processes (defaults to the CPU count)")
+    parser.add_argument('--rebuild', action='store_true', help="Ignore an existing cache")
+    args = parser.parse_args(argv)
+
+    from transformers import AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+    dataset = build_token_cache(args.source, tokenizer, args.max_seq_length, args.text_field, args.workers, rebuild=args.rebuild)
+    print(f"{len(dataset)} sequences in {dataset.cache_dir}")
+
+
+if __name__ == '__main__':
+    main()
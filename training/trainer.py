@@ -1,11 +1,8 @@
-import json
-from sklearn.model_selection import train_test_split
 from transformers import AutoModelForCausalLM, AutoTokenizer
-from datasets import load_dataset
 from trl import SFTTrainer
 from peft import LoraConfig
-import pandas as pd
 import torch
+from training.token_cache import PackedSequenceCollator, build_token_cache
 
 
 if torch.cuda.is_available():
@@ -20,17 +17,22 @@ else:
     print('No GPU available, using CPU instead.')
     device = torch.device('cpu')
 
-with open("juliet/datasets/training_prompts.json", "r") as file:
-    dataset = json.load(file)
+model_name = "ehartford/Wizard-Vicuna-7B-Uncensored"
+max_seq_length = 1024
 
-df = pd.DataFrame(dataset)
-train_df, test_df = train_test_split(df, test_size=0.2, random_state=42)
+tokenizer = AutoTokenizer.from_pretrained(model_name)
+tokenizer.pad_token = tokenizer.pad_token or tokenizer.eos_token
+
+# Tokenized and packed once into training/juliet/cache, later runs reuse it until the dataset or tokenizer changes.
+# Accepts the extract_json shard directory or the older training_prompts.json.
+dataset = build_token_cache("training/juliet/datasets", tokenizer, max_seq_length=max_seq_length,
+                            cache_root="training/juliet/cache")
+train_dataset, test_dataset = dataset.split(test_size=0.2, seed=42)
 
 model = AutoModelForCausalLM.from_pretrained(
-    pretrained_model_name_or_path="ehartford/Wizard-Vicuna-7B-Uncensored",
+    pretrained_model_name_or_path=model_name,
     load_in_4bit=True
     ).to(device)
-tokenizer = AutoTokenizer.from_pretrained("ehartford/Wizard-Vicuna-7B-Uncensored").to(device)
 
 peft_config = LoraConfig(
     r=16,
@@ -43,15 +45,20 @@ peft_config = LoraConfig(
 
 trainer = SFTTrainer(
     model,
-    train_dataset=train_df,
-    max_seq_length=1024,
+    train_dataset=train_dataset,
+    eval_dataset=test_dataset,
+    max_seq_length=max_seq_length,
     neftune_noise_alpha=5,
+    # Masks only the padding it adds, so the EOS between packed documents (also the pad token here) is still learned
+    data_collator=PackedSequenceCollator(tokenizer.pad_token_id),
+    dataset_kwargs={"skip_prepare_dataset": True},
 )
 
 
 def main():
     #trainer.train()
-    print(f"Training Data Head: {train_df[:5].to_string()}")
+    print(f"Packed sequences: {len(train_dataset)} train, {len(test_dataset)} test ({dataset.meta['stats']})")
+    print(f"Training Data Head: {tokenizer.decode(train_dataset[0]['input_ids'][:200]) if len(train_dataset) else ''}")
 
 
 if __name__ == "__main__":
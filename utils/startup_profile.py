@@ -0,0 +1,37 @@
+import subprocess
+import sys
+
+
+def import_time_report(module: str = 'main', top: int = 25) -> list:
+    """
+    Import a module in a fresh interpreter with -X importtime and collect the per module timings.
+
+    :param module: The module to import, e.g. 'main' or 'handlers.agents_handler'.
+    :param top: Number of rows to keep, slowest cumulative first.
+    :returns: List of (module, self_ms, cumulative_ms).
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((name.strip(), int(self_us) / 1000, int(cumulative_us) / 1000))
+    rows.sort(key=lambda row: row[2], reverse=True)
+    return rows[:top]
+
+
+def print_import_time_report(module: str = 'main', top: int = 25) -> None:
+    """
+    Print the slowest imports of a module, like `python -X importtime` but sorted and in milliseconds.
+    """
+    rows = import_time_report(module, top)
+    indent = ' ' * 4
+    print(f"{indent}Import time for {module} (cumulative ms, self ms):\n")
+    for name, self_ms, cumulative_ms in rows:
+        print(f"{indent}{cumulative_ms:9.1f} {self_ms:9.1f}  {name}")
@@ -0,0 +1,170 @@
+import queue
+import re
+import select
+import sys
+import threading
+
+
+CHUNK_PATTERN = re.compile(r"\S+\s*|\s+")
+# Queued by close() to end the render thread
+STOP = object()
+
+
+class TerminalRenderer:
+    """
+    Writes agent output to the terminal from its own thread so the chat loop never sleeps on it. Messages are queued,
+    written a word at a time and paced per character like the old streaming, but a message never takes longer than
+    max_message_seconds and the pace picks up while more messages are waiting. skip() (or a keypress during
+    wait_until_idle) prints the rest of the queued output at once.
+
+    Anything else printed while messages are queued would interleave with them; queue it with submit_text instead.
+    """
+
+    def __init__(self, char_delay: float = 0.05, max_message_seconds: float = 6.0, stream=None) -> None:
+        """
+        :param char_delay: Per character delay when there is no backlog.
+        :param max_message_seconds: Upper bound on the time one message takes to render.
+        :param stream: Where to write, defaults to sys.stdout.
+        """
+        self.char_delay = char_delay
+        self.max_message_seconds = max_message_seconds
+        self.stream = stream or sys.stdout
+        self.messages = queue.Queue()
+        self.skip_event = threading.Event()
+        # Messages queued or being written, guarded by idle which is notified when it drops to zero
+        self.pending = 0
+        self.idle = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name="terminal-renderer", daemon=True)
+        self.thread.start()
+
+    def submit(self, speaker: str, text: str) -> None:
+        """
+        Queue a message for rendering and return immediately.
+
+        :param speaker: Shown before the text as "speaker>> ".
+        :param text: The message text.
+        """
+        self.enqueue((speaker, text or ""))
+
+    def submit_text(self, text: str) -> None:
+        """
+        Queue plain text, e.g. debug output, to be written at once after the messages ahead of it.
+        """
+        self.enqueue((None, text))
+
+    def enqueue(self, item: tuple) -> None:
+        with self.idle:
+            self.pending += 1
+        self.messages.put(item)
+
+    def done(self, count: int = 1) -> None:
+        with self.idle:
+            self.pending -= count
+            if self.pending == 0:
+                self.skip_event.clear()
+                self.idle.notify_all()
+
+    def join(self, timeout: float = None) -> bool:
+        """
+        Wait until everything queued is written.
+
+        :returns: False when the timeout ran out first.
+        """
+        with self.idle:
+            return self.idle.wait_for(lambda: self.pending == 0, timeout)
+
+    def skip(self) -> None:
+        """
+        Finish everything currently queued without delays.
+        """
+        self.skip_event.set()
+
+    def discard(self) -> None:
+        """
+        Drop the queued messages, finish the one being written at once and wait for it, e.g. on Ctrl+C so the backlog
+        is not written over the next prompt.
+        """
+        dropped = 0
+        while True:
+            try:
+                self.messages.get_nowait()
+            except queue.Empty:
+                break
+            dropped += 1
+        self.skip()
+        if dropped:
+            self.done(dropped)
+        self.join()
+
+    def close(self) -> None:
+        """
+        Discard what is queued and stop the render thread.
+        """
+        self.discard()
+        self.messages.put(STOP)
+        self.thread.join(timeout=1.0)
+
+    def run(self) -> None:
+        while True:
+            item = self.messages.get()
+            if item is STOP:
+                return
+            speaker, text = item
+            try:
+                if speaker is None:
+                    self.stream.write(f"{text}\n")
+                    self.stream.flush()
+                else:
+                    self.render(speaker, text)
+            finally:
+                self.done()
+
+    def render(self, speaker: str, text: str) -> None:
+        self.stream.write(f"\n{speaker}>> ")
+        self.stream.flush()
+        delay = self.char_delay
+        if text:
+            delay = min(delay, self.max_message_seconds / len(text))
+        # Catch up when replies arrive faster than they can be read
+        delay /= 1 + self.messages.qsize()
+
+        written = 0
+        for chunk in CHUNK_PATTERN.findall(text):
+            if self.skip_event.is_set():
+                break
+            self.stream.write(chunk)
+            self.stream.flush()
+            written += len(chunk)
+            # wait() instead of sleep() so skip() cuts the pause short
+            self.skip_event.wait(delay * len(chunk))
+        self.stream.write(text[written:])
+        self.stream.write("\n")
+        self.stream.flush()
+
+    def wait_until_idle(self, skip_on_keypress: bool = True) -> None:
+        """
+        Block until the queue is rendered, e.g. before prompting the user. On a POSIX terminal any key skips to the end.
+
+        :param skip_on_keypress: Watch stdin for a keypress while waiting.
+        """
+        if not skip_on_keypress or not sys.stdin.isatty():
+            self.join()
+            return
+        try:
+            import termios
+            import tty
+        except ImportError:
+            self.join()
+            return
+
+        descriptor = sys.stdin.fileno()
+        saved = termios.tcgetattr(descriptor)
+        try:
+            tty.setcbreak(descriptor)
+            while not self.join(timeout=0):
+                ready, _, _ = select.select([sys.stdin], [], [], 0.05)
+                if ready:
+                    sys.stdin.read(1)
+                    self.skip()
+        finally:
+            termios.tcsetattr(descriptor, termios.TCSADRAIN, saved)
@@ -1,3 +1,4 @@
+import hashlib
 import json
 import os
 from pathlib import Path
@@ -8,12 +9,10 @@ import time
 from typing import List
 import yaml
 from handlers.conversation_handler import format_chat_history
-import nltk
-from nltk import pos_tag
-from nltk.chunk.regexp import RegexpParser
-from nltk.tokenize import word_tokenize
 
 
+BANNER_CACHE_DIR = "library/cache/banners"
+
 def stream_terminal_output(text: str, delay: float=0.05) -> None:
     """
     Print string one character at a time with a defined delay between characters. I do not like relying on streaming methods from completion endpoints. This is a better way to do it anyway. Agents can talk at different speeds depending on need and will be able to be changed en-chat with a parsed command (eventually)
@@ -47,6 +46,17 @@ def stream_agent_response(agent_name, text: str, delay: int) -> None:
     print()  # Move to the next line
 
 
+async def ainput(prompt: str = "") -> str:
+    """
+    input() on a worker thread so the event loop is not blocked while waiting on the user.
+
+    :param prompt: The prompt to show.
+    :returns: The line the user typed.
+    """
+    import asyncio
+    return await asyncio.to_thread(input, prompt)
+
+
 def create_agent_structure(agent_name: str) -> None:
     """
     Create the agent directory structure and copy any template files needed.
@@ -88,15 +98,15 @@ def create_agent_structure(agent_name: str) -> None:
 
 def yml_load_agents_list() -> dict:
     """
-    Load the projects from the YAML file into a Python dictionary.
+    Load the existing agents from the agent registry, in the shape agents_list.yaml used to have.
 
     :returns: Dictionary of existing agents
     """
-    agents_list_yaml_path=Path('agents/agents_list.yaml')
-    if agents_list_yaml_path.exists():
-        with open(agents_list_yaml_path, 'r') as file:
-            return yaml.safe_load(file)
-    return {'agents': []}
+    from handlers.registry_handler import agent_registry
+    return {'agents': [
+        {'agent_name': agent['agent_name'], 'description': agent['description'], 'llm_model': agent['llm_model']}
+        for agent in agent_registry.list_agents()
+    ]}
 
 
 def print_dev_stamp(dev_stamp: str) -> None:
@@ -188,9 +198,14 @@ def debug_print_function_return(function_name: str, return_value):
     :param return_value: The return value of the function.
     :returns: Prints the return value of a function to the terminal.
     """
-    print(f"=====  DEBUG: {function_name}  =====")
-    print(f"Return value:\n{return_value}\n")
-    print(f"=====  END DEBUG: {function_name}  =====")
+    print(format_function_return(function_name, return_value))
+
+
+def format_function_return(function_name: str, return_value) -> str:
+    """
+    The debug_print_function_return block as a string, for output that goes through a TerminalRenderer.
+    """
+    return f"=====  DEBUG: {function_name}  =====\nReturn value:\n{return_value}\n\n=====  END DEBUG: {function_name}  ====="
     
 
 def parse_model_file(file_path):
@@ -238,33 +253,60 @@ def update_parameters(parameters):
     return '\n'.join(updated_params)
 
 
+def render_banner(text: str, banner_filter: str = None) -> str:
+    """
+    Render a toilet banner, reading it from the disk cache when it has been rendered before. toilet only runs on a cache
+    miss, and when it is not installed the plain text is used (and not cached, so installing toilet later takes effect).
+
+    :param text: The text to bannerize.
+    :param banner_filter: toilet --filter value, e.g. 'metal' or 'border:metal'.
+    :returns: The rendered banner.
+    """
+    key = hashlib.sha1(f"{banner_filter or ''}\0{text}".encode('utf-8')).hexdigest()
+    path = Path(BANNER_CACHE_DIR) / f"{key}.txt"
+    try:
+        return path.read_text(encoding='utf-8')
+    except OSError:
+        pass
+
+    if shutil.which('toilet') is None:
+        return f"{text}\n"
+    command = ['toilet'] + (['--filter', banner_filter] if banner_filter else []) + [text]
+    banner = subprocess.run(command, stdout=subprocess.PIPE).stdout.decode('utf-8')
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_suffix('.tmp')
+        temp_path.write_text(banner, encoding='utf-8')
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Error: caching banner: {e}")
+    return banner
+
+
 def toilet_banner_plain(text):
     """
-    Toilet subprocess helper for simple pre-stylized banner for prettier outputs. -> Plain
+    Toilet helper for simple pre-stylized banner for prettier outputs. -> Plain
 
     :param text: The text to bannerize.
     """
-    banner = subprocess.run(['toilet', text], stdout=subprocess.PIPE)
-    print(banner.stdout.decode('utf-8'))
+    print(render_banner(text))
 
 
 def toilet_banner_metal(text):
     """
-    Toilet subprocess helper for simple pre-stylized banner for prettier outputs. -> Metal
+    Toilet helper for simple pre-stylized banner for prettier outputs. -> Metal
 
     :param text: The text to bannerize.
     :return: Print the bannerized text.
     """ 
-    banner = subprocess.run(['toilet', '--filter', 'metal', text], stdout=subprocess.PIPE)
-    print(banner.stdout.decode('utf-8'))
+    print(render_banner(text, 'metal'))
 
 
 def toilet_banner_border_metal(text):
     """
-    Toilet subprocess helper for simple pre-stylized banner for prettier outputs. -> Borderized:Metal
+    Toilet helper for simple pre-stylized banner for prettier outputs. -> Borderized:Metal
     """
-    banner = subprocess.run(['toilet', '--filter', 'border:metal', text], stdout=subprocess.PIPE)
-    print(banner.stdout.decode('utf-8'))
+    print(render_banner(text, 'border:metal'))
 
 
 def message_cache_format_to_prompt(agent, message_history):
@@ -279,24 +321,37 @@ def message_cache_format_to_prompt(agent, message_history):
     return chat_history
 
 
-def chroma_results_format_to_prompt(chroma_results):
-    if not chroma_results["documents"] or all(not doc for doc in chroma_results["documents"]):
-        return "No results found."
-    formatted_output = ""
-    for result in chroma_results["documents"]:
-        # Join the list into a string if the result is a list
-        if isinstance(result, list):
-            result = " ".join(result)
-
-    # Split the result into components (sender, timestamp, message)
-    components = result.split(" @ ")
+def format_memory_document(document: str) -> str:
+    """
+    Format one stored memory ("speaker @ timestamp: message") for the prompt.
+    """
+    components = document.split(" @ ")
+    if len(components) < 2:
+        return f"\n{document.strip()}"
     sender = components[0].strip()
     timestamp = components[1].strip()
     message = " @ ".join(components[2:]).strip()
-    # Format each entry
-    formatted_output += f"\n{sender} ({timestamp}):\n{message}"
-   
-    return formatted_output
+    return f"\n{sender} ({timestamp}):\n{message}"
+
+
+def chroma_results_to_memory_list(chroma_results) -> list:
+    """
+    Flatten chroma query results into formatted memory strings, best match first.
+    """
+    if not chroma_results or not chroma_results.get("documents"):
+        return []
+    memories = []
+    for result in chroma_results["documents"]:
+        documents = result if isinstance(result, list) else [result]
+        memories.extend(format_memory_document(document) for document in documents if document)
+    return memories
+
+
+def chroma_results_format_to_prompt(chroma_results):
+    memories = chroma_results_to_memory_list(chroma_results)
+    if not memories:
+        return "No results found."
+    return "".join(memories)
 
 
 def analyze_sentence(sentence):
@@ -309,6 +364,10 @@ def analyze_sentence(sentence):
     Returns:
     dict: A dictionary containing POS tags and a basic parse tree.
     """
+    from nltk import pos_tag
+    from nltk.chunk.regexp import RegexpParser
+    from nltk.tokenize import word_tokenize
+
     # Tokenize and POS tag
     tokens = word_tokenize(sentence)
     pos_tags = pos_tag(tokens)
@@ -334,6 +393,8 @@ def initialize_nltk_punkt_tagger():
     """
     Initialize the NLTK Punkt Tokenizer for sentence segmentation.
     """
+    import nltk
+
     # Download the Punkt Tokenizer Models
     nltk.download('punkt')
     print("NLTK Punkt tokenizer downloaded.")